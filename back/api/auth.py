@@ -1,31 +1,34 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import or_
 from sqlalchemy.orm import Session
 import uuid
 from datetime import datetime
+from typing import Optional
 
-from core.security import get_password_hash, verify_password, create_access_token, get_current_user, get_db
+from core.security import get_password_hash_async, verify_password_async, create_user_token, get_current_user, get_db, invalidate_principal, revoke_tokens, Principal
+from core.threadpool import run_db
 from db.models import User
 from schemas.main import UserCreate, UserLogin, PromoteAdminRequest, DemoteUserRequest
+from services.nicknames import nickname_key
+from services.versions import SEARCH_SCOPE, bump
 
 router = APIRouter()
 
-@router.post("/register")
-async def register(user: UserCreate, db: Session = Depends(get_db)):
-    valid_clubs = ["WakeUp | MIET", "WakeUp | MIPT", "Другой", "Misis Mafia", "Триада Менделеева","ЦКСМ"]
-    if user.club and user.club not in valid_clubs:
-        raise HTTPException(status_code=400, detail="Недопустимое значение клуба")
-
-    existing_user = db.query(User).filter(
-        (User.email == user.email) | (User.nickname == user.nickname)
-    ).first()
+def register_logic(user: UserCreate, hashed_password: str, db: Session) -> User:
+    normalized = nickname_key(user.nickname)
+    conflicts = [User.email == user.email, User.nickname == user.nickname]
+    if normalized:
+        # "Ёж" и "еж " — один и тот же игрок для validatePlayers
+        conflicts.append(User.nickname_normalized == normalized)
+    existing_user = db.query(User).filter(or_(*conflicts)).first()
     if existing_user:
         raise HTTPException(status_code=400, detail="Пользователь с таким email или nickname уже существует")
 
-    hashed_password = get_password_hash(user.password)
     new_user = User(
         id=f"user_{uuid.uuid4().hex[:12]}",
         email=user.email,
         nickname=user.nickname,
+        nickname_normalized=normalized,
         hashed_password=hashed_password,
         role="user",
         name="",
@@ -38,12 +41,27 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
         site2=""
     )
     db.add(new_user)
+    bump(db, SEARCH_SCOPE)
     db.commit()
     db.refresh(new_user)
+    return new_user
 
-    access_token = create_access_token(
-        data={"sub": new_user.nickname, "role": new_user.role, "id": new_user.id}
-    )
+def get_user_by_nickname(nickname: str, db: Session) -> Optional[User]:
+    return db.query(User).filter(User.nickname == nickname).first()
+
+# register и login — async: bcrypt выполняется в пуле core.security, а запросы
+# к БД — через run_db, поэтому ожидание хэша не держит потоки пула БД
+
+@router.post("/register")
+async def register(user: UserCreate, db: Session = Depends(get_db)):
+    valid_clubs = ["WakeUp | MIET", "WakeUp | MIPT", "Другой", "Misis Mafia", "Триада Менделеева","ЦКСМ"]
+    if user.club and user.club not in valid_clubs:
+        raise HTTPException(status_code=400, detail="Недопустимое значение клуба")
+
+    hashed_password = await get_password_hash_async(user.password)
+    new_user = await run_db(register_logic, user, hashed_password, db)
+
+    access_token = create_user_token(new_user)
     user_data = {
         "id": new_user.id,
         "nickname": new_user.nickname,
@@ -65,13 +83,11 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
 
 @router.post("/login")
 async def login(user: UserLogin, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.nickname == user.nickname).first()
-    if not db_user or not verify_password(user.password, db_user.hashed_password):
+    db_user = await run_db(get_user_by_nickname, user.nickname, db)
+    if not db_user or not await verify_password_async(user.password, db_user.hashed_password):
         raise HTTPException(status_code=400, detail="Неверный nickname или пароль")
 
-    access_token = create_access_token(
-        data={"sub": db_user.nickname, "role": db_user.role, "id": db_user.id}
-    )
+    access_token = create_user_token(db_user)
 
     user_data = {
         "nickname": db_user.nickname,
@@ -94,7 +110,7 @@ async def login(user: UserLogin, db: Session = Depends(get_db)):
     }
 
 @router.post("/promote_admin")
-async def promote_admin(request: PromoteAdminRequest, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def promote_admin(request: PromoteAdminRequest, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="У вас нет прав для выполнения этого действия")
 
@@ -105,15 +121,17 @@ async def promote_admin(request: PromoteAdminRequest, current_user: User = Depen
         raise HTTPException(status_code=404, detail="Пользователь с таким email и nickname не найден")
 
     target_user.role = "admin"
+    revoke_tokens(target_user)
     db.commit()
+    invalidate_principal(target_user.id)
 
     return {"message": f"Пользователь {target_user.nickname} успешно повышен до админа"}
 
 
 @router.post("/demote-user")
-async def demote_user_to_regular(
+def demote_user_to_regular(
     request: DemoteUserRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     # Проверка прав: только админ может выполнять
@@ -133,6 +151,8 @@ async def demote_user_to_regular(
 
     # Понижение роли до обычного пользователя
     target_user.role = "user"
+    revoke_tokens(target_user)
     db.commit()
+    invalidate_principal(target_user.id)
 
     return {"message": f"Пользователь {target_user.nickname} успешно понижен до обычного пользователя"}
\ No newline at end of file
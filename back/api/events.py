@@ -1,22 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException,File, UploadFile, Query, Form
+from fastapi import APIRouter, Depends, HTTPException,File, UploadFile, Query, Form, Request, Response
 from sqlalchemy.orm import Session, selectinload, aliased
 import json
+from core import codec
 import uuid
 import random
-import re
 from typing import List, Dict, Tuple
 from datetime import datetime, timezone  # Добавлено timezone для корректного получения UTC времени
 import math
 from sqlalchemy import or_
 from sqlalchemy.exc import SQLAlchemyError
-from core.config import AVATAR_DIR
 import logging
 from sqlalchemy import distinct, func, or_
 from pathlib import Path
-from core.security import get_current_user, get_optional_current_user, get_db
-from db.models import Event, Team, Registration, User, Notification, Game, event_judges
+from core.security import get_current_user, get_optional_current_user, get_db, Principal
+from core.threadpool import call_async
+from db.models import Event, Team, Registration, User, Notification, Game, GamePlayer, PlayerEventStats, event_judges
 from schemas.main import CreateTeamRequest, ManageRegistrationRequest,RegisterForEventRequest, TeamActionRequest, EventSetupRequest, GenerateSeatingRequest, CreateEventRequest, UpdateEventRequest
 from api.notifications import create_notification
+from services.game_index import set_game_columns, sync_game_players, delete_game_players
+from services.cache import response_cache
+from services.versions import USERS_SCOPE, bump, bump_games, event_scope, not_modified, version_headers
+from services.ws_manager import ws_agent_manager
+from services.leaderboard import event_seats_query
+from services.avatars import avatar_srcset, save_event_avatar
+from services.nicknames import mention
+from services.user_resolver import UserResolver, game_with_photos, players_with_photos, referenced_nicknames, seat_nicknames
+from services.scoring import ROLE_MAPPING, SK_PENALTY, accumulate, calculate_ci, jk_penalty, total_points, wins_total
 from collections import defaultdict
 from typing import Optional
 
@@ -33,7 +42,7 @@ except Exception:
 
 router = APIRouter()
 
-async def manage_registration_logic(registration_id: str, action: str, current_user: User, db: Session):
+def manage_registration_logic(registration_id: str, action: str, current_user: Principal, db: Session):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="У вас нет прав для выполнения этого действия")
 
@@ -85,15 +94,16 @@ async def manage_registration_logic(registration_id: str, action: str, current_u
         related_id=event.id,
         commit=False # <-- Важный флаг, чтобы не делать commit здесь
     )
+    bump(db, event_scope(event.id))
     
     return {"message": f"Заявка успешно обработана: {action}"}
 
-async def manage_team_invite_logic(team_id: str, action: str, current_user: User, db: Session):
+def manage_team_invite_logic(team_id: str, action: str, current_user: Principal, db: Session):
 
     team = db.query(Team).filter(Team.id == team_id).first()
     if not team:
         raise HTTPException(status_code=404, detail="Команда не найдена")
-    members_data = json.loads(team.members)
+    members_data = codec.loads(team.members)
     member_found = False
     for member in members_data:
         if member["user_id"] == current_user.id:
@@ -104,15 +114,17 @@ async def manage_team_invite_logic(team_id: str, action: str, current_user: User
                 member["status"] = "approved"
             else: # decline
                 create_notification(db, recipient_id=team.created_by, type="team_invite_declined",
-                                  message=f"Пользователь {current_user.nickname} отклонил приглашение в команду '{team.name}'. Команда была расформирована.")
+                                  message=f"Пользователь {mention(current_user.id)} отклонил приглашение в команду '{team.name}'. Команда была расформирована.",
+                                  sender_id=current_user.id)
                 db.query(Notification).filter(Notification.related_id == team.id).delete(synchronize_session=False)
                 db.delete(team)
+                bump(db, event_scope(team.event_id))
                 db.commit()
                 return {"message": "Вы отклонили приглашение. Команда расформирована."}
             break
     if not member_found:
         raise HTTPException(status_code=403, detail="Вы не были приглашены в эту команду")
-    team.members = json.dumps(members_data)
+    team.members = codec.dumps(members_data)
     all_approved = all(m["status"] == "approved" for m in members_data)
     if all_approved:
         team.status = "approved"
@@ -122,14 +134,15 @@ async def manage_team_invite_logic(team_id: str, action: str, current_user: User
                                   message=f"Команда '{team.name}' успешно сформирована!", commit=False)
         create_notification(db, recipient_id=team.created_by, type="team_approved",
                               message=f"Ваша команда '{team.name}' успешно сформирована!")
+    bump(db, event_scope(team.event_id))
     db.commit()
     return {"message": "Вы приняли приглашение в команду."}
 
 @router.delete("/deletePlayer/{user_id}/Event/{event_id}")
-async def delete_player_from_event(
+def delete_player_from_event(
     user_id: str,
     event_id: str,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     # Проверка прав: только админ может удалять игроков
@@ -172,6 +185,7 @@ async def delete_player_from_event(
     
     # Удаление самой регистрации
     db.delete(registration)
+    bump(db, event_scope(event_id))
     
     # Коммит всех изменений
     db.commit()
@@ -179,7 +193,7 @@ async def delete_player_from_event(
     return {"message": "Игрок успешно удален из события"}
 
 @router.post("/createTeam")
-async def create_team(request: CreateTeamRequest, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def create_team(request: CreateTeamRequest, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
    
     if current_user.id not in request.members:
          raise HTTPException(status_code=400, detail="Вы должны включить себя в состав команды.")
@@ -203,7 +217,7 @@ async def create_team(request: CreateTeamRequest, current_user: User = Depends(g
     assigned_ids = {
         mid['user_id'] 
         for t in existing_teams 
-        for mid in json.loads(t.members) 
+        for mid in codec.loads(t.members) 
         if t.status == 'approved' or (t.status == 'pending' and mid['status'] == 'approved')
     }
     if any(mid in assigned_ids for mid in request.members):
@@ -218,11 +232,12 @@ async def create_team(request: CreateTeamRequest, current_user: User = Depends(g
         id=team_id,
         event_id=request.event_id,
         name=request.name,
-        members=json.dumps(members_data),
+        members=codec.dumps(members_data),
         created_by=current_user.id,
         status="approved" if is_admin_creation else "pending"
     )
     db.add(new_team)
+    bump(db, event_scope(request.event_id))
     db.commit()
     if not is_admin_creation:
         for member in members_data:
@@ -232,7 +247,7 @@ async def create_team(request: CreateTeamRequest, current_user: User = Depends(g
                     recipient_id=member["user_id"],
                     sender_id=current_user.id,
                     type="team_invite",
-                    message=f"Пользователь {current_user.nickname} приглашает вас в команду '{request.name}' для участия в '{event.title}'.",
+                    message=f"Пользователь {mention(current_user.id)} приглашает вас в команду '{request.name}' для участия в '{event.title}'.",
                     related_id=team_id,
                     actions=["accept_team_invite", "decline_team_invite"]
                 )
@@ -240,20 +255,20 @@ async def create_team(request: CreateTeamRequest, current_user: User = Depends(g
     return {"message": message, "team_id": team_id}
 
 @router.post("/teams/{team_id}/invite", response_model=dict)
-async def handle_team_invite(
+def handle_team_invite(
     team_id: str,
     request: TeamActionRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    return await manage_team_invite_logic(team_id, request.action, current_user, db)
+    return manage_team_invite_logic(team_id, request.action, current_user, db)
 
 
 @router.post("/events/{event_id}/register")
-async def register_for_event(
+def register_for_event(
     event_id: str,
     request: RegisterForEventRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     import uuid
@@ -300,6 +315,7 @@ async def register_for_event(
     )
 
     db.add(new_registration)
+    bump(db, event_scope(event_id))
     db.commit()
     db.refresh(new_registration)
 
@@ -310,7 +326,7 @@ async def register_for_event(
             db,
             recipient_id=admin.id,
             type="registration_request",
-            message=f"Заявка на '{event.title}' от '{target_user.nickname}'.",
+            message=f"Заявка на '{event.title}' от '{mention(target_user.id)}'.",
             sender_id=current_user.id,
             related_id=new_registration.id,
             actions=["approve_registration", "reject_registration"]
@@ -326,14 +342,14 @@ async def register_for_event(
 
 
 @router.post("/registrations/{registration_id}/manage")
-async def manage_registration(registration_id: str, request: ManageRegistrationRequest, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return await manage_registration_logic(registration_id, request.action, current_user, db)
+def manage_registration(registration_id: str, request: ManageRegistrationRequest, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    return manage_registration_logic(registration_id, request.action, current_user, db)
 
 def get_user_avatar(user_obj):
     return user_obj.avatar if user_obj else None
 
 @router.get("/events")
-async def get_events(db: Session = Depends(get_db)):
+def get_events(db: Session = Depends(get_db)):
 
     # Загружаем события с judges без сортировки по position
     events_query = (
@@ -349,7 +365,7 @@ async def get_events(db: Session = Depends(get_db)):
 
         # --- Безопасный парсинг дат ---
         try:
-            dates_parsed = json.loads(event.dates) if event.dates else []
+            dates_parsed = codec.loads(event.dates) if event.dates else []
             if not isinstance(dates_parsed, list):
                 dates_parsed = []
         except (json.JSONDecodeError, TypeError):
@@ -381,11 +397,22 @@ async def get_events(db: Session = Depends(get_db)):
 
 
 @router.get("/getEvent/{event_id}")
-async def get_event(
+def get_event(
     event_id: str,
-    current_user: User = Depends(get_optional_current_user),
+    request: Request,
+    response: Response,
+    photos: bool = Query(False, description="Добавить photoUrl каждому игроку в играх"),
+    current_user: Optional[Principal] = Depends(get_optional_current_user),
     db: Session = Depends(get_db)
 ):
+    # Ответ зависит от зрителя (админ, статус заявки, команды) — он входит в ETag
+    viewer = f"{current_user.id}:{current_user.role}" if current_user else "anonymous"
+    headers = version_headers(db, [event_scope(event_id), USERS_SCOPE], viewer + (":photos" if photos else ""))
+    headers["Vary"] = "Authorization"
+    cached = not_modified(request, headers)
+    if cached:
+        return cached
+
     # Подгружаем Event с games и judges
     event = db.query(Event).options(
         selectinload(Event.games),
@@ -394,10 +421,11 @@ async def get_event(
     
     if not event:
         raise HTTPException(status_code=404, detail="Событие не найдено")
+    response.headers.update(headers)
     
     # Десериализация dates
     try:
-        dates_parsed = json.loads(event.dates) if event.dates else []
+        dates_parsed = codec.loads(event.dates) if event.dates else []
     except json.JSONDecodeError:
         dates_parsed = []
 
@@ -437,13 +465,12 @@ async def get_event(
     teams = db.query(Team).filter(Team.event_id == event_id).all()
     all_users_in_event = {p['id']: p for p in participants_list}
     if current_user and current_user.id not in all_users_in_event:
-        user_db = db.query(User).filter(User.id == current_user.id).first()
-        if user_db:
-            all_users_in_event[current_user.id] = {"id": user_db.id, "nick": user_db.nickname}
+        # Ник из токена актуален: смена ника отзывает выданные токены
+        all_users_in_event[current_user.id] = {"id": current_user.id, "nick": current_user.nickname}
 
     for t in teams:
         try:
-            members_data = json.loads(t.members)
+            members_data = codec.loads(t.members)
         except (json.JSONDecodeError, TypeError):
             members_data = []
 
@@ -477,20 +504,24 @@ async def get_event(
 
     if not event.games_are_hidden or is_admin:
         sorted_games = sorted(event.games, key=lambda g: g.gameId)
-        all_users_in_db = db.query(User.id, User.nickname).all()
-        nick_to_id_map = {nick: uid for uid, nick in all_users_in_db}
-
-        # Можно вставить твою логику расчёта очков (total_plus_only, ci, bestMovesWithBlack и т.д.)
+        parsed_games = []
         for game in sorted_games:
             try:
-                game_data = json.loads(game.data)
-                players = game_data.get("players", [])
+                parsed_games.append((game, codec.loads(game.data)))
             except (json.JSONDecodeError, TypeError):
-                players = []
+                parsed_games.append((game, {}))
+        nicknames = referenced_nicknames(data for _, data in parsed_games)
+        if photos:
+            nicknames |= seat_nicknames(p for _, data in parsed_games for p in data.get("players") or [])
+        users = UserResolver(db).load(nicknames)
+
+        # Можно вставить твою логику расчёта очков (total_plus_only, ci, bestMovesWithBlack и т.д.)
+        for game, game_data in parsed_games:
+            players = game_data.get("players", [])
+            if photos:
+                players = players_with_photos(players, users)
 
             judge_nickname = game_data.get("gameInfo", {}).get("judgeNickname")
-            round_match = re.search(r'_r(\d+)', game.gameId)
-            round_number = int(round_match.group(1)) if round_match else None
 
             games_list.append({
                 "id": game.gameId,
@@ -499,10 +530,10 @@ async def get_event(
                 "created_at": game.created_at,
                 "badgeColor": game_data.get("badgeColor"),
                 "judge_nickname": judge_nickname,
-                "judge_id": nick_to_id_map.get(judge_nickname),
+                "judge_id": users.id_for(judge_nickname),
                 "location": game_data.get("location"),
                 "tableNumber": game_data.get("gameInfo", {}).get("tableNumber"),
-                "roundNumber": round_number,
+                "roundNumber": game.round_number,
                 "gameInfo": game_data.get("gameInfo", {})
             })
 
@@ -530,12 +561,12 @@ async def get_event(
 
 
 @router.delete("/deleteTeam/{team_id}")
-async def leave_or_delete_team(team_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def leave_or_delete_team(team_id: str, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
     team = db.query(Team).filter(Team.id == team_id).first()
     if not team:
         raise HTTPException(status_code=404, detail="Команда не найдена")
 
-    members_data = json.loads(team.members)
+    members_data = codec.loads(team.members)
     is_member = any(m['user_id'] == current_user.id for m in members_data)
     is_creator = team.created_by == current_user.id
     is_admin = current_user.role == "admin"
@@ -543,12 +574,14 @@ async def leave_or_delete_team(team_id: str, current_user: User = Depends(get_cu
     if is_admin:
         db.query(Notification).filter(Notification.related_id == team.id).delete(synchronize_session=False)
         db.delete(team)
+        bump(db, event_scope(team.event_id))
         db.commit()
         return {"message": f"Команда {team.name} удалена администратором."}
 
     if is_creator:
         db.query(Notification).filter(Notification.related_id == team.id).delete(synchronize_session=False)
         db.delete(team)
+        bump(db, event_scope(team.event_id))
         db.commit()
         for member in members_data:
             if member['user_id'] != current_user.id:
@@ -565,26 +598,30 @@ async def leave_or_delete_team(team_id: str, current_user: User = Depends(get_cu
         if len(new_members_data) < min_team_size:
             db.query(Notification).filter(Notification.related_id == team.id).delete(synchronize_session=False)
             db.delete(team)
+            bump(db, event_scope(team.event_id))
             db.commit()
             for member in new_members_data:
                 create_notification(db, recipient_id=member['user_id'], type="team_disbanded",
-                                  message=f"Команда '{team.name}' была расформирована, так как ее покинул участник {current_user.nickname}.")
+                                  message=f"Команда '{team.name}' была расформирована, так как ее покинул участник {mention(current_user.id)}.",
+                                  sender_id=current_user.id)
             return {"message": f"Вы покинули команду, и она была расформирована."}
         else:
-            team.members = json.dumps(new_members_data)
+            team.members = codec.dumps(new_members_data)
             if team.status == 'approved':
                 team.status = 'pending'
             
             for member in new_members_data:
                  create_notification(db, recipient_id=member['user_id'], type="team_member_left",
-                                  message=f"Пользователь {current_user.nickname} покинул команду '{team.name}'.")
+                                  message=f"Пользователь {mention(current_user.id)} покинул команду '{team.name}'.",
+                                  sender_id=current_user.id)
+            bump(db, event_scope(team.event_id))
             db.commit()
             return {"message": f"Вы покинули команду {team.name}."}
 
     raise HTTPException(status_code=403, detail="У вас нет прав для выполнения этого действия.")
 
 @router.post("/events/{event_id}/setup_games", status_code=201)
-async def setup_event_games(event_id: str, request: EventSetupRequest, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def setup_event_games(event_id: str, request: EventSetupRequest, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Только администраторы могут настраивать игры.")
     
@@ -592,6 +629,8 @@ async def setup_event_games(event_id: str, request: EventSetupRequest, current_u
     if not event:
         raise HTTPException(status_code=404, detail="Событие не найдено.")
 
+    old_game_ids = [game_id for (game_id,) in db.query(Game.gameId).filter(Game.event_id == event_id)]
+    delete_game_players(db, event_id=event_id)
     db.query(Game).filter(Game.event_id == event_id).delete(synchronize_session=False)
 
     new_games = []
@@ -608,20 +647,22 @@ async def setup_event_games(event_id: str, request: EventSetupRequest, current_u
             game = Game(
                 gameId=game_id,
                 event_id=event_id,
-                data=json.dumps(game_data)
+                data=codec.dumps(game_data)
             )
+            set_game_columns(game, game_data)
             new_games.append(game)
     
     db.add_all(new_games)
+    bump_games(db, old_game_ids + [game.gameId for game in new_games], event_id)
     db.commit()
     return {"message": f"Создано {len(new_games)} игр для события '{event.title}'."}
 
 # Рассадка
 @router.post("/events/{event_id}/generate_seating")
-async def generate_event_seating(
+def generate_event_seating(
     event_id: str,
     request: GenerateSeatingRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     import math
@@ -880,6 +921,7 @@ async def generate_event_seating(
     # 5. Запись
     # ============================================================
     game_map = {g.gameId: g for g in games}
+    seated_games = {}
 
     for r in range(1, num_rounds + 1):
         for idx, label in enumerate(table_labels):
@@ -916,7 +958,7 @@ async def generate_event_seating(
                         "best_move": ""
                     })
 
-            data = json.loads(game.data) if game.data else {}
+            data = codec.loads(game.data) if game.data else {}
             data["players"] = players_list
 
             judge = judges_by_table.get(idx)
@@ -931,18 +973,24 @@ async def generate_event_seating(
                 data["gameInfo"]["judgeId"] = None
                 data["gameInfo"]["judgeNickname"] = ""
 
-            game.data = json.dumps(data, ensure_ascii=False)
+            game.data = codec.dumps(data)
+            sync_game_players(db, game, data)
+            seated_games[game.gameId] = data
 
+    bump_games(db, seated_games.keys(), event_id)
     db.commit()
 
+    for game_id, data in seated_games.items():
+        call_async(ws_agent_manager.publish_game, game_id, "state", game_with_photos(data, db))
+
     return {"message": "Рассадка с судьями успешно сгенерирована."}
 
 
 # Тур швейцарки
 @router.post("/events/{event_id}/generate_next_round")
-async def generate_next_round(
+def generate_next_round(
     event_id: str,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
 
@@ -970,11 +1018,8 @@ async def generate_next_round(
     # ============================================================
     # 2. Определяем номер следующего раунда
     # ============================================================
-    max_round = 0
-    for g in games:
-        m = re.search(r"_r(\d+)", g.gameId)
-        if m:
-            max_round = max(max_round, int(m.group(1)))
+    # Номер раунда хранится в games.round_number (индекс event_id, round_number)
+    max_round = db.query(func.max(Game.round_number)).filter(Game.event_id == event_id).scalar() or 0
 
     next_round = max_round + 1
 
@@ -994,7 +1039,7 @@ async def generate_next_round(
         if not g.data:
             continue
 
-        data = json.loads(g.data)
+        data = codec.loads(g.data)
 
         for p in data.get("players", []):
 
@@ -1023,93 +1068,7 @@ async def generate_next_round(
     # ============================================================
     # 6. Считаем статистику игроков (как player-stats)
     # ============================================================
-    player_stats = defaultdict(lambda: {
-        "total_plus": 0.0,
-        "total_best_move_bonus": 0.0,
-        "total_minus": 0.0,
-        "jk_count": 0,
-        "wins": 0,
-        "ci_total": 0.0,
-        "games_count": 0,
-        "bestMovesWithBlack": 0
-    })
-
-    for g in games:
-
-        if not g.data:
-            continue
-
-        data = json.loads(g.data)
-
-        badge_color = data.get("badgeColor")
-
-        player_roles = {
-            str(p.get("id")): p.get("role")
-            for p in data.get("players", [])
-        }
-
-        for p in data.get("players", []):
-
-            uid = p.get("userId")
-            if not uid:
-                continue
-
-            stats = player_stats[uid]
-
-            stats["games_count"] += 1
-
-            role = p.get("role")
-
-            win_condition = (
-                (badge_color == "red" and role in ["мирный", "шериф"]) or
-                (badge_color == "black" and role in ["мафия", "дон"])
-            )
-
-            if win_condition:
-                stats["wins"] += 1
-
-            plus = p.get("plus", 0)
-            if isinstance(plus, (int, float)):
-                stats["total_plus"] += plus
-
-            sk = p.get("sk", 0)
-            if isinstance(sk, (int, float)) and sk > 0:
-                stats["total_minus"] -= 0.5 * sk
-
-            jk = p.get("jk", 0)
-            if isinstance(jk, (int, float)) and jk > 0:
-                stats["jk_count"] += int(jk)
-
-            best_move = p.get("best_move", "").strip()
-
-            if best_move:
-
-                nominated = [s for s in best_move.split() if s.isdigit()]
-
-                if len(nominated) == 3:
-
-                    mafia_count = 0
-
-                    for s in nominated:
-                        idx = int(s) - 1
-                        if 0 <= idx < len(data["players"]):
-                            pid = data["players"][idx]["id"]
-                            if player_roles.get(str(pid)) in ["мафия", "дон"]:
-                                mafia_count += 1
-
-                    bonus = {3: 1.5, 2: 1.0, 1: 0.0}.get(mafia_count, 0.0)
-
-                    stats["total_best_move_bonus"] += bonus
-
-                    if mafia_count >= 1:
-                        stats["bestMovesWithBlack"] += 1
-
-                        current_x = stats["bestMovesWithBlack"]
-                        current_n = stats["games_count"]
-
-                        ci_value = calculate_ci(current_x, current_n)
-
-                        stats["ci_total"] += ci_value
+    player_stats = accumulate(event_seats_query(db, event_id), event_id)
 
     # ============================================================
     # 7. Формируем список игроков с totalPoints
@@ -1119,30 +1078,12 @@ async def generate_next_round(
     for r in participants:
 
         uid = r.user_id
-        stats = player_stats.get(uid, {})
-
-        total_plus = stats.get("total_plus", 0)
-        total_cb = stats.get("total_best_move_bonus", 0)
-        total_minus = stats.get("total_minus", 0)
-        jk = stats.get("jk_count", 0)
-        wins = stats.get("wins", 0)
-        ci_total = stats.get("ci_total", 0)
-
-        jk_penalty = 0.5 * jk * (jk + 1) if jk > 0 else 0
-
-        total_points = (
-            total_plus
-            + total_cb
-            + total_minus
-            - jk_penalty
-            + 2.5 * wins
-            + ci_total
-        )
+        stats = player_stats.get(str(uid))
 
         players.append({
             "id": uid,
             "nick": r.user.nickname,
-            "score": total_points
+            "score": total_points(stats) if stats else 0
         })
 
     # ============================================================
@@ -1207,6 +1148,7 @@ async def generate_next_round(
     # ============================================================
     # 12. Создаём игры
     # ============================================================
+    new_game_ids = []
     for table_index, table_label in enumerate(table_labels):
 
         if table_index >= len(all_tables_slots):
@@ -1248,14 +1190,18 @@ async def generate_next_round(
 
         game_id = f"{event_id}_r{next_round}_t{table_label}"
 
+        game_data = {"players": players_list}
         new_game = Game(
             event_id=event_id,
             gameId=game_id,
-            data=json.dumps({"players": players_list}, ensure_ascii=False)
+            data=codec.dumps(game_data)
         )
 
         db.add(new_game)
+        sync_game_players(db, new_game, game_data)
+        new_game_ids.append(new_game.gameId)
 
+    bump_games(db, new_game_ids, event_id)
     db.commit()
 
     return {
@@ -1266,7 +1212,7 @@ async def generate_next_round(
 
 #Видимость
 @router.post("/events/{event_id}/toggle_visibility")
-async def toggle_games_visibility(event_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def toggle_games_visibility(event_id: str, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Только администраторы могут выполнять это действие.")
     
@@ -1275,6 +1221,7 @@ async def toggle_games_visibility(event_id: str, current_user: User = Depends(ge
         raise HTTPException(status_code=404, detail="Событие не найдено.")
         
     event.games_are_hidden = not event.games_are_hidden
+    bump(db, event_scope(event_id))
     db.commit()
     
     status = "скрыты" if event.games_are_hidden else "показаны"
@@ -1282,7 +1229,7 @@ async def toggle_games_visibility(event_id: str, current_user: User = Depends(ge
 
 #Создание
 @router.post("/event")
-async def create_event(request: CreateEventRequest, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def create_event(request: CreateEventRequest, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Только администраторы могут создавать события.")
     
@@ -1290,7 +1237,7 @@ async def create_event(request: CreateEventRequest, current_user: User = Depends
     new_event = Event(
         id=event_id,
         title=request.title,
-        dates=json.dumps([d.isoformat() for d in request.dates]),  # Преобразуем datetime в ISO строки перед сериализацией
+        dates=codec.dumps([d.isoformat() for d in request.dates]),  # Преобразуем datetime в ISO строки перед сериализацией
         location=request.location,
         type=request.type,
         participants_limit=request.participants_limit,
@@ -1305,7 +1252,7 @@ async def create_event(request: CreateEventRequest, current_user: User = Depends
         org_avatar=request.org_avatar,
         created_at=datetime.now(timezone.utc),  # Исправлено: вместо datetime.utcnow() используем datetime.now(timezone.utc)
         games_are_hidden=request.games_are_hidden,
-        seating_exclusions=json.dumps(request.seating_exclusions)  # Сохраняем как JSON строку
+        seating_exclusions=codec.dumps(request.seating_exclusions)  # Сохраняем как JSON строку
     )
     db.add(new_event)
     db.commit()
@@ -1313,7 +1260,7 @@ async def create_event(request: CreateEventRequest, current_user: User = Depends
     
     # Десериализуем для возврата
     try:
-        dates_parsed = json.loads(new_event.dates) if new_event.dates else []
+        dates_parsed = codec.loads(new_event.dates) if new_event.dates else []
     except json.JSONDecodeError:
         dates_parsed = request.dates  # Fallback на оригинал
     
@@ -1343,7 +1290,7 @@ async def create_event(request: CreateEventRequest, current_user: User = Depends
     }
 
 @router.delete("/event/{event_id}")
-async def delete_event(event_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def delete_event(event_id: str, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Только администраторы могут удалять события.")
     
@@ -1352,8 +1299,10 @@ async def delete_event(event_id: str, current_user: User = Depends(get_current_u
         raise HTTPException(status_code=404, detail="Событие не найдено.")
     
     # Удаляем связанные записи
+    bump_games(db, [game_id for (game_id,) in db.query(Game.gameId).filter(Game.event_id == event_id)], event_id)
     db.query(Registration).filter(Registration.event_id == event_id).delete(synchronize_session=False)
     db.query(Team).filter(Team.event_id == event_id).delete(synchronize_session=False)
+    delete_game_players(db, event_id=event_id)
     db.query(Game).filter(Game.event_id == event_id).delete(synchronize_session=False)
     db.query(Notification).filter(Notification.related_id == event_id).delete(synchronize_session=False)
     
@@ -1362,17 +1311,6 @@ async def delete_event(event_id: str, current_user: User = Depends(get_current_u
     
     return {"message": f"Событие '{event.title}' успешно удалено."}
 
-def calculate_ci(x: int, n: int) -> float:
-    # Если x <= 0, сумма = 0
-    if x <= 0:
-        return 0.0
-    
-    # Сумма арифметической прогрессии: 0.5, 1.0, 1.5, ..., 0.5*x
-    # Первый член a1 = 0.5, последний член ax = 0.5 * x, количество членов = x
-    # Сумма = x * (a1 + ax) / 2 = x * (0.5 + 0.5*x) / 2
-    # Упрощаем: = x * 0.5 * (1 + x) / 2 = 0.25 * x * (x + 1)
-    return 0.25 * x * (x + 1)
-
 def calculate_location_rating(points: float, games: int) -> float:
     if games <= 0:
         return 0.0
@@ -1380,57 +1318,68 @@ def calculate_location_rating(points: float, games: int) -> float:
 
 
 @router.get("/events/{event_id}/player-stats")
-async def get_player_stats(
+def get_player_stats(
     event_id: str,
+    request: Request,
+    response: Response,
     location: Optional[str] = Query(default=None),
     db: Session = Depends(get_db)
 ):
-    # ---------------------------
-    # Получение игр
-    # ---------------------------
-    if event_id == "1":
-        query = db.query(Game).filter(
-            or_(Game.event_id == event_id, Game.event_id.is_(None))
-        )
-    else:
+    headers = version_headers(db, [event_scope(event_id), USERS_SCOPE], location or "")
+    cached = not_modified(request, headers)
+    if cached:
+        return cached
+    response.headers.update(headers)
+
+    cache_key = ("player-stats", event_id, location or "", None, None, headers["ETag"])
+    return response_cache.get_or_compute(cache_key, lambda: player_stats_logic(event_id, location, db))
+
+
+def player_stats_logic(event_id: str, location: Optional[str], db: Session):
+    if event_id != "1":
         event = db.query(Event).filter(Event.id == event_id).first()
         if not event:
             raise HTTPException(status_code=404, detail="Событие не найдено.")
-        query = db.query(Game).filter(Game.event_id == event_id)
 
     if location:
-        # Приводим location к нижнему регистру и убираем пробелы
-        loc_expr = func.lower(func.trim(func.json_extract(Game.data, "$.location"), '"'))
-        query = query.filter(loc_expr == location.lower())
-
-    query = query.order_by(Game.created_at.asc())
-    games = query.all()
-
-    if not games:
-        return {"players": [], "message": "Нет игр в событии."}
-
-    # ---------------------------
-    # Парсинг игр и сбор userId
-    # ---------------------------
-    parsed_games = []
-    user_ids = set()
-
-    for game in games:
-        if not game.data:
-            continue
-        try:
-            data = json.loads(game.data)
-            parsed_games.append(data)
-            for p in data.get("players", []):
-                uid = p.get("userId")
-                if uid:
-                    user_ids.add(uid)
-        except json.JSONDecodeError:
-            continue
+        # ---------------------------
+        # Фильтр по локации: считаем по местам игроков (game_players)
+        # ---------------------------
+        query = event_seats_query(db, event_id)
+
+        location_value = location.strip()
+        query = query.filter(or_(
+            GamePlayer.location == location_value,
+            func.lower(GamePlayer.location) == location_value.lower()
+        ))
+
+        seat_rows = query.all()
+        if not seat_rows:
+            return {"players": [], "message": "Нет игр в событии."}
+
+        games_total = len({row.game_id for row in seat_rows})
+        player_stats = list(accumulate(seat_rows, event_id).values())
+    else:
+        # ---------------------------
+        # Без фильтра: материализованный рейтинг, O(игроков)
+        # ---------------------------
+        player_stats = db.query(PlayerEventStats).filter(
+            PlayerEventStats.event_id == event_id
+        ).order_by(PlayerEventStats.player_key).all()
+        if not player_stats:
+            return {"players": [], "message": "Нет игр в событии."}
+
+        games_query = db.query(func.count(Game.gameId))
+        if event_id == "1":
+            games_query = games_query.filter(or_(Game.event_id == event_id, Game.event_id.is_(None)))
+        else:
+            games_query = games_query.filter(Game.event_id == event_id)
+        games_total = games_query.scalar()
 
     # ---------------------------
     # Загрузка пользователей из базы
     # ---------------------------
+    user_ids = {stats.user_id for stats in player_stats if stats.user_id}
     db_users = db.query(User).filter(User.id.in_(user_ids)).all()
     user_info_map = {
         u.id: {
@@ -1442,221 +1391,61 @@ async def get_player_stats(
     }
 
     # ---------------------------
-    # Маппинг ролей на английские
-    # ---------------------------
-    role_mapping = {
-        "шериф": "sheriff",
-        "мирный": "citizen",
-        "мафия": "mafia",
-        "дон": "don"
-    }
-
-    # ---------------------------
-    # Инициализация статистики
-    # ---------------------------
-    player_totals = defaultdict(lambda: {
-        "name": "",
-        "club": None,
-        "photoUrl": None,
-        "total_plus": 0.0,
-        "total_best_move_bonus": 0.0,
-        "total_minus": 0.0,
-        "ci_total": 0.0,
-        "bestMovesWithBlack": 0,
-        "jk_count": 0,
-        "sk_count": 0,
-        "games_count": 0,
-        "wins": defaultdict(int),
-        "gamesPlayed": defaultdict(int),
-        "role_plus": defaultdict(list),
-        "deaths": 0,
-        "deathsWith1Black": 0,
-        "deathsWith2Black": 0,
-        "deathsWith3Black": 0,
-        "games_miet": 0,
-        "games_mipt": 0,
-    })
-
-    # ---------------------------
-    # Основной цикл по играм
+    # Формирование ответа
     # ---------------------------
-    for data in parsed_games:
-        location_lower = (data.get("location", "") or "").strip().lower()
-        players = data.get("players", [])
-
-        # Проверка: если нет игроков — пропускаем
-        if not players:
-            continue
-
-        # Обработка каждого игрока
-        for p in players:
-            name = p.get("name", "").strip()
-            if not name:
-                continue
-
-            uid = p.get("userId")
-            key = uid if uid else name  # ключ для агрегации
-
-            stats = player_totals[key]
+    response_players = []
+    for stats in player_stats:
+        key = stats.player_key
+        info = user_info_map.get(stats.user_id) if stats.user_id == key else None
+        name = info["nickname"] if info else stats.name
 
-            # Заполнение информации о пользователе
-            if uid and uid in user_info_map:
-                info = user_info_map[uid]
-                stats["name"] = info["nickname"]
-                stats["club"] = info["club"]
-                stats["photoUrl"] = info["photoUrl"]
-            else:
-                stats["name"] = name
-
-            # Увеличиваем счётчик игр
-            stats["games_count"] += 1
-
-            # Локации
-            if "миэт" in location_lower:
-                stats["games_miet"] += 1
-            elif "мфти" in location_lower:
-                stats["games_mipt"] += 1
-
-            # Роль
-            role = p.get("role")
-            english_role = role_mapping.get(role)
-            if english_role:
-                stats["gamesPlayed"][english_role] += 1
-
-            # Победа
-            badge_color = data.get("badgeColor")
-            if badge_color:
-                win_condition = (
-                    (badge_color == "red" and role in ["мирный", "шериф"]) or
-                    (badge_color == "black" and role in ["мафия", "дон"])
-                )
-                if win_condition:
-                    stats["wins"][english_role] += 1
-
-            # plus
-            plus_val = p.get("plus")
-            if isinstance(plus_val, (int, float)) and plus_val >= 0:
-                stats["total_plus"] += float(plus_val)
-                if english_role:
-                    stats["role_plus"][english_role].append(float(plus_val))
-
-            # sk
-            sk_val = p.get("sk")
-            if isinstance(sk_val, (int, float)) and sk_val > 0:
-                stats["sk_count"] += int(sk_val)
-                stats["total_minus"] -= 0.5 * sk_val
-
-            # jk
-            jk_val = p.get("jk")
-            if isinstance(jk_val, (int, float)) and jk_val > 0:
-                stats["jk_count"] += int(jk_val)
-
-            # best_move — ключевая логика, исправленная!
-            best_move = p.get("best_move", "").strip()
-            if best_move:
-                nominated = [s for s in best_move.split() if s.isdigit()]
-                if len(nominated) == 3:
-                    mafia_count = 0
-                    for s in nominated:
-                        try:
-                            idx = int(s) - 1  # 1-based → 0-based индекс
-                            if 0 <= idx < len(players):
-                                nominated_player = players[idx]
-                                nominated_role = nominated_player.get("role")
-                                if nominated_role in ["мафия", "дон"]:
-                                    mafia_count += 1
-                        except (ValueError, IndexError):
-                            continue  # игнорируем невалидные значения
-
-                    # Бонус за угадывание мафий
-                    bonus_map = {3: 1.5, 2: 1.0, 1: 0.0}
-                    bonus = bonus_map.get(mafia_count, 0.0)
-                    stats["total_best_move_bonus"] += bonus
-
-                    if english_role and bonus > 0:
-                        stats["role_plus"][english_role].append(bonus)
-
-                    # Статистика по смертям
-                    if mafia_count >= 1:
-                        stats["bestMovesWithBlack"] += 1
-                        stats["deaths"] += 1
-                        if mafia_count == 1:
-                            stats["deathsWith1Black"] += 1
-                        elif mafia_count == 2:
-                            stats["deathsWith2Black"] += 1
-                        elif mafia_count == 3:
-                            stats["deathsWith3Black"] += 1
-
-                    # Расчёт CI — только один раз за игру (не за каждого игрока!)
-                    # Но так как CI — это характеристика игрока, а не хода — считаем один раз на игрока
-                    # Вместо этого: CI = ширина доверительного интервала для доли успешных best_move
-                    # Мы будем считать его в финальной стадии, чтобы не дублировать
+        wins = {role: getattr(stats, f"wins_{role}") for role in ROLE_MAPPING.values() if getattr(stats, f"wins_{role}")}
+        games_played = {role: getattr(stats, f"games_{role}") for role in ROLE_MAPPING.values() if getattr(stats, f"games_{role}")}
+        role_plus = codec.loads(stats.role_plus or "{}")
 
-    # ---------------------------
-    # Расчёт CI для каждого игрока (один раз на игрока)
-    # ---------------------------
-    for key, stats in player_totals.items():
-        total_best_moves = stats["bestMovesWithBlack"]
-        total_games = stats["games_count"]
-        ci_value = calculate_ci(total_best_moves, total_games)
-        stats["ci_total"] = ci_value  # заменяем на один CI на игрока, а не сумму
+        jk_minus = jk_penalty(stats.jk_count)
 
-    # ---------------------------
-    # Формирование ответа
-    # ---------------------------
-    if not player_totals:
-        return {"players": [], "message": "Нет данных о игроках."}
+        wins_count = wins_total(stats)
+        games_count = stats.games_count
+        winrate = wins_count / games_count if games_count > 0 else 0.0
 
-    response_players = []
-    for key, stats in player_totals.items():
-        jk = stats["jk_count"]
-        jk_penalty = 0.5 * jk * (jk + 1) if jk > 0 else 0.0
-
-        wins_total = sum(stats["wins"].values())
-        games_count = stats["games_count"]
-        winrate = wins_total / games_count if games_count > 0 else 0.0
-
-        total_points = (
-            stats["total_plus"] +
-            stats["total_best_move_bonus"] +
-            stats["total_minus"] -
-            jk_penalty +
-            2.5 * wins_total +
-            stats["ci_total"]
-        )
+        # CI и итог — по общим правилам services.scoring
+        ci_total = calculate_ci(stats.best_moves_with_black, games_count)
+        points = total_points(stats)
 
-        p_value = total_points * winrate if wins_total > 0 else 0.0
+        p_value = points * winrate if wins_count > 0 else 0.0
 
-        rating_miet = calculate_location_rating(total_points, stats["games_miet"])
-        rating_mipt = calculate_location_rating(total_points, stats["games_mipt"])
-        location_rating = calculate_location_rating(total_points, games_count) if location else None
+        rating_miet = calculate_location_rating(points, stats.games_miet)
+        rating_mipt = calculate_location_rating(points, stats.games_mipt)
+        location_rating = calculate_location_rating(points, games_count) if location else None
 
         response_players.append({
             "id": key if key in user_info_map else None,
-            "name": stats["name"],
-            "nickname": stats["name"],
-            "club": stats["club"],
-            "photoUrl": stats["photoUrl"],
-            "totalPoints": round(total_points, 2),
+            "name": name,
+            "nickname": name,
+            "club": info["club"] if info else None,
+            "photoUrl": info["photoUrl"] if info else None,
+            "photoSrcset": avatar_srcset(info["photoUrl"]) if info else None,
+            "totalPoints": round(points, 2),
             "locationRating": round(location_rating, 2) if location_rating is not None else None,
             "rating_miet": round(rating_miet, 2),
             "rating_mipt": round(rating_mipt, 2),
             "winrate": round(winrate, 3),
-            "wins": dict(stats["wins"]),
-            "gamesPlayed": dict(stats["gamesPlayed"]),
-            "role_plus": {role: [round(p, 2) for p in points] for role, points in stats["role_plus"].items()},
+            "wins": wins,
+            "gamesPlayed": games_played,
+            "role_plus": {role: [round(p, 2) for p in points] for role, points in role_plus.items()},
             "p": round(p_value, 2),
-            "totalCb": round(stats["total_best_move_bonus"], 2),
-            "totalCi": round(stats["ci_total"], 2),
-            "total_sk_penalty": round(0.5 * stats["sk_count"], 2),
-            "total_jk_penalty": round(jk_penalty, 2),
-            "deaths": stats["deaths"],
-            "deathsWith1Black": stats["deathsWith1Black"],
-            "deathsWith2Black": stats["deathsWith2Black"],
-            "deathsWith3Black": stats["deathsWith3Black"],
-            "bestMovesWithBlack": stats["bestMovesWithBlack"],
-            "games_miet": stats["games_miet"],
-            "games_mipt": stats["games_mipt"],
+            "totalCb": round(stats.total_best_move_bonus, 2),
+            "totalCi": round(ci_total, 2),
+            "total_sk_penalty": round(SK_PENALTY * stats.sk_count, 2),
+            "total_jk_penalty": round(jk_minus, 2),
+            "deaths": stats.deaths,
+            "deathsWith1Black": stats.deaths_with_1_black,
+            "deathsWith2Black": stats.deaths_with_2_black,
+            "deathsWith3Black": stats.deaths_with_3_black,
+            "bestMovesWithBlack": stats.best_moves_with_black,
+            "games_miet": stats.games_miet,
+            "games_mipt": stats.games_mipt,
         })
 
     # Сортировка по totalPoints
@@ -1665,12 +1454,23 @@ async def get_player_stats(
     return {
         "players": response_players,
         "event_id": event_id,
-        "total_games": len(parsed_games)
+        "total_games": games_total
     }
 
 #Локации для рейтинга
 @router.get("/events/{event_id}/location")
-async def get_location(event_id: str, db: Session = Depends(get_db)):
+def get_location(event_id: str, request: Request, response: Response, db: Session = Depends(get_db)):
+    headers = version_headers(db, [event_scope(event_id)])
+    cached = not_modified(request, headers)
+    if cached:
+        return cached
+    response.headers.update(headers)
+
+    cache_key = ("location", event_id, None, None, None, headers["ETag"])
+    return response_cache.get_or_compute(cache_key, lambda: location_logic(event_id, db))
+
+
+def location_logic(event_id: str, db: Session):
     # валидируем событие, если это не "1"
     if event_id != "1":
         event = db.query(Event).filter(Event.id == event_id).first()
@@ -1684,32 +1484,29 @@ async def get_location(event_id: str, db: Session = Depends(get_db)):
         else (Game.event_id == event_id)
     )
 
+    # games.location под индексом (event_id, location) — без разбора JSON
     rows = (
-        db.query(
-            distinct(func.json_extract(Game.data, "$.location")).label("location")
-        )
-        .filter(base_filter)   
+        db.query(distinct(Game.location).label("location"))
+        .filter(base_filter, Game.location.isnot(None))
         .all()
     )
 
     locations = []
     for r in rows:
         loc = r.location
-        if loc in (None, "", "null"):
+        if loc in ("", "null"):
             continue
-        if isinstance(loc, str):
-            loc = loc.strip('"')
-        locations.append(loc)
+        locations.append(loc.strip('"'))
 
     return {"event_id": event_id, "locations": locations}
 
 
 @router.patch("/event/{event_id}")
-async def update_event(
+def update_event(
     event_id: str,
     request: str = Form(...),
     avatar: Optional[UploadFile] = File(None),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     if current_user.role != "admin":
@@ -1736,12 +1533,12 @@ async def update_event(
     if "dates" in update_data:
         if not isinstance(update_data["dates"], list) or not all(isinstance(d, str) for d in update_data["dates"]):
             raise HTTPException(status_code=400, detail="Поле 'dates' должно быть списком строк.")
-        update_data["dates"] = json.dumps(update_data["dates"])
+        update_data["dates"] = codec.dumps(update_data["dates"])
 
     if "seating_exclusions" in update_data:
         if not isinstance(update_data["seating_exclusions"], list) or not all(isinstance(se, str) for se in update_data["seating_exclusions"]):
             raise HTTPException(status_code=400, detail="Поле 'seating_exclusions' должно быть списком строк.")
-        update_data["seating_exclusions"] = json.dumps(update_data["seating_exclusions"])
+        update_data["seating_exclusions"] = codec.dumps(update_data["seating_exclusions"])
 
     if "participants_limit" in update_data:
         new_limit = update_data["participants_limit"]
@@ -1812,22 +1609,19 @@ async def update_event(
             raise HTTPException(status_code=400, detail="Допустим только PNG-файл")
 
         try:
-            file_content = await avatar.read()
+            file_content = avatar.file.read()
             if len(file_content) > 2 * 1024 * 1024:
                 raise HTTPException(status_code=400, detail="Файл слишком большой (макс 2MB)")
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Ошибка чтения файла: {str(e)}")
 
-        file_path = AVATAR_DIR / "events" / f"{event_id}.png"
-
+        # Имя по содержимому: URL не перезаписывается, nginx кэширует его навсегда;
+        # прежний файл уберёт services.avatar_sweeper
         try:
-            with open(file_path, "wb") as buffer:
-                buffer.write(file_content)
+            event.avatar = save_event_avatar(file_content)
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Ошибка сохранения файла: {str(e)}")
 
-        event.avatar = f"/data/avatars/events/{event_id}.png"
-
     # =====================================================
     # ---------------- ПРИМЕНЯЕМ ИЗМЕНЕНИЯ ----------------
     # =====================================================
@@ -1836,6 +1630,7 @@ async def update_event(
         for key, value in update_data.items():
             setattr(event, key, value)
 
+        bump(db, event_scope(event_id))
         db.commit()
         db.refresh(event)
 
@@ -1851,12 +1646,12 @@ async def update_event(
     # =====================================================
 
     try:
-        dates = json.loads(event.dates) if event.dates else []
+        dates = codec.loads(event.dates) if event.dates else []
     except json.JSONDecodeError:
         dates = []
 
     try:
-        seating_exclusions = json.loads(event.seating_exclusions) if event.seating_exclusions else []
+        seating_exclusions = codec.loads(event.seating_exclusions) if event.seating_exclusions else []
     except json.JSONDecodeError:
         seating_exclusions = []
 
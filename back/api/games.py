@@ -1,21 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from sqlalchemy import and_, func, or_
+import base64
 import json
 import logging
-import math
 from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Optional, Tuple
 
 
-from core.security import get_current_user, get_db
-from db.models import Game, User
+from core import codec
+from core.security import get_current_user, get_db, Principal
+from core.threadpool import call_async
+from db.models import Game, GamePlayer, User
 from schemas.main import SaveGameData
-from services.calculations import calculate_all_game_points, parse_best_move # --- ИЗМЕНЕНИЕ ---
+from services.calculations import parse_best_move
+from services.game_index import sync_game_players, delete_game_players
+from services.leaderboard import event_key, game_seat_scores
+from services.cache import response_cache
+from services.versions import USERS_SCOPE, bump, bump_games, event_scope, game_scope, not_modified, version_headers
+from services.ws_manager import ws_agent_manager
+from services.user_resolver import UserResolver, game_with_photos, players_with_photos, referenced_nicknames, seat_nicknames
 
 router = APIRouter()
 
 @router.post("/saveGameData")
-async def save_game_data(data: SaveGameData, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def save_game_data(data: SaveGameData, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="У вас нет прав для выполнения этого действия")
     player_roles = {player.get("id"): player.get("role", "").lower() for player in data.players}
@@ -79,10 +89,14 @@ async def save_game_data(data: SaveGameData, current_user: User = Depends(get_cu
         
         player["sum"] = player.get("plus", 0) + best_move_bonus + cb_bonus + team_win_bonus
 
+    # Обработчик идёт в пуле потоков, и автосохранения GamePage одной игры приходят
+    # параллельно. Версия игры поднимается до чтения: это запись, она берёт блокировку
+    # и сериализует сохранения игры — иначе две первые записи gameId обе вставят Game
+    bump(db, game_scope(data.gameId))
     existing_game = db.query(Game).filter(Game.gameId == data.gameId).first()
 
     if existing_game:
-        existing_data = json.loads(existing_game.data)
+        existing_data = codec.loads(existing_game.data)
         existing_judge = existing_data.get("gameInfo", {}).get("judgeNickname")
         if not game_info.get("judgeNickname") and existing_judge:
             game_info["judgeNickname"] = existing_judge
@@ -92,7 +106,7 @@ async def save_game_data(data: SaveGameData, current_user: User = Depends(get_cu
     if data.tableNumber is not None:
         game_info["tableNumber"] = data.tableNumber
 
-    game_json = json.dumps({
+    game_payload = {
     "players": data.players,
     "fouls": data.fouls,
     "gameInfo": game_info,
@@ -100,327 +114,163 @@ async def save_game_data(data: SaveGameData, current_user: User = Depends(get_cu
     "currentPhase": data.currentPhase,
     "badgeColor": data.badgeColor,
     "location": data.location
-}, ensure_ascii=False)
+}
+    game_json = codec.dumps(game_payload)
 
     if existing_game:
+        previous_event_id = existing_game.event_id
         existing_game.data = game_json
         existing_game.event_id = data.eventId if data.eventId != '1' else None
+        game = existing_game
     else:
-        new_game = Game(
+        game = Game(
             gameId=data.gameId, 
             data=game_json, 
             event_id=data.eventId if data.eventId != '1' else None
         )
-        db.add(new_game)
-    
+        db.add(game)
+        previous_event_id = game.event_id
+
+    sync_game_players(db, game, game_payload)
+    bump(db, event_scope(game.event_id), event_scope(previous_event_id))
     db.commit()
+
+    # Оверлеи, подписанные на /ws/game/{gameId}, получают новое состояние сразу
+    call_async(ws_agent_manager.publish_game, data.gameId, "state", game_with_photos(game_payload, db))
     return {"message": "Данные игры сохранены успешно"}
 
 
 @router.get("/getGameData/{gameId}")
-async def get_game_data(gameId: str, db: Session = Depends(get_db)):
+def get_game_data(gameId: str, request: Request, response: Response, db: Session = Depends(get_db)):
+    headers = version_headers(db, [game_scope(gameId)])
+    cached = not_modified(request, headers)
+    if cached:
+        return cached
+
     game = db.query(Game).filter(Game.gameId == gameId).first()
     if not game:
         raise HTTPException(status_code=404, detail="Игра не найдена")
-    return json.loads(game.data)
+    response.headers.update(headers)
+    return codec.loads(game.data)
 
 
 
 
 @router.get("/checkGameExists/{gameId}")
-async def check_game_exists(gameId: str, db: Session = Depends(get_db)):
+def check_game_exists(gameId: str, db: Session = Depends(get_db)):
     game = db.query(Game).filter(Game.gameId == gameId).first()
     return {"exists": game is not None}
 
 @router.delete("/deleteGame/{gameId}")
-async def delete_game(gameId: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def delete_game(gameId: str, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="У вас нет прав для выполнения этого действия")
     game = db.query(Game).filter(Game.gameId == gameId).first()
     if not game:
         raise HTTPException(status_code=404, detail="Игра не найдена")
+    delete_game_players(db, game_id=gameId)
+    bump_games(db, [gameId], game.event_id)
     db.delete(game)
     db.commit()
+    call_async(ws_agent_manager.publish_game, gameId, "deleted")
     return {"message": f"Игра с ID {gameId} успешно удалена"}
 
-def calculate_ci(x: int, n: int) -> float:
-    if n <= 0 or x < 0 or x > n:
-        return 0.0
-    K = max(0, x - n / 10)
-    if K == 0:
-        return 0.0
-    ci = K * (K + 1) / math.sqrt(n)
-    return ci
+def encode_games_cursor(game: Game) -> str:
+    raw = f"{game.created_at.isoformat()}|{game.gameId}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
 
-@router.get("/getGames")
-async def get_games(limit: int = 10, offset: int = 0, event_id: str = Query(None, description="ID события для фильтрации"), db: Session = Depends(get_db)):
-    all_users = db.query(User).all()
-    user_id_map = {user.nickname: user.id for user in all_users}
 
-    base_query = db.query(Game)
-    if event_id and event_id != 'all':
-        base_query = base_query.filter(Game.event_id == event_id)
+def decode_games_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        created_at, game_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), game_id
+    except (ValueError, UnicodeError):
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+
+
+@router.get("/getGames")
+def get_games(
+    request: Request,
+    response: Response,
+    limit: int = 10,
+    offset: int = 0,
+    cursor: Optional[str] = Query(None, description="next_cursor предыдущей страницы (вместо offset)"),
+    event_id: str = Query(None, description="ID события для фильтрации"),
+    photos: bool = Query(False, description="Добавить photoUrl каждому игроку"),
+    db: Session = Depends(get_db)
+):
+    scope_event = event_id if event_id and event_id != 'all' else None
+    page = cursor or offset
+    headers = version_headers(db, [event_scope(scope_event), USERS_SCOPE], f"{limit}:{page}" + (":photos" if photos else ""))
+    cached = not_modified(request, headers)
+    if cached:
+        return cached
+    response.headers.update(headers)
+
+    cache_key = ("games", event_key(scope_event), None, limit, page, headers["ETag"])
+    return response_cache.get_or_compute(cache_key, lambda: games_page_logic(limit, offset, cursor, scope_event, db, photos))
+
+
+def games_page_logic(limit: int, offset: int, cursor: Optional[str], scope_event: Optional[str], db: Session, photos: bool = False):
+    # Сыгранные игры — по флагу is_finished, без разбора JSON
+    played_query = db.query(Game).filter(Game.is_finished.is_(True))
+    if scope_event:
+        played_query = played_query.filter(Game.event_id == scope_event)
     else:
-        base_query = base_query.filter(or_(Game.event_id.is_(None), Game.event_id == '1'))
+        played_query = played_query.filter(or_(Game.event_id.is_(None), Game.event_id == '1'))
+
+    total_count = played_query.count()
+
+    # Keyset-пагинация по (created_at, gameId): курсор — последняя игра предыдущей страницы
+    page_query = played_query
+    if cursor:
+        cursor_created_at, cursor_game_id = decode_games_cursor(cursor)
+        page_query = page_query.filter(or_(
+            Game.created_at < cursor_created_at,
+            and_(Game.created_at == cursor_created_at, Game.gameId < cursor_game_id),
+        ))
+
+    page_query = page_query.order_by(Game.created_at.desc(), Game.gameId.desc())
+    if not cursor and offset:
+        page_query = page_query.offset(offset)
+    paginated_games = page_query.limit(limit).all()
+
+    # Очки считаются только для игр страницы — тем же движком, что и рейтинг события,
+    # поэтому сумма очков игрока по играм совпадает с его итогом в player-stats
+    seat_scores = game_seat_scores(db, scope_event, [game.gameId for game in paginated_games])
+
+    page_data = [(game, codec.loads(game.data)) for game in paginated_games]
+    nicknames = referenced_nicknames(data for _, data in page_data)
+    if photos:
+        nicknames |= seat_nicknames(p for _, data in page_data for p in data.get("players") or [])
+    users = UserResolver(db).load(nicknames)
 
-    all_games_for_calc = base_query.order_by(Game.created_at.asc()).all()
-    
-    played_games_for_calc = [
-        game for game in all_games_for_calc if json.loads(game.data).get("badgeColor")
-    ]
-    
-    # ДОБАВЛЕНО: Глобальный расчёт all_points для ci (только для event'а, если задан)
-    all_points: Dict[str, Dict[str, Any]] = defaultdict(lambda: {
-        "games_count": 0,
-        "bestMovesWithBlack": 0,
-        "ci": 0.0
-    })
-    if event_id and event_id != 'all':  # Рассчитываем глобально только если event_id задан
-        for game in played_games_for_calc:
-            data = json.loads(game.data)
-            players = data.get("players", [])
-            badge_color = data.get("badgeColor", None)
-            
-            # Сбор user_ids для замены имён
-            user_ids = set()
-            for p in players:
-                user_id = p.get("userId")
-                if user_id:
-                    if isinstance(user_id, str) and user_id.isdigit():
-                        user_ids.add(int(user_id))
-                    else:
-                        user_ids.add(user_id)
-            db_users_query = db.query(User).filter(User.id.in_(user_ids))
-            db_users = db_users_query.all()
-            user_map: Dict[Any, User] = {u.id: u for u in db_users}
-            
-            for p in players:
-                player_name = p.get("name", "").strip()
-                if not player_name:
-                    continue
-                
-                player_key = player_name
-                user_id = p.get("userId")
-                if user_id:
-                    if user_id in user_map:
-                        db_user = user_map[user_id]
-                        db_name = (db_user.nickname or db_user.name or "").strip()
-                        if db_name:
-                            player_key = db_name
-                
-                all_points[player_key]["games_count"] += 1
-                
-                # best_move логика для глобального x
-                best_move = p.get("best_move", "").strip()
-                if best_move:
-                    try:
-                        nominated_strs = [s.strip() for s in best_move.split() if s.strip().isdigit()]
-                        if len(nominated_strs) == 3:
-                            nominated_ids = []
-                            for s in nominated_strs:
-                                try:
-                                    idx = int(s) - 1
-                                    if 0 <= idx < len(players):
-                                        nominated_ids.append(players[idx]["id"])
-                                except ValueError:
-                                    continue
-                            player_roles: Dict[str, str] = {str(p.get("id", "")): p.get("role", "") for p in players}
-                            mafia_don_count = sum(1 for nid in nominated_ids if player_roles.get(str(nid), "") in ["мафия", "дон"])
-                            if mafia_don_count >= 1:
-                                all_points[player_key]["bestMovesWithBlack"] += 1
-                    except ValueError:
-                        continue
-        
-        # Рассчитываем глобальный ci для каждого игрока
-        for player_key, details in all_points.items():
-            x = details["bestMovesWithBlack"]
-            n = details["games_count"]
-            details["ci"] = calculate_ci(x, n)
-
-    total_count = len(played_games_for_calc)
-    paginated_games = sorted(played_games_for_calc, key=lambda g: g.created_at, reverse=True)[offset:offset+limit]
-    
     games_list = []
-    for game in paginated_games:
-        data = json.loads(game.data)
+    for game, data in page_data:
         players = data.get("players", [])
-        
-        # Маппинг ролей
-        role_mapping = {
-            "шериф": "sheriff",
-            "мирный": "citizen",
-            "мафия": "mafia",
-            "дон": "don"
-        }
-        
-        # player_roles для игры
-        player_roles: Dict[str, str] = {}
-        for p in players:
-            player_id = str(p.get("id", ""))
-            role = p.get("role", "")
-            player_roles[player_id] = role
-        
-        # Извлекаем badgeColor
-        badge_color = data.get("badgeColor", None)
-        
-        # Сбор user_ids
-        user_ids = set()
-        for p in players:
-            user_id = p.get("userId")
-            if user_id:
-                if isinstance(user_id, str) and user_id.isdigit():
-                    user_ids.add(int(user_id))
-                else:
-                    user_ids.add(user_id)
-        
-        # Запрос пользователей
-        db_users_query = db.query(User).filter(User.id.in_(user_ids))
-        db_users = db_users_query.all()
-        user_map: Dict[Any, User] = {u.id: u for u in db_users}
-        
-        # player_totals для этой игры
-        player_totals: Dict[str, Dict[str, Any]] = defaultdict(lambda: {
-            "total_plus_only": 0.0,
-            "games_count": 1,
-            "total_best_move_bonus": 0.0,
-            "total_minus": 0.0,
-            "bestMovesWithBlack": 0,
-            "jk_count": 0,
-            "sk_count": 0,
-            "wins": defaultdict(int),
-            "gamesPlayed": defaultdict(int),
-            "role_plus": defaultdict(list),
-            "user_id": None
-        })
-        
-        for p in players:
-            player_name = p.get("name", "").strip()
-            if not player_name:
-                continue
-            
-            player_key = player_name
-            user_id = p.get("userId")
-            if user_id:
-                player_totals[player_key]["user_id"] = user_id
-            
-            # Замена имени на DB-имя
-            if player_totals[player_key]["user_id"] in user_map:
-                db_user = user_map[player_totals[player_key]["user_id"]]
-                db_name = (db_user.nickname or db_user.name or "").strip()
-                if db_name:
-                    player_key = db_name
-            
-            player_totals[player_key]["name"] = player_key
-            
-            role = p.get("role", "")
-            english_role = role_mapping.get(role, "")
-            
-            if english_role:
-                player_totals[player_key]["gamesPlayed"][english_role] += 1
-                
-                # Логика победы с win_coefficient
-                win_condition = False
-                win_coefficient = 0.0
-                if badge_color == "red" and role in ["мирный", "шериф"]:
-                    win_condition = True
-                    win_coefficient = 2.5
-                elif badge_color == "black" and role in ["мафия", "дон"]:
-                    win_condition = True
-                    win_coefficient = 2.5
-                
-                if win_condition:
-                    player_totals[player_key]["wins"][english_role] += 1
-                
-                plus_value = p.get("plus", 0.0)
-                if isinstance(plus_value, (int, float)):
-                    player_totals[player_key]["total_plus_only"] += plus_value + win_coefficient
-                    player_totals[player_key]["role_plus"][english_role].append(plus_value)
-            
-            # best_move_bonus: Используем из JSON, если есть, иначе рассчитываем
-            best_move_bonus_from_json = p.get("best_move_bonus", 0.0)
-            has_black_in_best_move = False  # ИНИЦИАЛИЗИРУЕМ ЗДЕСЬ
-            if best_move_bonus_from_json > 0:
-                player_totals[player_key]["total_best_move_bonus"] += best_move_bonus_from_json
-            else:
-                # Расчёт, если нет в JSON
-                best_move = p.get("best_move", "").strip()
-                if best_move:
-                    try:
-                        nominated_strs = [s.strip() for s in best_move.split() if s.strip().isdigit()]
-                        if len(nominated_strs) != 3:
-                            continue
-                        nominated_ids = []
-                        for s in nominated_strs:
-                            try:
-                                idx = int(s) - 1
-                                if 0 <= idx < len(players):
-                                    nominated_ids.append(players[idx]["id"])
-                            except ValueError:
-                                continue
-                        mafia_don_count = sum(1 for nid in nominated_ids if player_roles.get(str(nid), "") in ["мафия", "дон"])
-                        bonus = 0.0
-                        if mafia_don_count == 3:
-                            bonus = 1.5
-                        elif mafia_don_count == 2:
-                            bonus = 1.0
-                        elif mafia_don_count == 1:
-                            bonus = 0.0
-                        player_totals[player_key]["total_best_move_bonus"] += bonus
-                        if mafia_don_count >= 1:
-                            has_black_in_best_move = True
-                    except ValueError:
-                        continue
-            
-            sk_count = p.get("sk", 0)
-            if isinstance(sk_count, (int, float)) and sk_count > 0:
-                player_totals[player_key]["sk_count"] += int(sk_count)
-                player_totals[player_key]["total_minus"] += -0.5 * sk_count
-            
-            jk_count = p.get("jk", 0)
-            if isinstance(jk_count, (int, float)) and jk_count > 0:
-                player_totals[player_key]["jk_count"] += int(jk_count)
-            
-            if has_black_in_best_move:
-                player_totals[player_key]["bestMovesWithBlack"] += 1
-        
+        scores_by_position = {score.position: score for score in seat_scores.get(game.gameId, [])}
+
         processed_players = []
-        for p in players:
+        for position, p in enumerate(players):
             name = p.get("name")
-            
-            player_key = name.strip() if name else ""
-            if player_key in player_totals:
-                details = player_totals[player_key]
-                # Локальный ci: часть глобального, пропорциональная x_лок / глобальный_x
-                x_лок = details["bestMovesWithBlack"]
-                глобальный_x = all_points.get(player_key, {}).get("bestMovesWithBlack", 0)
-                глобальный_ci = all_points.get(player_key, {}).get("ci", 0.0)
-                ci_лок = (глобальный_ci * x_лок / глобальный_x) if глобальный_x > 0 else 0.0
-                final_points = details["total_plus_only"] + details["total_best_move_bonus"] + details["total_minus"] + ci_лок
-                
-                m = details["jk_count"]
-                cy = 0.5 * m * (m + 1) if m > 0 else 0.0
-                total_minus = details["total_minus"] - cy
-                cb = details["total_best_move_bonus"]
-                jk = details["jk_count"]
-            else:
-                final_points = 0.0
-                jk = 0
-                ci_лок = 0.0
-                cb = 0.0
-                total_minus = 0.0
-            
+            score = scores_by_position.get(position)
+
             processed_players.append({
-                "id": user_id_map.get(name), 
+                "id": users.id_for(name),
                 "name": name,
                 "role": p.get("role", ""),
-                "points": round(final_points, 2),
+                "points": round(score.points, 2) if score else 0.0,
                 "best_move": p.get("best_move", ""),
-                "jk": jk,
-                "ci": round(ci_лок, 2),  # ci_лок вместо глобального ci
-                "cb": round(cb, 2),
-                "minuses": round(total_minus, 2)
+                "jk": score.jk if score else 0,
+                "ci": round(score.ci, 2) if score else 0.0,
+                "cb": round(score.cb, 2) if score else 0.0,
+                "minuses": round(score.minuses, 2) if score else 0.0
             })
-        
+
+        if photos:
+            processed_players = players_with_photos(processed_players, users)
+
         game_info = data.get("gameInfo", {})
         judge_nickname = game_info.get("judgeNickname")
         games_list.append({
@@ -430,42 +280,52 @@ async def get_games(limit: int = 10, offset: int = 0, event_id: str = Query(None
             "event_id": game.event_id,
             "players": processed_players,
             "judge_nickname": judge_nickname,
-            "judge_id": user_id_map.get(judge_nickname),
+            "judge_id": users.id_for(judge_nickname),
             "location": data.get("location"),
             "tableNumber": game_info.get("tableNumber"),
             "gameInfo": game_info,
         })
 
-    return {"games": games_list, "total_count": total_count}
+    next_cursor = encode_games_cursor(paginated_games[-1]) if len(paginated_games) == limit else None
+    return {"games": games_list, "total_count": total_count, "next_cursor": next_cursor}
+
+@router.get("/cacheStats")
+def get_cache_stats(current_user: Principal = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="У вас нет прав для выполнения этого действия")
+    return response_cache.stats()
+
 
 @router.get("/getGamesByLocation")
-async def get_games_by_location(
+def get_games_by_location(
+    request: Request,
+    response: Response,
     event_id: str = Query(None, description="ID события для фильтрации"),
     db: Session = Depends(get_db)
 ):
-    base_query = db.query(Game)
-
-    if event_id and event_id != "all":
-        base_query = base_query.filter(Game.event_id == event_id)
-    else:
-        base_query = base_query.filter(or_(Game.event_id.is_(None), Game.event_id == "1"))
-
-    games = base_query.all()
+    scope_event = event_id if event_id and event_id != "all" else None
+    headers = version_headers(db, [event_scope(scope_event)])
+    cached = not_modified(request, headers)
+    if cached:
+        return cached
+    response.headers.update(headers)
 
-    location_stats: Dict[str, int] = defaultdict(int)
+    cache_key = ("games-by-location", event_key(scope_event), None, None, None, headers["ETag"])
+    return response_cache.get_or_compute(cache_key, lambda: games_by_location_logic(scope_event, db))
 
-    for game in games:
-        try:
-            data = json.loads(game.data)
-        except Exception:
-            continue
 
-        location = data.get("location", "unknown")
+def games_by_location_logic(scope_event: Optional[str], db: Session):
+    base_query = db.query(Game.location, func.count())
 
-        if not location:
-            location = "unknown"
+    if scope_event:
+        base_query = base_query.filter(Game.event_id == scope_event)
+    else:
+        base_query = base_query.filter(or_(Game.event_id.is_(None), Game.event_id == "1"))
 
-        location_stats[location] += 1
+    # GROUP BY по games.location вместо разбора каждой игры
+    location_stats: Dict[str, int] = defaultdict(int)
+    for location, count in base_query.group_by(Game.location):
+        location_stats[location or "unknown"] += count
 
     result = [
         {
@@ -484,32 +344,54 @@ async def get_games_by_location(
 
 
 @router.get("/getPlayerGames/{nickname}")
-async def get_player_games(nickname: str, db: Session = Depends(get_db)):
-    all_users = db.query(User).all()
-    user_id_map = {user.nickname: user.id for user in all_users}
-
-    all_games_for_calc = db.query(Game).filter(or_(Game.event_id.is_(None), Game.event_id == '1')).order_by(Game.created_at.asc()).all()
-    
-    # --- ИЗМЕНЕНИЕ: Используем новую централизованную функцию ---
-    all_points = calculate_all_game_points(all_games_for_calc)
+def get_player_games(
+    nickname: str,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="next_cursor предыдущей страницы"),
+    db: Session = Depends(get_db)
+):
+    scope = or_(GamePlayer.event_id.is_(None), GamePlayer.event_id == '1')
 
     player_games_list = []
-    sorted_games = sorted(all_games_for_calc, key=lambda g: g.created_at, reverse=True)
-
+    # Страница игр, где игрок сидел за столом, — по индексу (name, created_at, game_id)
+    seats = db.query(GamePlayer.game_id, GamePlayer.created_at).filter(GamePlayer.name == nickname, scope)
+    if cursor:
+        cursor_created_at, cursor_game_id = decode_games_cursor(cursor)
+        seats = seats.filter(or_(
+            GamePlayer.created_at < cursor_created_at,
+            and_(GamePlayer.created_at == cursor_created_at, GamePlayer.game_id < cursor_game_id),
+        ))
+    page_ids = [game_id for game_id, _ in seats.distinct().order_by(
+        GamePlayer.created_at.desc(), GamePlayer.game_id.desc()
+    ).limit(limit)]
+    games_by_id = {game.gameId: game for game in db.query(Game).filter(Game.gameId.in_(page_ids))}
+    sorted_games = [games_by_id[game_id] for game_id in page_ids if game_id in games_by_id]
+
+    # Очки за каждую игру — вклад игры в общий рейтинг (тот же движок, что у player-stats)
+    seat_scores = game_seat_scores(db, None, [game.gameId for game in sorted_games])
+
+    page_data = []
     for game in sorted_games:
         try:
-            data = json.loads(game.data)
+            page_data.append((game, codec.loads(game.data)))
+        except (json.JSONDecodeError, TypeError):
+            continue
+    users = UserResolver(db).load(referenced_nicknames(data for _, data in page_data))
+
+    for game, data in page_data:
+        try:
             players = data.get("players", [])
             if any(p.get("name") == nickname for p in players):
+                scores_by_position = {score.position: score for score in seat_scores.get(game.gameId, [])}
                 processed_players = []
-                for p in players:
+                for position, p in enumerate(players):
                     name = p.get("name")
-                    final_points = all_points.get(name, {}).get(game.gameId, 0)
+                    score = scores_by_position.get(position)
                     processed_players.append({
-                        "id": user_id_map.get(name),
+                        "id": users.id_for(name),
                         "name": name,
                         "role": p.get("role", ""),
-                        "sum": final_points,
+                        "sum": round(score.points, 2) if score else 0,
                         "best_move": p.get("best_move", "")
                     })
                 
@@ -522,7 +404,7 @@ async def get_player_games(nickname: str, db: Session = Depends(get_db)):
                     "event_id": game.event_id,
                     "players": processed_players,
                     "judge_nickname": judge_nickname,
-                    "judge_id": user_id_map.get(judge_nickname),
+                    "judge_id": users.id_for(judge_nickname),
                     "location": data.get("location"),
                     "tableNumber": game_info.get("tableNumber"),
                     "gameInfo": game_info,
@@ -530,17 +412,35 @@ async def get_player_games(nickname: str, db: Session = Depends(get_db)):
         except (json.JSONDecodeError, TypeError):
             continue
 
-    return {"games": player_games_list}
+    next_cursor = encode_games_cursor(sorted_games[-1]) if len(page_ids) == limit and sorted_games else None
+    return {"games": player_games_list, "next_cursor": next_cursor}
 
 @router.get("/gameState")
-async def get_game_state(gameId: str, db: Session = Depends(get_db)):
+def get_game_state(
+    gameId: str,
+    request: Request,
+    response: Response,
+    photos: bool = Query(False, description="Добавить photoUrl каждому игроку"),
+    db: Session = Depends(get_db)
+):
+    # Оверлеи опрашивают каждую секунду: без изменений отвечаем 304, не читая Game.data
+    if photos:
+        # Аватары меняются вместе с версией пользователей
+        headers = version_headers(db, [game_scope(gameId), USERS_SCOPE], "photos")
+    else:
+        headers = version_headers(db, [game_scope(gameId)])
+    cached = not_modified(request, headers)
+    if cached:
+        return cached
+
     game = db.query(Game).filter(Game.gameId == gameId).first()
     if not game:
         raise HTTPException(status_code=404, detail="Game not found")
 
     try:
-        
-        return json.loads(game.data)
+        data = codec.loads(game.data)
+        response.headers.update(headers)
+        return game_with_photos(data, db) if photos else data
     except Exception:
         raise HTTPException(status_code=500, detail="Corrupted game data")
     
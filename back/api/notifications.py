@@ -5,15 +5,18 @@ import uuid
 import json
 from datetime import datetime
 
-from core.security import get_current_user, get_db
+from core import codec
+from core.security import get_current_user, get_db, Principal
 from db.models import Notification, User, Registration, Event
 from schemas.main import NotificationResponse, NotificationActionRequest, MarkNotificationsReadRequest
+from services.nicknames import mentioned_ids, render_mentions
+from services.user_resolver import UserResolver
 
 router = APIRouter(prefix="/notifications", tags=["Notifications"])
 
 @router.get("/", response_model=List[NotificationResponse])
-async def get_and_mark_all_notifications_read(
-    current_user: User = Depends(get_current_user),
+def get_and_mark_all_notifications_read(
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db),
     skip: int = 0,
     limit: int = 100
@@ -30,19 +33,29 @@ async def get_and_mark_all_notifications_read(
     ).update({"is_read": True}, synchronize_session=False)
     db.commit()
 
+    # Ники упомянутых пользователей — текущие, одним запросом на страницу
+    users = UserResolver(db).load(ids={uid for n in notifications for uid in mentioned_ids(n.message)})
+    nicknames = {}
+    for n in notifications:
+        for uid in mentioned_ids(n.message):
+            ref = users.by_id(uid)
+            if ref:
+                nicknames[uid] = ref.nickname
+
     # Декодируем JSON-строку с действиями в список для ответа
     for n in notifications:
+        n.message = render_mentions(n.message, nicknames)
         if n.actions:
             try:
-                n.actions = json.loads(n.actions)
+                n.actions = codec.loads(n.actions)
             except (json.JSONDecodeError, TypeError):
                 n.actions = []
             
     return notifications
 
 @router.get("/count_unread", response_model=int)
-async def count_unread_notifications(
-    current_user: User = Depends(get_current_user),
+def count_unread_notifications(
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     count = db.query(Notification).filter(
@@ -53,10 +66,10 @@ async def count_unread_notifications(
 
 # Эндпоинты /read и /read_all больше не нужны, но оставим /action
 @router.post("/{notification_id}/action", response_model=dict)
-async def perform_notification_action(
+def perform_notification_action(
     notification_id: str,
     request: NotificationActionRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     notification = db.query(Notification).options(selectinload(Notification.sender)).filter(Notification.id == notification_id).first()
@@ -65,7 +78,7 @@ async def perform_notification_action(
     if notification.recipient_id != current_user.id:
         raise HTTPException(status_code=403, detail="У вас нет прав на это действие")
     
-    valid_actions = json.loads(notification.actions) if notification.actions else []
+    valid_actions = codec.loads(notification.actions) if notification.actions else []
     if request.action not in valid_actions:
         raise HTTPException(status_code=400, detail="Недопустимое действие для этого уведомления")
 
@@ -77,7 +90,7 @@ async def perform_notification_action(
         action = "approve" if request.action == "approve_registration" else "reject"
         
         # 1. Выполняем основную логику (она готовит изменения, но не коммитит)
-        result = await manage_registration_logic(registration_id, action, current_user, db)
+        result = manage_registration_logic(registration_id, action, current_user, db)
         message = result.get("message", "Действие выполнено")
         
         # 2. Помечаем текущее уведомление для удаления
@@ -92,7 +105,7 @@ async def perform_notification_action(
         action = "accept" if request.action == "accept_team_invite" else "decline"
         
         # 1. Выполняем логику (она сама делает commit, т.к. может удалить команду)
-        result = await manage_team_invite_logic(team_id, action, current_user, db)
+        result = manage_team_invite_logic(team_id, action, current_user, db)
         message = result.get("message", "Действие выполнено")
 
         # 2. Удаляем текущее уведомление (если оно еще существует)
@@ -123,7 +136,7 @@ def create_notification(
         type=type,
         message=message,
         related_id=related_id,
-        actions=json.dumps(actions) if actions else None,
+        actions=codec.dumps(actions) if actions else None,
         created_at=datetime.utcnow()
     )
     db.add(notification)
@@ -133,11 +146,11 @@ def create_notification(
     return notification
 
 @router.post("/send_to_admins")
-async def send_notification_to_admins(
+def send_notification_to_admins(
     message: str,
     notification_type: str,
     related_id: Optional[str] = None,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     if current_user.role != "admin":
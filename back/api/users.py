@@ -1,68 +1,37 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, Form, UploadFile, File
 from sqlalchemy.orm import Session
-from sqlalchemy import func, or_
+from sqlalchemy import and_, func, or_, distinct
 import json
 from collections import defaultdict
 import logging
-import time
-import io
-from pathlib import Path
-from PIL import Image
-from typing import Optional
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from typing import Any, Dict, List, Optional
 import math
 import os
-import unicodedata
-import re
 
 
-from core.security import get_current_user, get_db, verify_password, get_password_hash, create_access_token
-from core.config import AVATAR_DIR, MAX_AVATAR_SIZE, PNG_SIGNATURE
-from db.models import User, Game, Registration, Notification
+from core import codec
+from core.security import get_current_user, get_db, verify_password, get_password_hash, create_user_token, invalidate_principal, revoke_tokens, Principal
+from core.config import MAX_AVATAR_SIZE, PNG_SIGNATURE
+from db.models import User, Game, GamePlayer, Registration
+from api.games import decode_games_cursor, encode_games_cursor
 from schemas.main import UpdateProfileRequest, AvatarUploadResponse, DeleteAvatarRequest, UpdateCredentialsRequest, DemoteUserRequest, GetUsersPhotosRequest, DeleteUser, ValidatePlayersRequest, ValidatePlayersResponse
 
-from services.calculations import calculate_all_game_points # --- ИЗМЕНЕНИЕ ---
+from services.game_index import BLACK_ROLES, RED_ROLES
+from services.avatars import avatar_srcset, avatar_stem, process_avatar, reuse_avatar, save_avatar_variants
 from services.search import get_player_suggestions_logic
+from services.user_resolver import UserResolver
+from services.leaderboard import event_key, rebuild_event_stats
+from services.nicknames import nickname_key, normalize_nick
+from services.versions import SEARCH_SCOPE, USERS_SCOPE, bump, bump_games
 
 router = APIRouter()
 
 
-ZERO_WIDTH = "".join([
-    "\u200b",  # zero width space
-    "\u200c",  # zero width non-joiner
-    "\u200d",  # zero width joiner
-    "\ufeff",  # BOM
-])
-
-def normalize_nick(s: Optional[str]) -> str:
-    if not s:
-        return ""
-    # NFKC приводит разные юникод-формы к канону (полезно для кириллицы/латиницы)
-    s = unicodedata.normalize("NFKC", s)
-
-    # NBSP и похожие пробелы -> обычный пробел
-    s = s.replace("\u00A0", " ").replace("\u202F", " ")
-
-    # убрать zero-width
-    for ch in ZERO_WIDTH:
-        s = s.replace(ch, "")
-
-    # схлопнуть пробелы
-    s = s.strip()
-    s = re.sub(r"\s+", " ", s)
-
-    # регистр
-    s = s.lower()
-
-    # опционально: ё -> е (если у вас бывает)
-    s = s.replace("ё", "е")
-
-    return s
-
-
 @router.post("/validatePlayers", response_model=ValidatePlayersResponse)
-async def validate_players(
+def validate_players(
     request: ValidatePlayersRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
     players = request.players or []
@@ -85,24 +54,22 @@ async def validate_players(
             errors.append(f"{p.name}: дублируется id (слот) = {p.id}")
         seen_slots.add(p.id)
 
-    # 2) Подготовим список имён
-    raw_names = [p.name for p in players if p.name and str(p.name).strip()]
-    norm_names = [normalize_nick(x) for x in raw_names if normalize_nick(x)]
-
-    # 3) Быстрый поиск "как есть" по nickname
-    users_direct = db.query(User).filter(User.nickname.in_(raw_names)).all()
-    by_direct_nick = {u.nickname: u for u in users_direct}
-
-    # 4) Fallback: нормализованный матчинг в питоне
-    # Если у тебя пользователей не миллионы — это ок. Обычно их сотни/тысячи.
-    all_users = None
-    norm_map: Dict[str, User] = {}
-    if norm_names:
-        all_users = db.query(User).all()
-        for u in all_users:
-            key = normalize_nick(u.nickname)
-            if key and key not in norm_map:
-                norm_map[key] = u
+    # 2) Подготовим список имён (нормализуем каждое один раз)
+    raw_names = list(dict.fromkeys(p.name for p in players if p.name and str(p.name).strip()))
+    norm_by_name = {name: normalize_nick(name) for name in raw_names}
+    norm_names = [n for n in set(norm_by_name.values()) if n]
+
+    # 3) Один запрос: совпадение "как есть" по nickname или по nickname_normalized
+    by_direct_nick: Dict[str, Any] = {}
+    norm_map: Dict[str, Any] = {}
+    if raw_names:
+        found = db.query(User.id, User.nickname, User.nickname_normalized).filter(
+            or_(User.nickname.in_(raw_names), User.nickname_normalized.in_(norm_names))
+        ).all()
+        for u in found:
+            by_direct_nick[u.nickname] = u
+            if u.nickname_normalized:
+                norm_map[u.nickname_normalized] = u
 
     # 5) Валидация каждого игрока: СТРОГО блокируем
     for p in players:
@@ -114,7 +81,7 @@ async def validate_players(
             "problems": [],
             "suggestedUserId": None,
             "debug": {  # можешь убрать потом
-                "normalized_name": normalize_nick(p.name),
+                "normalized_name": norm_by_name.get(p.name, ""),
             }
         }
 
@@ -137,7 +104,7 @@ async def validate_players(
         # найти юзера по нику: сначала direct, затем normalized
         u = by_direct_nick.get(p.name)
         if not u:
-            u = norm_map.get(normalize_nick(p.name))
+            u = norm_map.get(norm_by_name[p.name])
 
         if not u:
             row["status"] = "bad"
@@ -163,17 +130,17 @@ async def validate_players(
 
 
 @router.post("/getUsersPhotos")
-async def get_users_photos(request: GetUsersPhotosRequest, db: Session = Depends(get_db)):
+def get_users_photos(request: GetUsersPhotosRequest, db: Session = Depends(get_db)):
     """
     Получает аватарки для списка пользователей по их никам.
-    Возвращает список объектов: {nick: str, avatar: str | null}
+    Возвращает список объектов: {nick: str, avatar: str | null, srcset: dict | null}
     """
+    # Один IN-запрос на все ники (UserResolver), порядок и дубли — как в запросе
+    users = UserResolver(db).load(request.nicknames)
     result = []
     for nick in request.nicknames:
-        user_obj = db.query(User).filter(User.nickname == nick).first()
-        avatar = user_obj.avatar if user_obj else None  # Если пользователь не найден, avatar = None
-        result.append({"nick": nick, "avatar": avatar})
-    
+        avatar = users.avatar_for(nick)
+        result.append({"nick": nick, "avatar": avatar, "srcset": avatar_srcset(avatar)})
     return {"photos": result}
 
 
@@ -188,7 +155,7 @@ def human_size(n: int) -> str:
 
 
 @router.get("/getUsers")
-async def get_users(event_id: str = None, db: Session = Depends(get_db)):
+def get_users(event_id: str = None, db: Session = Depends(get_db)):
     if event_id is None or event_id == "1":
         users = db.query(User).all()
     else:
@@ -205,32 +172,80 @@ async def get_users(event_id: str = None, db: Session = Depends(get_db)):
     } for user in users]}
 
 
+PLAYERS_SORT_COLUMNS = ("game_count", "nickname", "last_played")
+
+
+def escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
 @router.get("/getPlayersList")
-async def get_players_list(db: Session = Depends(get_db)):
-    users = db.query(User).all()
-    games = db.query(Game).all()
-    player_game_counts = {user.nickname: 0 for user in users}
+def get_players_list(
+    limit: Optional[int] = Query(None, ge=1, le=200, description="Размер страницы; без него — весь список"),
+    offset: int = Query(0, ge=0),
+    sort: str = Query("game_count", description="game_count | nickname | last_played"),
+    order: str = Query("desc", description="asc | desc"),
+    club: Optional[str] = Query(None, description="Только игроки клуба"),
+    query: Optional[str] = Query(None, description="Подстрока никнейма"),
+    location: Optional[str] = Query(None, description="Считать только игры на локации"),
+    db: Session = Depends(get_db)
+):
+    if sort not in PLAYERS_SORT_COLUMNS:
+        raise HTTPException(status_code=400, detail=f"Сортировка возможна по: {', '.join(PLAYERS_SORT_COLUMNS)}")
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="Порядок сортировки: asc или desc")
+    return players_list_logic(limit, offset, sort, order, club, query, location, db)
+
+
+def players_list_logic(
+    limit: Optional[int], offset: int, sort: str, order: str,
+    club: Optional[str], query: Optional[str], location: Optional[str], db: Session
+):
+    # Игры и последняя игра по никнейму — один GROUP BY по game_players,
+    # фильтр, сортировка и страница — в том же запросе
+    seats = db.query(
+        GamePlayer.name.label("name"),
+        func.count(distinct(GamePlayer.game_id)).label("game_count"),
+        func.max(GamePlayer.created_at).label("last_played"),
+    ).filter(GamePlayer.name != "")
+    if location:
+        location_value = location.strip()
+        seats = seats.filter(or_(
+            GamePlayer.location == location_value,
+            func.lower(GamePlayer.location) == location_value.lower()
+        ))
+    seats = seats.group_by(GamePlayer.name).subquery()
+
+    game_count = func.coalesce(seats.c.game_count, 0)
+    players_query = db.query(User, game_count, seats.c.last_played).outerjoin(seats, seats.c.name == User.nickname)
+    if club:
+        players_query = players_query.filter(User.club == club)
+    if query and query.strip():
+        # nickname_normalized — без учёта регистра кириллицы; NULL у ников с коллизией — ищем по исходному
+        players_query = players_query.filter(or_(
+            User.nickname_normalized.like(f"%{escape_like(normalize_nick(query))}%", escape="\\"),
+            User.nickname.like(f"%{escape_like(query.strip())}%", escape="\\"),
+        ))
+
+    total_count = players_query.count()
+
+    sort_column = {"game_count": game_count, "nickname": User.nickname, "last_played": seats.c.last_played}[sort]
+    direction = sort_column.desc() if order == "desc" else sort_column.asc()
+    players_query = players_query.order_by(direction, User.nickname.asc(), User.id.asc())
+    if limit is not None:
+        players_query = players_query.offset(offset).limit(limit)
 
-    for game in games:
-        try:
-            game_data = json.loads(game.data)
-            player_names_in_game = {p.get("name") for p in game_data.get("players", []) if p.get("name")}
-            for name in player_names_in_game:
-                if name in player_game_counts:
-                    player_game_counts[name] += 1
-        except (json.JSONDecodeError, TypeError):
-            continue
-    
     players_list = [{
         "id": user.id, "nickname": user.nickname, "club": user.club,
-        "game_count": player_game_counts.get(user.nickname, 0), "photoUrl": user.avatar
-    } for user in users]
+        "game_count": count, "last_played": last_played, "photoUrl": user.avatar,
+        "photoSrcset": avatar_srcset(user.avatar)
+    } for user, count, last_played in players_query]
 
-    return {"players": sorted(players_list, key=lambda p: p["game_count"], reverse=True)}
+    return {"players": players_list, "total_count": total_count}
 
 
 @router.get("/getUser/{user_id}")
-async def get_user(user_id: str, db: Session = Depends(get_db)):
+def get_user(user_id: str, db: Session = Depends(get_db)):
     user_obj = db.query(User).filter(User.id == user_id).first()
     if not user_obj:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
@@ -238,29 +253,53 @@ async def get_user(user_id: str, db: Session = Depends(get_db)):
         "nickname": user_obj.nickname, "role": user_obj.role, "id": user_obj.id,
         "name": user_obj.name, "club": user_obj.club, "favoriteCard": user_obj.favoriteCard,
         "vk": user_obj.vk, "tg": user_obj.tg, "site1": user_obj.site1,
-        "site2": user_obj.site2, 'photoUrl': user_obj.avatar
+        "site2": user_obj.site2, 'photoUrl': user_obj.avatar, 'photoSrcset': avatar_srcset(user_obj.avatar)
     }}
 
 
 @router.get("/users/{user_id}/games")
-async def get_user_games_data(user_id: str, db: Session = Depends(get_db)):
-    games = db.query(Game).all()
+def get_user_games_data(
+    user_id: str,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="next_cursor предыдущей страницы"),
+    db: Session = Depends(get_db)
+):
+    return user_games_page_logic(user_id, limit, cursor, db)
 
-    result = []
 
-    for game in games:
+def user_games_page_logic(user_id: str, limit: int, cursor: Optional[str], db: Session):
+    # Места игрока по индексу (user_id, created_at, game_id): страница новых игр
+    # без чтения остальной истории
+    seats = db.query(GamePlayer.game_id, GamePlayer.created_at).filter(GamePlayer.user_id == user_id)
+    total_count = seats.distinct().count()
+
+    if cursor:
+        cursor_created_at, cursor_game_id = decode_games_cursor(cursor)
+        seats = seats.filter(or_(
+            GamePlayer.created_at < cursor_created_at,
+            and_(GamePlayer.created_at == cursor_created_at, GamePlayer.game_id < cursor_game_id),
+        ))
+    page_ids = [game_id for game_id, _ in seats.distinct().order_by(
+        GamePlayer.created_at.desc(), GamePlayer.game_id.desc()
+    ).limit(limit)]
+
+    games_by_id = {game.gameId: game for game in db.query(Game).filter(Game.gameId.in_(page_ids))}
+    page_games = [games_by_id[game_id] for game_id in page_ids if game_id in games_by_id]
+
+    result = []
+    for game in page_games:
         if not game.data:
             continue
 
         try:
-            data = json.loads(game.data)
+            data = codec.loads(game.data)
         except json.JSONDecodeError:
             continue  # защита от битых данных
 
         players = data.get("players", [])
         
         for player in players:
-            if player.get("userId") == user_id:
+            if str(player.get("userId")) == user_id:
                 result.append({
                     "gameId": game.gameId,
                     "event_id": game.event_id,
@@ -270,20 +309,73 @@ async def get_user_games_data(user_id: str, db: Session = Depends(get_db)):
                 })
                 break
 
-    
-    return result
+    next_cursor = encode_games_cursor(page_games[-1]) if len(page_ids) == limit and page_games else None
+    return {
+        "games": result,
+        "total_count": total_count,
+        "next_cursor": next_cursor,
+        "stats": user_role_stats(db, user_id),
+    }
+
+
+ROLE_LABELS = {"мирный": "Мирный", "шериф": "Шериф", "мафия": "Мафия", "дон": "Дон"}
+
+
+def user_role_stats(db: Session, user_id: str) -> Dict[str, Any]:
+    """Победы по ролям за всю историю — GROUP BY по game_players, а не по загруженным страницам."""
+    stats = {
+        "totalGames": 0,
+        "totalWins": 0,
+        "totalLosses": 0,
+        "winrate": 0,
+        "byRole": {label: {"games": 0, "wins": 0} for label in (
+            "Черная карта", "Дон", "Мафия", "Красная карта", "Шериф", "Мирный"
+        )},
+    }
+
+    rows = db.query(
+        GamePlayer.role, GamePlayer.badge_color, func.count(distinct(GamePlayer.game_id))
+    ).filter(GamePlayer.user_id == user_id).group_by(GamePlayer.role, GamePlayer.badge_color)
+
+    for role, badge_color, count in rows:
+        # lower() в Python: SQLite меняет регистр только у латиницы
+        role = (role or "").lower()
+        if not role:
+            continue
+        is_red, is_black = role in RED_ROLES, role in BLACK_ROLES
+        wins = count if (badge_color == "red" and is_red) or (badge_color == "black" and is_black) else 0
+
+        # Сыгранные — только с победителем; по ролям — все места
+        if badge_color in ("red", "black"):
+            stats["totalGames"] += count
+            stats["totalWins"] += wins
+            stats["totalLosses"] += count - wins
+
+        labels = [ROLE_LABELS.get(role)]
+        if is_red:
+            labels.append("Красная карта")
+        if is_black:
+            labels.append("Черная карта")
+        for label in labels:
+            if label:
+                stats["byRole"][label]["games"] += count
+                stats["byRole"][label]["wins"] += wins
+
+    if stats["totalGames"] > 0:
+        stats["winrate"] = round(stats["totalWins"] / stats["totalGames"] * 100)
+    return stats
 
 
 @router.get("/getUserPhoto/{nickname}")
-async def get_user_photo(nickname: str, db: Session = Depends(get_db)):
+def get_user_photo(nickname: str, db: Session = Depends(get_db)):
     user_obj = db.query(User).filter(User.nickname == nickname).first()
     if not user_obj:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
-    return {"photoUrl": user_obj.avatar}
+    return {"photoUrl": user_obj.avatar, "photoSrcset": avatar_srcset(user_obj.avatar)}
 
 
 @router.post("/updateProfile")
-async def update_profile(request: UpdateProfileRequest, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def update_profile(request: UpdateProfileRequest, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
     if current_user.id != request.userId and current_user.role != "admin":
         raise HTTPException(status_code=403, detail="У вас нет прав для обновления этого профиля")
 
@@ -302,14 +394,15 @@ async def update_profile(request: UpdateProfileRequest, current_user: User = Dep
     user_to_update.tg = request.tg
     user_to_update.site1 = request.site1
     user_to_update.site2 = request.site2
+    bump(db, USERS_SCOPE)
     db.commit()
     return {"message": "Профиль обновлен успешно"}
 
 
 @router.delete("/deleteUser")
-async def delete_user(
+def delete_user(
     request: DeleteUser,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
     # Проверка прав
@@ -328,7 +421,9 @@ async def delete_user(
         )
 
     db.delete(user)
+    bump(db, USERS_SCOPE, SEARCH_SCOPE)
     db.commit()
+    invalidate_principal(user.id)
 
     return {
         "status": "success",
@@ -337,79 +432,63 @@ async def delete_user(
 
 
 @router.get("/get_player_suggestions")
-async def get_player_suggestions(query: str, db: Session = Depends(get_db)):
+def get_player_suggestions(query: str, db: Session = Depends(get_db)):
     return get_player_suggestions_logic(query, db)
 
 
 @router.post("/profile/avatar", response_model=AvatarUploadResponse)
-async def upload_avatar(userId: str = Form(...), avatar: UploadFile = File(...), current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def upload_avatar(userId: str = Form(...), avatar: UploadFile = File(...), current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
     if str(current_user.id) != str(userId) and current_user.role != "admin":
         raise HTTPException(status_code=403, detail="У вас нет прав для обновления этого аватара")
 
-    user = db.query(User).filter(User.id == userId).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="Пользователь не найден")
-    
-    old_avatar_url = user.avatar
-
     if avatar.content_type != "image/png":
         raise HTTPException(status_code=400, detail="Допустим только PNG-файл")
 
-    contents = await avatar.read()
+    contents = avatar.file.read()
     if len(contents) > MAX_AVATAR_SIZE:
         raise HTTPException(status_code=413, detail=f"Файл слишком большой. Лимит: {human_size(MAX_AVATAR_SIZE)}")
     
     if not contents.startswith(PNG_SIGNATURE):
         raise HTTPException(status_code=400, detail="Файл не является корректным PNG")
 
-    try:
-        with Image.open(io.BytesIO(contents)) as im:
-            w, h = im.size
-            side = min(w, h)
-            im = im.crop(((w - side) // 2, (h - side) // 2, (w + side) // 2, (h + side) // 2))
-            im = im.resize((512, 512), Image.LANCZOS)
-            if im.mode not in ("RGB", "RGBA"):
-                im = im.convert("RGBA")
-            out_buf = io.BytesIO()
-            im.save(out_buf, format="PNG", optimize=True, compress_level=9)
-            safe_png = out_buf.getvalue()
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Не удалось обработать изображение: {e}")
+    # Имя — хэш содержимого: тот же файл уже обработан — берём готовые варианты.
+    # Иначе Pillow в пуле процессов services.avatars, до обращения к БД:
+    # соединение из пула не занято, пока картинка обрабатывается
+    stem = avatar_stem(contents)
+    url = reuse_avatar(stem)
+    if url is None:
+        try:
+            variants = process_avatar(contents)
+        except FuturesTimeoutError:
+            raise HTTPException(status_code=503, detail="Обработка изображения заняла слишком много времени, попробуйте позже")
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Не удалось обработать изображение: {e}")
 
-    filename = f"{userId}_v{int(time.time())}.png"
-    filepath = AVATAR_DIR / filename
+        try:
+            url = save_avatar_variants(stem, variants)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Ошибка записи файла: {e}")
 
-    try:
-        with open(filepath, "wb") as f:
-            f.write(safe_png)
-        os.chmod(filepath, 0o644)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Ошибка записи файла: {e}")
+    user = db.query(User).filter(User.id == userId).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="Пользователь не найден")
 
-    url = f"/data/avatars/{filename}"
-    try:
-        user.avatar = url
-        db.commit()
-    except Exception as e:
-        db.rollback()
-        if filepath.is_file():
-            filepath.unlink()
-        raise HTTPException(status_code=500, detail=f"Не удалось обновить профиль: {e}")
-    
-    if old_avatar_url:
+    # Старые файлы не удаляем: их может использовать другой пользователь или событие,
+    # неиспользуемые убирает services.avatar_sweeper
+    if user.avatar != url:
         try:
-            old_filename = Path(old_avatar_url.lstrip('/')).name
-            old_filepath = AVATAR_DIR / old_filename
-            if old_filepath.is_file() and old_filepath != filepath:
-                old_filepath.unlink()
+            user.avatar = url
+            bump(db, USERS_SCOPE)
+            db.commit()
         except Exception as e:
-            print(f"Could not delete old avatar {old_avatar_url}: {e}")
+            db.rollback()
+            raise HTTPException(status_code=500, detail=f"Не удалось обновить профиль: {e}")
 
-    return AvatarUploadResponse(url=url)
+    return AvatarUploadResponse(url=url, srcset=avatar_srcset(url))
 
 
 @router.delete("/profile/avatar")
-async def delete_avatar(request: DeleteAvatarRequest, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def delete_avatar(request: DeleteAvatarRequest, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
     if str(current_user.id) != str(request.userId) and current_user.role != "admin":
         raise HTTPException(status_code=403, detail="У вас нет прав для удаления этого аватара")
 
@@ -417,30 +496,23 @@ async def delete_avatar(request: DeleteAvatarRequest, current_user: User = Depen
     if not user:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
 
-    old_avatar_url = user.avatar
-    if not old_avatar_url:
+    if not user.avatar:
         return {"message": "Аватар уже был удален."}
 
     try:
         user.avatar = None
+        bump(db, USERS_SCOPE)
         db.commit()
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Не удалось обновить профиль: {e}")
 
-    try:
-        old_filename = Path(old_avatar_url.lstrip('/')).name
-        old_filepath = AVATAR_DIR / old_filename
-        if old_filepath.is_file():
-            old_filepath.unlink()
-    except Exception as e:
-        print(f"Could not delete avatar file {old_avatar_url}: {e}")
-
+    # Файлы удалит services.avatar_sweeper, если на них больше никто не ссылается
     return {"message": "Аватар успешно удален"}
 
 
 @router.post("/update_credentials")
-async def update_credentials(request: UpdateCredentialsRequest, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def update_credentials(request: UpdateCredentialsRequest, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
     if current_user.id != request.userId and current_user.role != "admin":
         raise HTTPException(status_code=403, detail="У вас нет прав для изменения этих данных")
 
@@ -457,17 +529,31 @@ async def update_credentials(request: UpdateCredentialsRequest, current_user: Us
         old_nickname = user_to_update.nickname
         new_nickname = request.new_nickname
 
-        existing_user = db.query(User).filter(User.nickname == new_nickname).first()
+        new_normalized = nickname_key(new_nickname)
+        conflicts = [User.nickname == new_nickname]
+        if new_normalized:
+            conflicts.append(User.nickname_normalized == new_normalized)
+        existing_user = db.query(User).filter(User.id != user_to_update.id, or_(*conflicts)).first()
         if existing_user:
             raise HTTPException(status_code=400, detail="Этот никнейм уже занят")
         
         user_to_update.nickname = new_nickname
+        user_to_update.nickname_normalized = new_normalized
+        revoke_tokens(user_to_update)
         token_needs_refresh = True
 
-        all_games = db.query(Game).all()
-        for game in all_games:
+        # Только игры, где ник сидит за столом (game_players.name) или судит
+        # (games.judge_nickname), — оба столбца под индексом
+        seated_game_ids = db.query(GamePlayer.game_id).filter(GamePlayer.name == old_nickname)
+        affected_games = db.query(Game).filter(or_(
+            Game.gameId.in_(seated_game_ids),
+            Game.judge_nickname == old_nickname,
+        )).all()
+
+        renamed_game_ids = []
+        for game in affected_games:
             try:
-                game_data = json.loads(game.data)
+                game_data = codec.loads(game.data)
                 is_game_updated = False
                 for player in game_data.get("players", []):
                     if player.get("name") == old_nickname:
@@ -475,32 +561,46 @@ async def update_credentials(request: UpdateCredentialsRequest, current_user: Us
                         is_game_updated = True
                 if game_data.get("gameInfo", {}).get("judgeNickname") == old_nickname:
                     game_data["gameInfo"]["judgeNickname"] = new_nickname
+                    game.judge_nickname = new_nickname
                     is_game_updated = True
                 
                 if is_game_updated:
-                    game.data = json.dumps(game_data, ensure_ascii=False)
+                    game.data = codec.dumps(game_data)
+                    renamed_game_ids.append(game.gameId)
             except (json.JSONDecodeError, TypeError):
                 continue
 
-        db.query(Notification).filter(
-            Notification.message.contains(old_nickname)
-        ).update(
-            {Notification.message: func.replace(Notification.message, old_nickname, new_nickname)},
+        db.query(GamePlayer).filter(GamePlayer.name == old_nickname).update(
+            {GamePlayer.name: new_nickname},
             synchronize_session=False
         )
+
+        # Места без userId агрегируются по имени — пересчитываем рейтинг затронутых событий
+        # None и "1" — один рейтинг (event_key), пересчитываем его один раз
+        renamed_events = {event_key(ev_id) for (ev_id,) in db.query(GamePlayer.event_id).filter(
+            GamePlayer.name == new_nickname,
+            GamePlayer.user_id.is_(None)
+        ).distinct()}
+        for renamed_event_id in renamed_events:
+            rebuild_event_stats(db, renamed_event_id)
+
+        # Ники видны во всех событиях — достаточно версии пользователей и самих игр
+        bump_games(db, renamed_game_ids)
+        bump(db, USERS_SCOPE, SEARCH_SCOPE)
+        # Уведомления ссылаются на пользователей по id (services.nicknames.mention) — их не трогаем
         
     if request.new_password:
         user_to_update.hashed_password = get_password_hash(request.new_password)
 
     db.commit()
     db.refresh(user_to_update)
+    if token_needs_refresh:
+        invalidate_principal(user_to_update.id)
 
     response_data = {"message": "Данные успешно обновлены"}
 
     if token_needs_refresh:
-        new_token = create_access_token(
-            data={"sub": user_to_update.nickname, "role": user_to_update.role, "id": user_to_update.id}
-        )
+        new_token = create_user_token(user_to_update)
         response_data["new_token"] = new_token
         response_data["message"] = "Никнейм успешно изменен. Данные во всех записях обновлены. Пожалуйста, используйте новый токен."
 
@@ -1,6 +1,12 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from core.security import ws_get_current_user
-from services.ws_manager import ws_agent_manager, AgentConnection,  ControlConnection
+from core.threadpool import run_db
+from db.base import SessionLocal
+from db.models import Game
+from services.ws_manager import ws_agent_manager, AgentConnection,  ControlConnection, game_message
+from services.user_resolver import game_with_photos
+import json
+from core import codec
 import uuid
 
 router = APIRouter()
@@ -8,7 +14,7 @@ router = APIRouter()
 @router.websocket("/ws/agent")
 async def ws_agent(websocket: WebSocket):
     token = websocket.query_params.get("token")
-    user = ws_get_current_user(token)
+    user = await run_db(ws_get_current_user, token)
 
     await websocket.accept()
 
@@ -63,7 +69,7 @@ async def ws_agent(websocket: WebSocket):
 @router.websocket("/ws/control")
 async def ws_control(websocket: WebSocket):
     token = (websocket.query_params.get("token") or "").strip()
-    user = ws_get_current_user(token)
+    user = await run_db(ws_get_current_user, token)
 
     # если хочешь только админам:
     if user.role != "admin":
@@ -118,4 +124,47 @@ async def ws_control(websocket: WebSocket):
     except WebSocketDisconnect:
         pass
     finally:
-        await ws_agent_manager.disconnect_control(control_id)
\ No newline at end of file
+        await ws_agent_manager.disconnect_control(control_id)
+
+
+def load_game_data(game_id: str):
+    db = SessionLocal()
+    try:
+        game = db.query(Game).filter(Game.gameId == game_id).first()
+        # Снимок для оверлеев — сразу с photoUrl у мест (как gameState?photos=1)
+        return game_with_photos(codec.loads(game.data), db) if game and game.data else None
+    except (json.JSONDecodeError, TypeError):
+        return None
+    finally:
+        db.close()
+
+
+@router.websocket("/ws/game/{gameId}")
+async def ws_game(websocket: WebSocket, gameId: str):
+    # Оверлеи трансляции: снимок при подписке, дальше — только публикации из saveGameData
+    await websocket.accept()
+
+    snapshot = await ws_agent_manager.subscribe_game(gameId, websocket)
+    try:
+        if snapshot is None:
+            data = await run_db(load_game_data, gameId)
+
+            if data is None:
+                await websocket.send_text(game_message(gameId, "not_found"))
+            else:
+                snapshot = await ws_agent_manager.remember_game_state(
+                    gameId, game_message(gameId, "state", data)
+                )
+
+        if snapshot is not None:
+            await websocket.send_text(snapshot)
+
+        while True:
+            msg = await websocket.receive_json()
+            if msg.get("type") == "ping":
+                await websocket.send_json({"type": "pong"})
+
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await ws_agent_manager.unsubscribe_game(gameId, websocket)
@@ -0,0 +1,72 @@
+"""Замер обработки аватаров: Pillow в потоках обработчиков против пула процессов services.avatars.
+
+Имитирует N одновременных загрузок. Параллельно тикает поток раз в 10 мс —
+его максимальная задержка показывает, насколько Pillow держит GIL и тормозит
+остальные запросы процесса.
+
+Запуск из каталога back:  python -m benchmarks.bench_avatar [загрузок]
+"""
+import io
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from core.config import AVATAR_WORKERS
+from services.avatars import process_avatar, render_avatar_variants, shutdown_avatar_pool
+
+TICK = 0.01
+
+
+def sample_png() -> bytes:
+    # Фото с телефона после кадрирования на клиенте: ~1200x1600, PNG до 2 МБ
+    im = Image.radial_gradient("L").resize((1200, 1600)).convert("RGB")
+    im = Image.merge("RGB", (im.getchannel(0), im.getchannel(0).rotate(90), Image.effect_noise((1200, 1600), 40)))
+    buf = io.BytesIO()
+    im.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def run(uploads: int, contents: bytes, label: str, render) -> None:
+    stop = threading.Event()
+    stalls = []
+
+    def ticker():
+        while not stop.is_set():
+            started = time.perf_counter()
+            time.sleep(TICK)
+            stalls.append(time.perf_counter() - started - TICK)
+
+    tick_thread = threading.Thread(target=ticker)
+    tick_thread.start()
+
+    started = time.perf_counter()
+    # Потоки — как пул обработчиков FastAPI
+    with ThreadPoolExecutor(max_workers=uploads) as handlers:
+        results = list(handlers.map(lambda _: render(contents), range(uploads)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    tick_thread.join()
+
+    assert all(len(r) == len(results[0]) for r in results)
+    print(f"{label:<24} {elapsed:6.2f} с  {uploads / elapsed:5.1f} загрузок/с  "
+          f"макс. задержка потока {max(stalls, default=0) * 1000:7.1f} мс")
+
+
+def main() -> None:
+    uploads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    contents = sample_png()
+    variants = render_avatar_variants(contents)
+    print(f"{uploads} одновременных загрузок, исходник {len(contents) / 1024:.0f} КБ")
+    print("варианты: " + ", ".join(f"{k} {len(v) / 1024:.1f} КБ" for k, v in variants.items()))
+
+    process_avatar(contents)  # прогрев: запуск процессов пула
+    run(uploads, contents, "в потоках обработчиков", render_avatar_variants)
+    run(uploads, contents, f"пул (процессов: {AVATAR_WORKERS})", process_avatar)
+    shutdown_avatar_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Замер кодека JSON (core.codec) против стандартного json на блобах Game.data.
+
+Запуск из каталога back:  python -m benchmarks.bench_codec [игр] [повторов]
+"""
+import json
+import random
+import sys
+import time
+
+from core import codec
+
+ROLES = ["мирный"] * 6 + ["шериф", "мафия", "мафия", "дон"]
+PHASES = ["ночь", "день", "голосование"]
+
+
+def make_blob(rnd: random.Random) -> dict:
+    """Game.data в том виде, в каком его сохраняет GamePage (saveGameData)."""
+    roles = ROLES[:]
+    rnd.shuffle(roles)
+    players = []
+    for seat in range(10):
+        user = rnd.randrange(300)
+        players.append({
+            "id": seat + 1,
+            "userId": f"user_{user}",
+            "name": f"Игрок_{user}",
+            "role": roles[seat],
+            "plus": rnd.choice([0, 0.25, 0.5, 1, 2.5]),
+            "sk": int(rnd.random() < 0.05),
+            "jk": int(rnd.random() < 0.05),
+            "best_move": rnd.choice(["", "", "1 5 7"]),
+            "fouls": rnd.randrange(4),
+            "isAlive": rnd.random() < 0.6,
+            "technicalFouls": 0,
+            "personalFouls": rnd.randrange(3),
+        })
+    days = rnd.randrange(2, 6)
+    return {
+        "players": players,
+        "fouls": [{"playerId": rnd.randrange(1, 11), "count": rnd.randrange(1, 4)} for _ in range(rnd.randrange(6))],
+        "gameInfo": {
+            "votingResults": {
+                str(day): {"candidates": rnd.sample(range(1, 11), 3), "votes": [rnd.randrange(6) for _ in range(3)]}
+                for day in range(days)
+            },
+            "shootingResults": {str(day): rnd.randrange(1, 11) for day in range(days)},
+            "donResults": {str(day): rnd.randrange(1, 11) for day in range(days)},
+            "sheriffResults": {str(day): rnd.randrange(1, 11) for day in range(days)},
+            "judgeNickname": f"Судья_{rnd.randrange(10)}",
+            "tableNumber": rnd.randrange(1, 5),
+            "breakdownSource": rnd.choice(["", "black", "red"]),
+            "breakdownPlayerNumber": None,
+        },
+        "currentDay": f"Д{days}",
+        "currentPhase": rnd.choice(PHASES),
+        "badgeColor": rnd.choice(["red", "black"]),
+        "location": rnd.choice(["МИЭТ", "МФТИ"]),
+    }
+
+
+def timed(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def report(label: str, stdlib: float, fast: float) -> None:
+    print(f"{label:<28} json {stdlib * 1000:8.1f} мс   {codec.BACKEND} {fast * 1000:8.1f} мс   x{stdlib / fast:.1f}")
+
+
+def main() -> None:
+    games = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    rnd = random.Random(42)
+
+    blobs = [make_blob(rnd) for _ in range(games)]
+    stored = [json.dumps(blob, ensure_ascii=False) for blob in blobs]
+    # Ответ уровня getEvent/getGames: все игры одним документом
+    payload = {"games": blobs, "total_count": games}
+
+    print(f"{games} игр, средний блоб {sum(map(len, stored)) // games} символов, бэкенд: {codec.BACKEND}")
+    report(
+        "разбор Game.data",
+        timed(lambda: [json.loads(s) for s in stored], repeat),
+        timed(lambda: [codec.loads(s) for s in stored], repeat),
+    )
+    report(
+        "запись Game.data",
+        timed(lambda: [json.dumps(b, ensure_ascii=False) for b in blobs], repeat),
+        timed(lambda: [codec.dumps(b) for b in blobs], repeat),
+    )
+    # Так кодирует тело ответа starlette.JSONResponse
+    report(
+        "тело ответа",
+        timed(lambda: json.dumps(payload, ensure_ascii=False, allow_nan=False, indent=None,
+                                 separators=(",", ":")).encode("utf-8"), repeat),
+        timed(lambda: codec.dumps_bytes(payload), repeat),
+    )
+
+
+if __name__ == "__main__":
+    main()
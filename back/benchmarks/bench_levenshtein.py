@@ -0,0 +1,92 @@
+"""Замер bounded_levenshtein (services.search) против полной матрицы Левенштейна.
+
+Нагрузка — та же, что у прежних подсказок: каждый запрос сравнивается со всеми
+именами, нужен только ответ «расстояние <= 2». Имена берутся из БД
+(DATABASE_URL), если она доступна, иначе генерируются.
+
+Запуск из каталога back:  python -m benchmarks.bench_levenshtein [запросов]
+"""
+import random
+import sys
+import time
+
+from services.search import MAX_DISTANCE, bounded_levenshtein, bounded_levenshtein_many
+
+
+def levenshtein_distance(s1, s2):
+    # Прежняя реализация из services.search — полная матрица DP
+    if len(s1) < len(s2):
+        return levenshtein_distance(s2, s1)
+    if len(s2) == 0:
+        return len(s1)
+    previous_row = range(len(s2) + 1)
+    for i, c1 in enumerate(s1):
+        current_row = [i + 1]
+        for j, c2 in enumerate(s2):
+            insertions = previous_row[j + 1] + 1
+            deletions = current_row[j] + 1
+            substitutions = previous_row[j] + (c1 != c2)
+            current_row.append(min(insertions, deletions, substitutions))
+        previous_row = current_row
+    return previous_row[-1]
+
+
+def load_names() -> list:
+    try:
+        from db.base import SessionLocal
+        from services.search import get_all_player_names
+
+        db = SessionLocal()
+        try:
+            names = get_all_player_names(db)
+        finally:
+            db.close()
+        if names:
+            return [name.lower() for name in names]
+    except Exception as exc:  # нет БД или схема старая — замер на синтетике
+        print(f"БД недоступна ({exc.__class__.__name__}), имена генерируются")
+
+    rnd = random.Random(42)
+    syllables = ["ка", "ми", "ло", "ра", "ни", "ka", "mi", "lo", "ra", "ni", "sh", "ex", "ёж"]
+    return sorted({
+        "".join(rnd.choice(syllables) for _ in range(rnd.randint(2, 6))) + (str(rnd.randint(1, 99)) if rnd.random() < 0.1 else "")
+        for _ in range(3000)
+    })
+
+
+def make_queries(names: list, count: int) -> list:
+    rnd = random.Random(7)
+    queries = []
+    for name in rnd.sample(names, min(count, len(names))):
+        query = list(name[:rnd.randint(1, len(name))])
+        if len(query) > 2:
+            query[rnd.randrange(len(query))] = rnd.choice("аеиоуaeiou")
+        queries.append("".join(query))
+    return queries
+
+
+def main() -> None:
+    names = load_names()
+    queries = make_queries(names, int(sys.argv[1]) if len(sys.argv) > 1 else 50)
+    pairs = len(names) * len(queries)
+    print(f"{len(names)} имён, {len(queries)} запросов, {pairs} пар")
+
+    started = time.perf_counter()
+    full = [[levenshtein_distance(name, query) <= MAX_DISTANCE for name in names] for query in queries]
+    full_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    bounded = [[bounded_levenshtein(name, query) <= MAX_DISTANCE for name in names] for query in queries]
+    bounded_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    batched = [[d <= MAX_DISTANCE for d in bounded_levenshtein_many(query, names)] for query in queries]
+    batched_time = time.perf_counter() - started
+
+    assert full == bounded == batched, "результаты расходятся"
+    for label, elapsed in (("полная матрица", full_time), ("полоса + отсечение", bounded_time), ("пакетно", batched_time)):
+        print(f"{label:<20} {elapsed * 1000:9.1f} мс  {elapsed / pairs * 1e6:6.2f} мкс/пара  x{full_time / elapsed:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Замер пропускной способности входа: bcrypt в event loop против пула core.security.
+
+Имитирует одновременный вход N игроков турнира. Параллельно тикает корутина
+раз в 10 мс — её максимальная задержка показывает, насколько блокируется
+event loop (а с ним WebSocket'ы оверлеев и остальные запросы).
+
+Запуск из каталога back:  python -m benchmarks.bench_login [входов]
+"""
+import asyncio
+import sys
+import time
+
+from core.config import PASSWORD_HASH_WORKERS
+from core.security import pwd_context, verify_password_async
+
+TICK = 0.01
+
+
+async def ticker(stop: asyncio.Event, stalls: list) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(TICK)
+        stalls.append(time.perf_counter() - started - TICK)
+
+
+async def run(logins: int, hashed: str, inline: bool) -> None:
+    async def login() -> bool:
+        if inline:
+            # Как было: async-обработчик вызывает bcrypt напрямую
+            return pwd_context.verify("password", hashed)
+        return await verify_password_async("password", hashed)
+
+    stop = asyncio.Event()
+    stalls: list = []
+    tick_task = asyncio.create_task(ticker(stop, stalls))
+    await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await tick_task
+
+    assert all(results)
+    label = "в event loop" if inline else f"пул ({PASSWORD_HASH_WORKERS} потоков)"
+    print(f"{label:<22} {elapsed:6.2f} с  {logins / elapsed:6.1f} входов/с  "
+          f"макс. задержка loop {max(stalls, default=0) * 1000:7.1f} мс")
+
+
+def main() -> None:
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    hashed = pwd_context.hash("password")
+    print(f"{logins} одновременных входов, bcrypt rounds={hashed.split('$')[2]}")
+    asyncio.run(run(logins, hashed, inline=True))
+    asyncio.run(run(logins, hashed, inline=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Замер движка подсчёта очков (services.scoring) без БД.
+
+Запуск из каталога back:  python -m benchmarks.bench_scoring [игр] [игроков]
+"""
+import random
+import sys
+import time
+from collections import namedtuple
+
+from services.scoring import SEAT_FIELDS, ScoringEngine
+
+# Те же строки, что отдаёт services.leaderboard.event_seats_query
+Seat = namedtuple("Seat", SEAT_FIELDS)
+
+ROLES = ["мирный"] * 6 + ["шериф", "мафия", "мафия", "дон"]
+
+
+def make_rows(games: int, pool: int) -> list:
+    rnd = random.Random(42)
+    rows = []
+    for g in range(games):
+        badge = rnd.choice(["red", "black"])
+        roles = ROLES[:]
+        rnd.shuffle(roles)
+        for position, user in enumerate(rnd.sample(range(pool), 10)):
+            role = roles[position]
+            rows.append(Seat(
+                game_id=f"g{g}", event_id=None, user_id=f"user_{user}", name=f"Nick{user}",
+                position=position, role=role,
+                plus=rnd.choice([0.0, 0.25, 0.5, 1.0]),
+                sk=int(rnd.random() < 0.05), jk=int(rnd.random() < 0.05),
+                best_move_black=rnd.choice([None, None, 1, 2, 3]),
+                is_win=(badge == "red") == (role in ("мирный", "шериф")),
+                location=rnd.choice(["МИЭТ", "МФТИ"]),
+            ))
+    return rows
+
+
+def main() -> None:
+    games = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    pool = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    rows = make_rows(games, pool)
+
+    started = time.perf_counter()
+    engine = ScoringEngine()
+    engine.run(rows)
+    engine.totals()
+    elapsed = time.perf_counter() - started
+
+    print(f"{games} игр, {len(rows)} мест: {elapsed * 1000:.1f} мс ({len(rows) / elapsed:,.0f} мест/с)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+# Кодек JSON для Game.data, служебных JSON-колонок и ответов API.
+# С orjson разбор и сериализация больших блобов в разы быстрее; без него —
+# стандартный json с теми же параметрами, что и раньше (ensure_ascii=False).
+# Замер: python -m benchmarks.bench_codec
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - зависит от окружения
+    orjson = None
+
+BACKEND = "orjson" if orjson else "json"
+
+# Ошибка разбора: orjson.JSONDecodeError — наследник json.JSONDecodeError,
+# поэтому существующие except json.JSONDecodeError продолжают работать
+JSONDecodeError = json.JSONDecodeError
+
+
+def _check_input(s: Any) -> None:
+    # Как у json.loads: None и прочие не-строки — TypeError, а не ошибка разбора
+    if not isinstance(s, (str, bytes, bytearray, memoryview)):
+        raise TypeError(f"the JSON object must be str or bytes, not {type(s).__name__}")
+
+
+if orjson:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def loads(s: Any) -> Any:
+        _check_input(s)
+        return orjson.loads(s)
+
+    def dumps_bytes(obj: Any) -> bytes:
+        try:
+            return orjson.dumps(obj, option=_OPTIONS)
+        except TypeError:
+            # Целые > 64 бит, неизвестные типы — отдаём стандартному json
+            return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+else:
+    def loads(s: Any) -> Any:
+        _check_input(s)
+        return json.loads(s)
+
+    def dumps_bytes(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def dumps(obj: Any) -> str:
+    """JSON-строка для записи в БД (Game.data, members, role_plus и т.п.)."""
+    return dumps_bytes(obj).decode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """Класс ответа по умолчанию (FastAPI(default_response_class=...))."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps_bytes(content)
@@ -21,4 +21,31 @@ AVATAR_DIR.mkdir(parents=True, exist_ok=True)
 
 # Avatar settings
 MAX_AVATAR_SIZE = 2 * 1024 * 1024  # 2 MB
-PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
\ No newline at end of file
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# Кэш ответов рейтинга (services.cache)
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", 256))
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", 300))  # секунды
+
+# База данных: пул соединений и параметры SQLite (db.base.make_engine)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))  # секунды ожидания свободного соединения
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", 64 * 1024))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+DB_THREADPOOL_SIZE = int(os.getenv("DB_THREADPOOL_SIZE", 20))  # потоков для синхронных обработчиков (core.threadpool)
+
+# Хэширование паролей (core.security): одновременных вызовов bcrypt
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 2))
+
+# Кэш токен -> пользователь (core.security.principal_cache)
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", 1024))
+AUTH_CACHE_TTL = int(os.getenv("AUTH_CACHE_TTL", 60))  # секунды
+
+# Обработка аватаров (services.avatars): процессов Pillow и лимит ожидания результата
+AVATAR_WORKERS = int(os.getenv("AVATAR_WORKERS", min(2, os.cpu_count() or 1)))
+AVATAR_PROCESS_TIMEOUT = int(os.getenv("AVATAR_PROCESS_TIMEOUT", 30))  # секунды
+# Сборщик неиспользуемых файлов аватаров (services.avatar_sweeper)
+AVATAR_SWEEP_INTERVAL_MINUTES = int(os.getenv("AVATAR_SWEEP_INTERVAL_MINUTES", 60))
+AVATAR_SWEEP_GRACE = int(os.getenv("AVATAR_SWEEP_GRACE", 3600))  # секунды: моложе не удаляем
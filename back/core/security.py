@@ -1,3 +1,6 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from typing import Optional
 
@@ -7,18 +10,32 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 
-from .config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from .config import (
+    SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, PASSWORD_HASH_WORKERS, AUTH_CACHE_SIZE, AUTH_CACHE_TTL
+)
 from db.base import SessionLocal
 from db.models import User
+from services.cache import TTLCache
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer(auto_error=False)
 
+# bcrypt — 100–300 мс CPU на вызов. Отдельный ограниченный пул: массовый вход
+# перед турниром не занимает потоки, обслуживающие запросы к БД (core.threadpool).
+# bcrypt отпускает GIL, поэтому потоков достаточно, процессы не нужны.
+_password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password")
+
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return _password_executor.submit(pwd_context.verify, plain_password, hashed_password).result()
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return _password_executor.submit(pwd_context.hash, password).result()
+
+async def verify_password_async(plain_password, hashed_password):
+    return await asyncio.wrap_future(_password_executor.submit(pwd_context.verify, plain_password, hashed_password))
+
+async def get_password_hash_async(password):
+    return await asyncio.wrap_future(_password_executor.submit(pwd_context.hash, password))
 
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -27,40 +44,84 @@ def create_access_token(data: dict):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    if credentials is None:
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    token = credentials.credentials
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        nickname: str = payload.get("sub")
-        if nickname is None:
-            raise HTTPException(status_code=401, detail="Invalid authentication credentials")
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid authentication credentials")
+@dataclass(frozen=True)
+class Principal:
+    """Аутентифицированный пользователь: то, что нужно обработчикам для проверок прав."""
+    id: str
+    nickname: str
+    role: str
+
+
+def create_user_token(user: User) -> str:
+    """JWT пользователя: id для поиска по первичному ключу, роль и версия для отзыва."""
+    return create_access_token(
+        data={"sub": user.nickname, "role": user.role, "id": user.id, "ver": user.token_version or 0}
+    )
+
+
+# user_id -> текущий users.token_version. Principal собирается из подписанных
+# claims (id, ник, роль); из БД нужна только версия — SELECT по первичному ключу
+# раз в AUTH_CACHE_TTL на пользователя, а не сессия на каждый запрос.
+# Смена роли или ника увеличивает версию (revoke_tokens) — токены со старыми
+# claims перестают приниматься, поэтому роли из токена можно доверять.
+token_version_cache = TTLCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL)
 
+
+def revoke_tokens(user: User) -> None:
+    """Отзывает выданные пользователю JWT. После коммита — invalidate_principal(user.id)."""
+    user.token_version = (user.token_version or 0) + 1
+
+
+def invalidate_principal(*user_ids: Optional[str]) -> None:
+    """Вызывать после коммита смены ника, роли и удаления пользователя."""
+    for user_id in user_ids:
+        if user_id:
+            token_version_cache.invalidate(user_id)
+
+
+def _load_token_version(user_id: str) -> Optional[int]:
     db = SessionLocal()
-    user = db.query(User).filter(User.nickname == nickname).first()
-    db.close()
-    if not user:
-        raise HTTPException(status_code=401, detail="User not found")
-    return user
+    try:
+        return db.query(User.token_version).filter(User.id == user_id).scalar()
+    finally:
+        db.close()
 
-def get_optional_current_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)):
-    if credentials is None:
-        return None
+
+def _resolve_principal(token: str) -> Optional[Principal]:
+    """None — токен недействителен, отозван или пользователь удалён."""
     try:
-        token = credentials.credentials
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        nickname: str = payload.get("sub")
-        if nickname is None:
-            return None
-        db = SessionLocal()
-        user = db.query(User).filter(User.nickname == nickname).first()
-        db.close()
-        return user
     except JWTError:
         return None
+    user_id, nickname, role = payload.get("id"), payload.get("sub"), payload.get("role")
+    if not (user_id and nickname and role):
+        return None
+
+    current_version = token_version_cache.get_or_compute(
+        ("token_version", user_id), lambda: _load_token_version(user_id)
+    )
+    if current_version is None:
+        # Отрицательный результат не храним
+        token_version_cache.invalidate(user_id)
+        return None
+    # Токены, выданные до появления версии, соответствуют версии 0
+    if payload.get("ver", 0) != current_version:
+        return None
+    return Principal(user_id, nickname, role)
+
+
+def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Principal:
+    if credentials is None:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    principal = _resolve_principal(credentials.credentials)
+    if principal is None:
+        raise HTTPException(status_code=401, detail="Invalid authentication credentials")
+    return principal
+
+def get_optional_current_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)) -> Optional[Principal]:
+    if credentials is None:
+        return None
+    return _resolve_principal(credentials.credentials)
 
 def get_db():
     db = SessionLocal()
@@ -69,37 +130,17 @@ def get_db():
     finally:
         db.close()
 
-def ws_get_current_user(token: str):
+def ws_get_current_user(token: str) -> Principal:
     if not token:
         raise WebSocketException(
             code=status.WS_1008_POLICY_VIOLATION,
             reason="Not authenticated"
         )
 
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        nickname: str = payload.get("sub")
-        if nickname is None:
-            raise WebSocketException(
-                code=status.WS_1008_POLICY_VIOLATION,
-                reason="Invalid authentication credentials"
-            )
-    except JWTError:
+    principal = _resolve_principal(token)
+    if principal is None:
         raise WebSocketException(
             code=status.WS_1008_POLICY_VIOLATION,
             reason="Invalid authentication credentials"
         )
-
-    db = SessionLocal()
-    try:
-        user = db.query(User).filter(User.nickname == nickname).first()
-    finally:
-        db.close()
-
-    if not user:
-        raise WebSocketException(
-            code=status.WS_1008_POLICY_VIOLATION,
-            reason="User not found"
-        )
-
-    return user
+    return principal
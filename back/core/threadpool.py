@@ -0,0 +1,34 @@
+from functools import partial
+from typing import Any, Awaitable, Callable, TypeVar
+
+from anyio import from_thread, to_thread
+
+from core.config import DB_THREADPOOL_SIZE
+
+# Синхронная работа с БД (SQLAlchemy Session) не должна идти в event loop:
+# один тяжёлый рейтинг иначе замораживает все запросы и WebSocket'ы.
+#
+# Поэтому HTTP-обработчики, работающие с БД, объявлены через обычный def —
+# FastAPI выполняет их (и зависимости get_db/get_current_user) в пуле потоков
+# anyio. Размер этого пула ограничиваем DB_THREADPOOL_SIZE, чтобы потоков не
+# было больше, чем соединений в пуле движка (db.base.make_engine).
+# В async-коде (WebSocket, login/register) БД вызывается через run_db, а из потока пула
+# корутины (рассылка по WebSocket) — через call_async.
+
+T = TypeVar("T")
+
+
+def configure_threadpool() -> None:
+    """Вызывается один раз на старте приложения, внутри event loop."""
+    to_thread.current_default_thread_limiter().total_tokens = DB_THREADPOOL_SIZE
+
+
+async def run_db(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Выполнить синхронную функцию в общем ограниченном пуле потоков."""
+    return await to_thread.run_sync(partial(func, *args, **kwargs))
+
+
+def call_async(func: Callable[..., Awaitable[T]], *args: Any) -> T:
+    """Выполнить корутину в event loop из потока пула и дождаться результата."""
+    return from_thread.run(func, *args)
+
@@ -1,7 +1,58 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker, declarative_base
-from core.config import DATABASE_URL
+from core.config import (
+    DATABASE_URL,
+    DB_MAX_OVERFLOW,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    SQLITE_BUSY_TIMEOUT_MS,
+    SQLITE_CACHE_SIZE_KB,
+    SQLITE_MMAP_SIZE,
+)
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+
+def _sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    # WAL: чтения (опрос оверлеев, рейтинги) не блокируют коммиты saveGameData и наоборот.
+    # synchronous=NORMAL в режиме WAL безопасен для целостности, теряется максимум
+    # последняя транзакция при отключении питания.
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")  # отрицательное — в КиБ
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+def make_engine(url: str = DATABASE_URL) -> Engine:
+    """Движок с пулом соединений; для файловой SQLite — WAL и настроенные PRAGMA."""
+    if not url.startswith("sqlite"):
+        return create_engine(
+            url,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_pre_ping=True,
+        )
+
+    in_memory = url in ("sqlite://", "sqlite:///:memory:")
+    if in_memory:
+        # Пул для :memory: SQLAlchemy выбирает сам — у каждого соединения своя база
+        return create_engine(url, connect_args={"check_same_thread": False})
+
+    sqlite_engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+    )
+    event.listen(sqlite_engine, "connect", _sqlite_pragmas)
+    return sqlite_engine
+
+
+engine = make_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
\ No newline at end of file
+Base = declarative_base()
@@ -10,12 +10,14 @@ sys.path.append(str(project_root))
 # --- КОНЕЦ ИЗМЕНЕНИЯ ---
 
 from core.security import get_password_hash
-from db.base import SessionLocal, Base, engine
+from db.base import SessionLocal
+from db.migrations import migrate
 from db.models import User, Event, Team
+from services.nicknames import nickname_key
 
 def init_db():
-    # Создаем все таблицы
-    Base.metadata.create_all(bind=engine)
+    # Создаем таблицы и отмечаем версию схемы
+    migrate()
 
     db = SessionLocal()
     try:
@@ -61,6 +63,7 @@ def init_db():
                 id=f"user_{uuid.uuid4().hex[:12]}",
                 email=u_data["email"],
                 nickname=u_data["nickname"],
+                nickname_normalized=nickname_key(u_data["nickname"]),
                 hashed_password=get_password_hash("password"),
                 club=u_data.get("club"),
                 role=u_data.get("role", "user"),
@@ -0,0 +1,415 @@
+import argparse
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, List, NamedTuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session
+
+from db.base import Base, SessionLocal, engine
+from db.models import Game, GamePlayer, PlayerEventStats
+from services.game_index import backfill_game_columns, backfill_game_players
+from services.leaderboard import rebuild_all_stats
+from services.nicknames import nickname_key
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows (локальная разработка)
+    fcntl = None
+
+# Версионированные миграции схемы. Применённые шаги записываются в schema_version,
+# каждый шаг выполняется ровно один раз. Запуск до деплоя:
+#
+#     python -m db.migrations          # применить недостающие шаги
+#     python -m db.migrations --check  # только сверить версию
+#
+# Приложение при старте лишь сверяет версию (check_schema_version), поэтому
+# воркеры не гоняют PRAGMA-проверки и перестройки таблиц одновременно.
+#
+# Новый шаг — функция (db, cursor) в конце MIGRATIONS со следующим номером.
+# Шаги идемпотентны (проверяют, что изменение ещё не сделано): на новой базе
+# create_all в шаге 1 уже создаёт таблицы по текущим моделям, а базы, созданные
+# до появления schema_version, проходят все шаги с версии 0.
+
+SCHEMA_VERSION_TABLE = "schema_version"
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    apply: Callable[[Session, object], None]
+
+
+def _create_tables(db: Session, cursor) -> None:
+    """Таблицы по текущим моделям (только отсутствующие)"""
+    Base.metadata.create_all(bind=db.get_bind())
+
+
+def _event_judges_position(db: Session, cursor) -> None:
+    """MIGRATE event_judges.position"""
+    result = db.execute(text("PRAGMA table_info(event_judges)")).fetchall()
+    position_column = next((col for col in result if col[1] == "position"), None)
+
+    if not position_column:
+        print("Добавляем колонку position в event_judges...")
+
+        cursor.executescript("""
+        BEGIN;
+
+        CREATE TABLE event_judges_new (
+            event_id TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            position INTEGER DEFAULT 0,
+            PRIMARY KEY (event_id, user_id),
+            FOREIGN KEY(event_id) REFERENCES events(id),
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        );
+
+        INSERT INTO event_judges_new (event_id, user_id, position)
+        SELECT event_id, user_id, 0 FROM event_judges;
+
+        DROP TABLE event_judges;
+        ALTER TABLE event_judges_new RENAME TO event_judges;
+
+        COMMIT;
+        """)
+
+        print("event_judges успешно обновлена")
+    else:
+        print("Миграция event_judges не требуется")
+
+
+def _notifications_recipient_nullable(db: Session, cursor) -> None:
+    """MIGRATE notifications.recipient_id -> NULLABLE"""
+    result = db.execute(text("PRAGMA table_info(notifications)")).fetchall()
+
+    recipient_col = next((col for col in result if col[1] == "recipient_id"), None)
+
+    if recipient_col and recipient_col[3] == 1:  # NOT NULL
+        print("Миграция notifications.recipient_id -> NULLABLE")
+
+        cursor.executescript("""
+        BEGIN;
+
+        CREATE TABLE notifications_new (
+            id TEXT PRIMARY KEY,
+            recipient_id TEXT NULL,
+            sender_id TEXT NULL,
+            type TEXT NOT NULL,
+            message TEXT NOT NULL,
+            related_id TEXT,
+            is_read BOOLEAN DEFAULT 0,
+            actions TEXT,
+            created_at DATETIME,
+            FOREIGN KEY(recipient_id) REFERENCES users(id) ON DELETE CASCADE,
+            FOREIGN KEY(sender_id) REFERENCES users(id)
+        );
+
+        INSERT INTO notifications_new
+        SELECT * FROM notifications;
+
+        DROP TABLE notifications;
+        ALTER TABLE notifications_new RENAME TO notifications;
+
+        COMMIT;
+        """)
+
+        print("notifications успешно обновлена")
+    else:
+        print("Миграция notifications не требуется")
+
+
+def _games_is_finished(db: Session, cursor) -> None:
+    """MIGRATE games.is_finished (+ индекс ленты игр)"""
+    result = db.execute(text("PRAGMA table_info(games)")).fetchall()
+    finished_column = next((col for col in result if col[1] == "is_finished"), None)
+
+    if not finished_column:
+        print("Добавляем колонку is_finished в games...")
+
+        cursor.executescript("""
+        BEGIN;
+
+        ALTER TABLE games ADD COLUMN is_finished BOOLEAN NOT NULL DEFAULT 0;
+
+        UPDATE games SET is_finished = 1
+        WHERE COALESCE(CASE WHEN json_valid(data) THEN json_extract(data, '$.badgeColor') END, '') != '';
+
+        CREATE INDEX IF NOT EXISTS ix_games_event_finished_created
+        ON games (event_id, is_finished, created_at, gameId);
+
+        COMMIT;
+        """)
+
+        print("games.is_finished успешно заполнена")
+    else:
+        print("Миграция games.is_finished не требуется")
+
+
+def _users_token_version(db: Session, cursor) -> None:
+    """MIGRATE users.token_version (отзыв JWT)"""
+    result = db.execute(text("PRAGMA table_info(users)")).fetchall()
+    token_version_column = next((col for col in result if col[1] == "token_version"), None)
+
+    if not token_version_column:
+        print("Добавляем колонку token_version в users...")
+        cursor.execute("ALTER TABLE users ADD COLUMN token_version INTEGER NOT NULL DEFAULT 0")
+        cursor.connection.commit()
+        print("users.token_version успешно добавлена")
+    else:
+        print("Миграция users.token_version не требуется")
+
+
+def _users_nickname_normalized(db: Session, cursor) -> None:
+    """MIGRATE users.nickname_normalized (+ уникальный индекс)"""
+    result = db.execute(text("PRAGMA table_info(users)")).fetchall()
+    normalized_column = next((col for col in result if col[1] == "nickname_normalized"), None)
+
+    if not normalized_column:
+        print("Добавляем колонку nickname_normalized в users...")
+        cursor.execute("ALTER TABLE users ADD COLUMN nickname_normalized VARCHAR")
+
+        # При совпадении нормализованных ников ключ получает первый по rowid —
+        # его же раньше находил validatePlayers; остальным остаётся NULL
+        taken = set()
+        rows = cursor.execute("SELECT id, nickname FROM users ORDER BY rowid").fetchall()
+        for user_id, nickname in rows:
+            key = nickname_key(nickname)
+            if key and key not in taken:
+                taken.add(key)
+                cursor.execute("UPDATE users SET nickname_normalized = ? WHERE id = ?", (key, user_id))
+        skipped = sum(1 for _, nickname in rows if nickname_key(nickname)) - len(taken)
+
+        cursor.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ix_users_nickname_normalized ON users (nickname_normalized)"
+        )
+        cursor.connection.commit()
+        print(f"users.nickname_normalized заполнена: {len(taken)} ников, конфликтов {skipped}")
+    else:
+        print("Миграция users.nickname_normalized не требуется")
+
+
+def _games_judge_nickname(db: Session, cursor) -> None:
+    """MIGRATE games.judge_nickname (+ индекс для переименования)"""
+    result = db.execute(text("PRAGMA table_info(games)")).fetchall()
+    judge_column = next((col for col in result if col[1] == "judge_nickname"), None)
+
+    if not judge_column:
+        print("Добавляем колонку judge_nickname в games...")
+
+        cursor.executescript("""
+        BEGIN;
+
+        ALTER TABLE games ADD COLUMN judge_nickname VARCHAR;
+
+        UPDATE games SET judge_nickname = NULLIF(
+            CASE WHEN json_valid(data) THEN json_extract(data, '$.gameInfo.judgeNickname') END, ''
+        );
+
+        CREATE INDEX IF NOT EXISTS ix_games_judge_nickname ON games (judge_nickname);
+
+        COMMIT;
+        """)
+
+        print("games.judge_nickname успешно заполнена")
+    else:
+        print("Миграция games.judge_nickname не требуется")
+
+
+def _games_filter_columns(db: Session, cursor) -> None:
+    """MIGRATE games: location, badge_color, round_number, table_number"""
+    result = db.execute(text("PRAGMA table_info(games)")).fetchall()
+    games_columns = {col[1] for col in result}
+
+    if "round_number" not in games_columns:
+        print("Добавляем колонки location, badge_color, round_number, table_number в games...")
+
+        cursor.executescript("""
+        BEGIN;
+
+        ALTER TABLE games ADD COLUMN badge_color VARCHAR;
+        ALTER TABLE games ADD COLUMN location VARCHAR;
+        ALTER TABLE games ADD COLUMN round_number INTEGER;
+        ALTER TABLE games ADD COLUMN table_number INTEGER;
+
+        COMMIT;
+        """)
+
+        # Номер раунда — из gameId, стол — из gameInfo: заполняем тем же кодом, что и при записи
+        games_count = backfill_game_columns(db)
+
+        cursor.executescript("""
+        CREATE INDEX IF NOT EXISTS ix_games_badge_color ON games (badge_color);
+        CREATE INDEX IF NOT EXISTS ix_games_event_location ON games (event_id, location);
+        CREATE INDEX IF NOT EXISTS ix_games_event_round_table ON games (event_id, round_number, table_number);
+        """)
+
+        print(f"Колонки games заполнены: {games_count} игр")
+    else:
+        print("Миграция колонок games не требуется")
+
+
+def _game_players_history_indexes(db: Session, cursor) -> None:
+    """INDEX game_players: история игр пользователя / ника"""
+    cursor.executescript("""
+    CREATE INDEX IF NOT EXISTS ix_game_players_user_created
+    ON game_players (user_id, created_at, game_id);
+
+    CREATE INDEX IF NOT EXISTS ix_game_players_name_created
+    ON game_players (name, created_at, game_id);
+    """)
+
+
+def _backfill_game_players(db: Session, cursor) -> None:
+    """BACKFILL game_players из Game.data"""
+    has_games = db.query(Game.gameId).first() is not None
+    has_seats = db.query(GamePlayer.id).first() is not None
+
+    if has_games and not has_seats:
+        print("Заполняем game_players из Game.data...")
+        seats_count = backfill_game_players(db)
+        print(f"game_players заполнена: {seats_count} строк")
+    else:
+        print("Заполнение game_players не требуется")
+
+
+def _backfill_player_event_stats(db: Session, cursor) -> None:
+    """BACKFILL player_event_stats из game_players"""
+    has_stats = db.query(PlayerEventStats.event_id).first() is not None
+    has_seats = db.query(GamePlayer.id).first() is not None
+
+    if has_seats and not has_stats:
+        print("Пересчитываем player_event_stats...")
+        rebuild_all_stats(db)
+        print("player_event_stats заполнена")
+    else:
+        print("Заполнение player_event_stats не требуется")
+
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "create_tables", _create_tables),
+    Migration(2, "event_judges_position", _event_judges_position),
+    Migration(3, "notifications_recipient_nullable", _notifications_recipient_nullable),
+    Migration(4, "games_is_finished", _games_is_finished),
+    Migration(5, "users_token_version", _users_token_version),
+    Migration(6, "users_nickname_normalized", _users_nickname_normalized),
+    Migration(7, "games_judge_nickname", _games_judge_nickname),
+    Migration(8, "games_filter_columns", _games_filter_columns),
+    Migration(9, "game_players_history_indexes", _game_players_history_indexes),
+    Migration(10, "backfill_game_players", _backfill_game_players),
+    Migration(11, "backfill_player_event_stats", _backfill_player_event_stats),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def _lock_path() -> Path:
+    database = engine.url.database
+    if engine.url.get_backend_name() == "sqlite" and database and database != ":memory:":
+        return Path(database + ".migrate.lock")
+    return Path("data") / "migrate.lock"
+
+
+@contextmanager
+def migration_lock():
+    """Эксклюзивная блокировка на время миграций: второй процесс ждёт первого."""
+    path = _lock_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def current_version(db: Session) -> int:
+    if not inspect(db.get_bind()).has_table(SCHEMA_VERSION_TABLE):
+        return 0
+    version = db.execute(text(f"SELECT MAX(version) FROM {SCHEMA_VERSION_TABLE}")).scalar()
+    return version or 0
+
+
+def migrate() -> List[int]:
+    """Применяет недостающие шаги по порядку; возвращает номера применённых."""
+    applied = []
+    with migration_lock():
+        db = SessionLocal()
+        try:
+            db.execute(text(f"""
+                CREATE TABLE IF NOT EXISTS {SCHEMA_VERSION_TABLE} (
+                    version INTEGER PRIMARY KEY,
+                    name VARCHAR NOT NULL,
+                    applied_at DATETIME NOT NULL
+                )
+            """))
+            db.commit()
+
+            # Версию читаем под блокировкой: шаги, применённые другим процессом, пропускаются
+            version = current_version(db)
+            for migration in MIGRATIONS:
+                if migration.version <= version:
+                    continue
+                print(f"Миграция {migration.version}: {migration.name}")
+                cursor = db.connection().connection.cursor()
+                try:
+                    migration.apply(db, cursor)
+                finally:
+                    cursor.close()
+                db.execute(
+                    text(f"INSERT INTO {SCHEMA_VERSION_TABLE} (version, name, applied_at) VALUES (:version, :name, :applied_at)"),
+                    {"version": migration.version, "name": migration.name, "applied_at": datetime.utcnow()},
+                )
+                db.commit()
+                applied.append(migration.version)
+        finally:
+            db.close()
+    return applied
+
+
+def check_schema_version() -> int:
+    """Проверка при старте приложения: схема не старее кода, иначе — ошибка запуска."""
+    db = SessionLocal()
+    try:
+        version = current_version(db)
+    finally:
+        db.close()
+
+    if version < LATEST_VERSION:
+        raise RuntimeError(
+            f"Схема БД версии {version}, приложению нужна {LATEST_VERSION}. "
+            "Примените миграции: python -m db.migrations"
+        )
+    if version > LATEST_VERSION:
+        # Откат кода при уже применённых миграциях: шаги только добавляют, старый код работает
+        print(f"Схема БД версии {version} новее кода ({LATEST_VERSION})")
+    return version
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Миграции схемы БД")
+    parser.add_argument("--check", action="store_true", help="только сверить версию схемы")
+    args = parser.parse_args()
+
+    if args.check:
+        db = SessionLocal()
+        try:
+            version = current_version(db)
+        finally:
+            db.close()
+        print(f"Версия схемы: {version}, последняя: {LATEST_VERSION}")
+        raise SystemExit(0 if version >= LATEST_VERSION else 1)
+
+    applied = migrate()
+    if applied:
+        print(f"Применены миграции: {', '.join(map(str, applied))}; версия схемы {LATEST_VERSION}")
+    else:
+        print(f"Схема актуальна (версия {LATEST_VERSION})")
+
+
+if __name__ == "__main__":
+    main()
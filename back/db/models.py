@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Text, DateTime, Integer, Float, ForeignKey, Boolean, Table
+from sqlalchemy import Column, String, Text, DateTime, Integer, Float, ForeignKey, Boolean, Table, Index
 from sqlalchemy.orm import relationship
 from .base import Base
 from datetime import datetime
@@ -53,6 +53,8 @@ class User(Base):
     id = Column(String, primary_key=True, index=True)
     email = Column(String, unique=True, index=True)
     nickname = Column(String, unique=True, index=True)
+    # services.nicknames.normalize_nick(nickname): поиск "как человек" (validatePlayers) по индексу
+    nickname_normalized = Column(String, unique=True, index=True, nullable=True)
     hashed_password = Column(String)
     role = Column(String, default="user")
     club = Column(String, nullable=True)
@@ -64,6 +66,8 @@ class User(Base):
     tg = Column(String, nullable=True)
     site1 = Column(String, nullable=True)
     site2 = Column(String, nullable=True)
+    # Увеличивается при смене роли, ника и т.п.: JWT со старым значением "ver" недействительны
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
 
     # --- Обратная связь: к событиям, где этот пользователь является судьей ---
     # judging_events - атрибут, через который мы будем получать список событий для пользователя
@@ -82,8 +86,95 @@ class Game(Base):
     data = Column(Text)
     event_id = Column(String, ForeignKey("events.id"), index=True) # --- ИЗМЕНЕНИЕ: Добавлен ForeignKey ---
     created_at = Column(DateTime, default=datetime.utcnow)
+    is_finished = Column(Boolean, nullable=False, default=False)  # badgeColor задан; обновляет sync_game_players
+    judge_nickname = Column(String, nullable=True, index=True)  # gameInfo.judgeNickname; обновляет sync_game_players
+    # Копии полей Game.data для фильтров по индексу; обновляет services.game_index.set_game_columns
+    badge_color = Column(String, nullable=True, index=True)
+    location = Column(String, nullable=True)
+    round_number = Column(Integer, nullable=True)  # из gameId <event>_r<N>_t<M>
+    table_number = Column(Integer, nullable=True)
     event = relationship("Event", backref="games") # --- ИЗМЕНЕНИЕ: Добавлена связь ---
 
+    __table_args__ = (
+        # Лента сыгранных игр события: WHERE event_id, is_finished ORDER BY created_at, gameId
+        Index("ix_games_event_finished_created", "event_id", "is_finished", "created_at", "gameId"),
+        # Локации события (DISTINCT / GROUP BY) и сетка раундов
+        Index("ix_games_event_location", "event_id", "location"),
+        Index("ix_games_event_round_table", "event_id", "round_number", "table_number"),
+    )
+
+
+# --- Нормализованные места игроков (одна строка на место в игре) ---
+# Дублирует players из Game.data, чтобы рейтинги считались запросами по индексам,
+# а не разбором JSON всех игр. Заполняется services.game_index.sync_game_players.
+class GamePlayer(Base):
+    __tablename__ = "game_players"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    game_id = Column(String, ForeignKey("games.gameId", ondelete="CASCADE"), nullable=False, index=True)
+    event_id = Column(String, nullable=True, index=True)
+    user_id = Column(String, nullable=True, index=True)
+    name = Column(String, nullable=False, default="", index=True)
+    position = Column(Integer, nullable=False)  # индекс в списке players
+    seat = Column(Integer, nullable=True)  # players[].id
+    role = Column(String, nullable=True)
+    plus = Column(Float, nullable=True)
+    sk = Column(Integer, default=0)
+    jk = Column(Integer, default=0)
+    best_move = Column(String, default="")
+    best_move_black = Column(Integer, nullable=True)  # чёрных в ЛХ из 3 номеров, None если ЛХ нет
+    badge_color = Column(String, nullable=True)
+    is_win = Column(Boolean, default=False, nullable=False)
+    location = Column(String, nullable=True)
+    created_at = Column(DateTime, index=True)
+
+    __table_args__ = (
+        Index("ix_game_players_event_created", "event_id", "created_at"),
+        # История игр пользователя / ника: новые сверху, keyset по (created_at, game_id)
+        Index("ix_game_players_user_created", "user_id", "created_at", "game_id"),
+        Index("ix_game_players_name_created", "name", "created_at", "game_id"),
+    )
+
+
+# --- Материализованный рейтинг игрока в событии ---
+# Обновляется дельтами при записи/удалении игр (services.leaderboard),
+# чтобы player-stats читал O(игроков), а не разбирал все игры события.
+class PlayerEventStats(Base):
+    __tablename__ = "player_event_stats"
+    event_id = Column(String, primary_key=True)  # "1" — игры без события
+    player_key = Column(String, primary_key=True)  # userId или имя, если userId нет
+    user_id = Column(String, nullable=True, index=True)
+    name = Column(String, nullable=False, default="")
+    games_count = Column(Integer, nullable=False, default=0)
+    total_plus = Column(Float, nullable=False, default=0.0)
+    total_best_move_bonus = Column(Float, nullable=False, default=0.0)
+    sk_count = Column(Integer, nullable=False, default=0)
+    jk_count = Column(Integer, nullable=False, default=0)
+    best_moves_with_black = Column(Integer, nullable=False, default=0)
+    deaths = Column(Integer, nullable=False, default=0)
+    deaths_with_1_black = Column(Integer, nullable=False, default=0)
+    deaths_with_2_black = Column(Integer, nullable=False, default=0)
+    deaths_with_3_black = Column(Integer, nullable=False, default=0)
+    games_miet = Column(Integer, nullable=False, default=0)
+    games_mipt = Column(Integer, nullable=False, default=0)
+    wins_sheriff = Column(Integer, nullable=False, default=0)
+    wins_citizen = Column(Integer, nullable=False, default=0)
+    wins_mafia = Column(Integer, nullable=False, default=0)
+    wins_don = Column(Integer, nullable=False, default=0)
+    games_sheriff = Column(Integer, nullable=False, default=0)
+    games_citizen = Column(Integer, nullable=False, default=0)
+    games_mafia = Column(Integer, nullable=False, default=0)
+    games_don = Column(Integer, nullable=False, default=0)
+    role_plus = Column(Text, nullable=False, default="{}")  # JSON: {"sheriff": [2.5, 1.0], ...}
+
+
+# --- Версии содержимого для ETag / условных GET (services.versions) ---
+# scope: "game:<gameId>", "event:<eventId>" ("event:1" — игры без события), "users"
+class ContentVersion(Base):
+    __tablename__ = "content_versions"
+    scope = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
 
 class Team(Base):
     __tablename__ = "teams"
@@ -1,5 +1,5 @@
 import os
-import shutil
+import sqlite3
 from datetime import datetime
 from pathlib import Path
 
@@ -9,18 +9,21 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from apscheduler.schedulers.background import BackgroundScheduler
 
-from sqlalchemy import text
-from sqlalchemy.orm import Session
-
 from api import auth, games, users, events, notifications
 from api import ws_agent
-from db.base import DATABASE_URL, Base, engine, SessionLocal
+from core.codec import FastJSONResponse
+from core.config import AVATAR_SWEEP_INTERVAL_MINUTES
+from core.threadpool import configure_threadpool
+from db.base import DATABASE_URL
+from db.migrations import check_schema_version, migrate
+from services.avatar_sweeper import run_avatar_sweep
+from services.avatars import shutdown_avatar_pool
 
 
 ROOT_PATH = os.getenv("ROOT_PATH", "")  # по умолчанию пусто для локали
 
 app = FastAPI(
-    
+    default_response_class=FastJSONResponse,
 )
 
 # -------------------- CORS --------------------
@@ -64,7 +67,15 @@ def backup_database():
     backup_file = backup_dir / f"{datetime.now():%Y-%m-%d}.db"
 
     try:
-        shutil.copy2(db_path, backup_file)
+        # В режиме WAL последние транзакции могут лежать в database.db-wal,
+        # поэтому копируем через backup API SQLite, а не файлом
+        source = sqlite3.connect(db_path)
+        target = sqlite3.connect(backup_file)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
         print(f"Бэкап БД создан: {backup_file}")
     except Exception as e:
         print(f"Ошибка резервного копирования: {e}")
@@ -72,121 +83,39 @@ def backup_database():
 
 scheduler = BackgroundScheduler()
 
-# -------------------- SQLITE FULL MIGRATION --------------------
-def run_sqlite_migrations(db: Session):
-
-    raw_conn = db.connection().connection
-    cursor = raw_conn.cursor()
-
-    # ============================================================
-    # 1️⃣ MIGRATE event_judges.position
-    # ============================================================
-
-    result = db.execute(text("PRAGMA table_info(event_judges)")).fetchall()
-    position_column = next((col for col in result if col[1] == "position"), None)
-
-    if not position_column:
-        print("Добавляем колонку position в event_judges...")
-
-        cursor.executescript("""
-        BEGIN;
-
-        CREATE TABLE event_judges_new (
-            event_id TEXT NOT NULL,
-            user_id TEXT NOT NULL,
-            position INTEGER DEFAULT 0,
-            PRIMARY KEY (event_id, user_id),
-            FOREIGN KEY(event_id) REFERENCES events(id),
-            FOREIGN KEY(user_id) REFERENCES users(id)
-        );
-
-        INSERT INTO event_judges_new (event_id, user_id, position)
-        SELECT event_id, user_id, 0 FROM event_judges;
-
-        DROP TABLE event_judges;
-        ALTER TABLE event_judges_new RENAME TO event_judges;
-
-        COMMIT;
-        """)
-
-        print("event_judges успешно обновлена")
-    else:
-        print("Миграция event_judges не требуется")
-
-    # ============================================================
-    # 2️⃣ MIGRATE notifications.recipient_id -> NULLABLE
-    # ============================================================
-
-    result = db.execute(text("PRAGMA table_info(notifications)")).fetchall()
-
-    recipient_col = next((col for col in result if col[1] == "recipient_id"), None)
-
-    if recipient_col and recipient_col[3] == 1:  # NOT NULL
-        print("Миграция notifications.recipient_id -> NULLABLE")
-
-        cursor.executescript("""
-        BEGIN;
-
-        CREATE TABLE notifications_new (
-            id TEXT PRIMARY KEY,
-            recipient_id TEXT NULL,
-            sender_id TEXT NULL,
-            type TEXT NOT NULL,
-            message TEXT NOT NULL,
-            related_id TEXT,
-            is_read BOOLEAN DEFAULT 0,
-            actions TEXT,
-            created_at DATETIME,
-            FOREIGN KEY(recipient_id) REFERENCES users(id) ON DELETE CASCADE,
-            FOREIGN KEY(sender_id) REFERENCES users(id)
-        );
-
-        INSERT INTO notifications_new
-        SELECT * FROM notifications;
-
-        DROP TABLE notifications;
-        ALTER TABLE notifications_new RENAME TO notifications;
-
-        COMMIT;
-        """)
-
-        print("notifications успешно обновлена")
-    else:
-        print("Миграция notifications не требуется")
-
-    cursor.close()
-    print("Все SQLite миграции завершены")
-
-
 # -------------------- STARTUP --------------------
 @app.on_event("startup")
 def on_startup():
-    # Создание таблиц
-    Base.metadata.create_all(bind=engine)
-
-    # Миграция
-    db = SessionLocal()
-    try:
-        run_sqlite_migrations(db)
-    finally:
-        db.close()
+    # Схему обновляет python -m db.migrations до запуска воркеров; здесь — только сверка версии
+    check_schema_version()
 
     # Планировщик бэкапов
     scheduler.add_job(backup_database, "cron", hour=8, minute=0)
+    # Неиспользуемые файлы аватаров (имена по содержимому не удаляются при смене аватара)
+    scheduler.add_job(run_avatar_sweep, "interval", minutes=AVATAR_SWEEP_INTERVAL_MINUTES)
     scheduler.start()
 
     print("Приложение успешно запущено")
 
 
+@app.on_event("startup")
+async def on_startup_threadpool():
+    # Лимит потоков anyio задаётся изнутри event loop, поэтому отдельный async-обработчик
+    configure_threadpool()
+
+
 # -------------------- SHUTDOWN --------------------
 @app.on_event("shutdown")
 def on_shutdown():
     scheduler.shutdown()
+    shutdown_avatar_pool()
     print("Приложение остановлено")
 
 
 # -------------------- ENTRYPOINT --------------------
 if __name__ == "__main__":
+    # Локальный запуск: миграции один раз в родительском процессе, до reload-воркера
+    migrate()
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
@@ -53,6 +53,7 @@ class ManageRegistrationRequest(BaseModel):
 
 class AvatarUploadResponse(BaseModel):
     url: str
+    srcset: Optional[Dict[str, str]] = None  # {"webp": "... 64w, ... 128w, ... 512w", "png": "..."}
 
 class DeleteAvatarRequest(BaseModel):
     userId: str
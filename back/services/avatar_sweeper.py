@@ -0,0 +1,57 @@
+import time
+from typing import Set
+
+from sqlalchemy.orm import Session
+
+from core.config import AVATAR_DIR, AVATAR_SWEEP_GRACE
+from db.base import SessionLocal
+from db.models import Event, User
+from services.avatars import EVENT_AVATAR_DIR, avatar_files
+
+# Сборщик файлов аватаров. Имена по содержимому (services.avatars) делят файлы
+# между пользователями и событиями, поэтому при смене аватара ничего не
+# удаляется сразу — раз в AVATAR_SWEEP_INTERVAL_MINUTES удаляются файлы, на
+# которые не ссылается ни одна запись. Свежие файлы (моложе AVATAR_SWEEP_GRACE)
+# не трогаем: загрузка пишет файл до коммита, а повторная загрузка того же
+# содержимого обновляет mtime.
+
+
+def referenced_avatar_paths(db: Session) -> Set[str]:
+    urls = set()
+    # gs_avatar/org_avatar события — URL аватаров пользователей
+    for column in (User.avatar, Event.avatar, Event.gs_avatar, Event.org_avatar):
+        urls.update(url for (url,) in db.query(column).filter(column.isnot(None)).distinct())
+    return {str(path.resolve()) for url in urls for path in avatar_files(url)}
+
+
+def sweep_orphan_avatars(db: Session, grace: int = AVATAR_SWEEP_GRACE) -> int:
+    keep = referenced_avatar_paths(db)
+    cutoff = time.time() - grace
+    removed = 0
+    for directory in (AVATAR_DIR, AVATAR_DIR / EVENT_AVATAR_DIR):
+        if not directory.is_dir():
+            continue
+        for path in directory.iterdir():
+            if not path.is_file() or str(path.resolve()) in keep:
+                continue
+            try:
+                if path.stat().st_mtime > cutoff:
+                    continue
+                path.unlink()
+                removed += 1
+            except FileNotFoundError:
+                continue
+    return removed
+
+
+def run_avatar_sweep() -> None:
+    """Задача планировщика (main.py)."""
+    db = SessionLocal()
+    try:
+        removed = sweep_orphan_avatars(db)
+        if removed:
+            print(f"Удалено неиспользуемых файлов аватаров: {removed}")
+    except Exception as e:
+        print(f"Ошибка очистки аватаров: {e}")
+    finally:
+        db.close()
@@ -0,0 +1,198 @@
+import hashlib
+import io
+import multiprocessing
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from PIL import Image, features
+
+from core.config import AVATAR_DIR, AVATAR_PROCESS_TIMEOUT, AVATAR_WORKERS
+
+# Аватары: обрезка до квадрата, LANCZOS и PNG с compress_level=9 — сотни
+# миллисекунд CPU под GIL. Pillow работает в отдельном пуле процессов и за один
+# проход выдаёт все размеры: WebP и PNG (фолбэк) для 64/128/512 px.
+#
+# Файлы: <stem>_<size>.<ext>. User.avatar указывает на <stem>_512.png, остальные
+# варианты выводятся из этого URL (avatar_srcset). У старых аватаров (<stem>.png)
+# вариантов нет — для них отдаётся только сам файл.
+#
+# stem — хэш содержимого (avatar_stem), поэтому файл по URL никогда не меняется:
+# nginx отдаёт такие имена с Cache-Control: immutable, одинаковые загрузки
+# используют одни и те же файлы. Файлы не удаляются при смене/удалении аватара —
+# их может использовать другой пользователь или событие; неиспользуемые убирает
+# services.avatar_sweeper.
+
+AVATAR_URL_PREFIX = "/data/avatars/"
+EVENT_AVATAR_DIR = "events"
+RENDER_VERSION = b"1"  # менять вместе с параметрами render_avatar_variants — иначе старые имена отдадут старый результат
+AVATAR_SIZES = (64, 128, 512)
+MAIN_SIZE = 512
+AVATAR_FORMATS = ("webp", "png") if features.check("webp") else ("png",)
+
+_MAIN_NAME = re.compile(rf"^(?P<stem>.+)_{MAIN_SIZE}\.png$")
+
+
+def variant_name(stem: str, size: int, fmt: str) -> str:
+    return f"{stem}_{size}.{fmt}"
+
+
+def render_avatar_variants(contents: bytes) -> Dict[str, bytes]:
+    """Все варианты аватара: {"64.webp": ..., "64.png": ..., ...}. Выполняется в процессе пула."""
+    with Image.open(io.BytesIO(contents)) as im:
+        w, h = im.size
+        side = min(w, h)
+        im = im.crop(((w - side) // 2, (h - side) // 2, (w + side) // 2, (h + side) // 2))
+        # До ресайза: палитровые PNG иначе масштабируются без сглаживания
+        if im.mode not in ("RGB", "RGBA"):
+            im = im.convert("RGBA")
+        main = im.resize((MAIN_SIZE, MAIN_SIZE), Image.LANCZOS)
+
+    variants = {}
+    for size in AVATAR_SIZES:
+        # Меньшие размеры — из 512 px, а не из оригинала: быстрее при том же качестве
+        image = main if size == MAIN_SIZE else main.resize((size, size), Image.LANCZOS)
+        for fmt in AVATAR_FORMATS:
+            buf = io.BytesIO()
+            if fmt == "webp":
+                image.save(buf, format="WEBP", quality=85, method=4)
+            else:
+                image.save(buf, format="PNG", optimize=True, compress_level=9)
+            variants[f"{size}.{fmt}"] = buf.getvalue()
+    return variants
+
+
+# -------------------- ПУЛ ПРОЦЕССОВ --------------------
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, а не fork: сервер многопоточный, а fork копирует захваченные блокировки
+            _pool = ProcessPoolExecutor(max_workers=AVATAR_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def process_avatar(contents: bytes) -> Dict[str, bytes]:
+    """render_avatar_variants в пуле процессов; ошибки Pillow пробрасываются как есть."""
+    global _pool
+    pool = _get_pool()
+    try:
+        return pool.submit(render_avatar_variants, contents).result(timeout=AVATAR_PROCESS_TIMEOUT)
+    except BrokenProcessPool:
+        # Процесс упал (например, нехватка памяти) — следующая загрузка создаст пул заново
+        with _pool_lock:
+            if _pool is pool:
+                _pool = None
+        raise
+
+
+def shutdown_avatar_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+# -------------------- ФАЙЛЫ И URL --------------------
+
+def content_hash(contents: bytes, salt: bytes = b"") -> str:
+    return hashlib.sha256(salt + contents).hexdigest()[:32]
+
+
+def avatar_stem(contents: bytes) -> str:
+    """Имя набора вариантов по загруженному файлу и версии обработки."""
+    return content_hash(contents, RENDER_VERSION + b":")
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    # Одинаковые загрузки пишут одно и то же имя — читатель не должен увидеть половину файла
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def _touch(paths: List[Path]) -> bool:
+    """Обновляет mtime (защита от сборщика); False, если какого-то файла нет."""
+    now = time.time()
+    try:
+        for path in paths:
+            os.utime(path, (now, now))
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def main_avatar_url(stem: str) -> str:
+    return f"{AVATAR_URL_PREFIX}{variant_name(stem, MAIN_SIZE, 'png')}"
+
+
+def reuse_avatar(stem: str) -> Optional[str]:
+    """URL уже обработанного набора с тем же содержимым или None."""
+    url = main_avatar_url(stem)
+    return url if _touch(avatar_files(url)) else None
+
+
+def save_avatar_variants(stem: str, variants: Dict[str, bytes]) -> str:
+    """Пишет варианты в AVATAR_DIR и возвращает URL основного (512 px PNG)."""
+    for key, data in variants.items():
+        size, fmt = key.split(".")
+        _write_atomic(AVATAR_DIR / variant_name(stem, int(size), fmt), data)
+    return main_avatar_url(stem)
+
+
+def save_event_avatar(contents: bytes) -> str:
+    """Аватар события хранится как есть, под именем по содержимому."""
+    directory = AVATAR_DIR / EVENT_AVATAR_DIR
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{content_hash(contents)}.png"
+    if not _touch([path]):
+        _write_atomic(path, contents)
+    return f"{AVATAR_URL_PREFIX}{EVENT_AVATAR_DIR}/{path.name}"
+
+
+def avatar_files(url: Optional[str]) -> List[Path]:
+    """Локальные файлы аватара: все варианты или единственный файл; [] для чужих URL."""
+    if not url or not url.startswith(AVATAR_URL_PREFIX):
+        return []
+    relative = Path(url[len(AVATAR_URL_PREFIX):])
+    if ".." in relative.parts:
+        return []
+    match = _MAIN_NAME.match(relative.name)
+    if not match:
+        return [AVATAR_DIR / relative]
+    stem = match.group("stem")
+    return [
+        AVATAR_DIR / relative.parent / variant_name(stem, size, fmt)
+        for size in AVATAR_SIZES for fmt in AVATAR_FORMATS
+    ]
+
+
+def avatar_srcset(url: Optional[str]) -> Optional[Dict[str, str]]:
+    """srcset по форматам: {"webp": "…_64.webp 64w, …", "png": "…"}; None, если вариантов нет."""
+    if not url:
+        return None
+    prefix, _, name = url.rpartition("/")
+    match = _MAIN_NAME.match(name)
+    if not match:
+        return None
+    stem = match.group("stem")
+    return {
+        fmt: ", ".join(f"{prefix}/{variant_name(stem, size, fmt)} {size}w" for size in AVATAR_SIZES)
+        for fmt in AVATAR_FORMATS
+    }
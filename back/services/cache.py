@@ -0,0 +1,71 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+from core.config import RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL
+
+
+class TTLCache:
+    """LRU-кэш с ограничением времени жизни записи и счётчиками попаданий.
+
+    Ключи ответов рейтинга содержат ETag из services.versions, поэтому запись,
+    меняющая игры/пользователей события, делает старые записи недостижимыми —
+    они вытесняются по LRU или TTL. invalidate() — для ручной очистки.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        # Считаем вне блокировки: исключения (404 и т.п.) не кэшируются
+        value = compute()
+
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def invalidate(self, event_id: Any = None) -> None:
+        """Сбрасывает записи по второму элементу ключа (событие, пользователь) или весь кэш."""
+        with self._lock:
+            if event_id is None:
+                self._data.clear()
+                return
+            for key in [k for k in self._data if isinstance(k, tuple) and len(k) > 1 and k[1] == event_id]:
+                del self._data[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+            }
+
+
+# Ключ: (эндпоинт, event_id, location, limit, offset, ETag)
+response_cache = TTLCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
@@ -0,0 +1,191 @@
+import json
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from core import codec
+from db.models import Game, GamePlayer
+from services.leaderboard import apply_seat_delta, delete_event_stats
+from services.versions import SEARCH_SCOPE, bump
+
+RED_ROLES = ("мирный", "шериф")
+BLACK_ROLES = ("мафия", "дон")
+
+# Id игр сетки события: <event>_r<раунд>_t<стол> (setup_event, generate_next_round)
+ROUND_RE = re.compile(r"_r(\d+)")
+TABLE_RE = re.compile(r"_t(\d+)$")
+
+
+def _to_int(value: Any) -> Optional[int]:
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str) and value.strip().lstrip("-").isdigit():
+        return int(value.strip())
+    return None
+
+
+def count_black_in_best_move(best_move: str, players: List[dict]) -> Optional[int]:
+    """Сколько чёрных среди трёх номеров ЛХ (номер = позиция в players, с 1).
+
+    None, если ЛХ не указан или в нём не ровно три номера.
+    """
+    best_move = (best_move or "").strip()
+    if not best_move:
+        return None
+    nominated = [s for s in best_move.split() if s.isdigit()]
+    if len(nominated) != 3:
+        return None
+    count = 0
+    for s in nominated:
+        idx = int(s) - 1
+        if 0 <= idx < len(players) and players[idx].get("role") in BLACK_ROLES:
+            count += 1
+    return count
+
+
+def is_winning_role(badge_color: Optional[str], role: Optional[str]) -> bool:
+    return (
+        (badge_color == "red" and role in RED_ROLES) or
+        (badge_color == "black" and role in BLACK_ROLES)
+    )
+
+
+def build_seat_rows(game: Game, data: Dict[str, Any]) -> List[GamePlayer]:
+    players = data.get("players") or []
+    badge_color = data.get("badgeColor") or None
+    location = (data.get("location") or "").strip() or None
+    created_at = game.created_at or datetime.utcnow()
+
+    rows = []
+    for position, p in enumerate(players):
+        if not isinstance(p, dict):
+            continue
+        user_id = p.get("userId")
+        plus = p.get("plus")
+        role = p.get("role") or None
+        rows.append(GamePlayer(
+            game_id=game.gameId,
+            event_id=game.event_id,
+            user_id=str(user_id) if user_id not in (None, "") else None,
+            name=(p.get("name") or "").strip(),
+            position=position,
+            seat=_to_int(p.get("id")),
+            role=role,
+            plus=float(plus) if isinstance(plus, (int, float)) and not isinstance(plus, bool) else None,
+            sk=_to_int(p.get("sk")) or 0,
+            jk=_to_int(p.get("jk")) or 0,
+            best_move=(p.get("best_move") or "").strip(),
+            best_move_black=count_black_in_best_move(p.get("best_move"), players),
+            badge_color=badge_color,
+            is_win=is_winning_role(badge_color, role),
+            location=location,
+            created_at=created_at,
+        ))
+    return rows
+
+
+def _non_empty_str(value: Any) -> Optional[str]:
+    return value if isinstance(value, str) and value else None
+
+
+def set_game_columns(game: Game, data: Dict[str, Any]) -> None:
+    """Копирует в столбцы Game поля Game.data, по которым фильтруют и группируют.
+
+    Значения — как в JSON (без trim), чтобы выборки по столбцам совпадали
+    с прежним разбором блобов.
+    """
+    game_info = data.get("gameInfo") or {}
+    game.is_finished = bool(data.get("badgeColor"))
+    game.badge_color = _non_empty_str(data.get("badgeColor"))
+    game.location = _non_empty_str(data.get("location"))
+    # Обратный индекс «судья → игры»: переименование не перебирает все блобы
+    game.judge_nickname = _non_empty_str(game_info.get("judgeNickname"))
+
+    game_id = game.gameId or ""
+    round_match = ROUND_RE.search(game_id)
+    game.round_number = int(round_match.group(1)) if round_match else None
+    table_number = _to_int(game_info.get("tableNumber"))
+    if table_number is None:
+        table_match = TABLE_RE.search(game_id)
+        table_number = int(table_match.group(1)) if table_match else None
+    game.table_number = table_number
+
+
+def sync_game_players(db: Session, game: Game, data: Optional[Dict[str, Any]] = None) -> None:
+    """Перезаписывает строки game_players для игры. Коммит — на вызывающей стороне."""
+    if data is None:
+        try:
+            data = codec.loads(game.data) if game.data else {}
+        except (json.JSONDecodeError, TypeError):
+            data = {}
+
+    set_game_columns(game, data)
+    if game.created_at is None:
+        db.flush()
+
+    old_rows = delete_seats(db, game.gameId)
+    new_rows = build_seat_rows(game, data)
+    db.add_all(new_rows)
+
+    # Материализованный рейтинг: минус старый вклад игры, плюс новый
+    apply_seat_delta(db, old_rows, new_rows)
+
+    # Подсказки ников пересобираются, только если за столом появилось/исчезло имя
+    if {row.name for row in old_rows} != {row.name for row in new_rows}:
+        bump(db, SEARCH_SCOPE)
+
+
+def delete_seats(db: Session, game_id: str) -> List[Any]:
+    """Удаляет места игры и возвращает удалённые строки.
+
+    Старые места читаются самим DELETE (RETURNING), то есть уже под блокировкой
+    записи: два параллельных пересохранения одной игры не вычтут один и тот же
+    старый состав из рейтинга дважды.
+    """
+    table = GamePlayer.__table__
+    return db.execute(
+        table.delete().where(table.c.game_id == game_id).returning(*table.c)
+    ).all()
+
+
+def delete_game_players(db: Session, game_id: Optional[str] = None, event_id: Optional[str] = None) -> None:
+    bump(db, SEARCH_SCOPE)
+    if game_id is not None:
+        apply_seat_delta(db, delete_seats(db, game_id), [])
+    elif event_id is not None:
+        delete_event_stats(db, event_id)
+        db.query(GamePlayer).filter(GamePlayer.event_id == event_id).delete(synchronize_session=False)
+
+
+def backfill_game_players(db: Session, batch_size: int = 500) -> int:
+    """Одноразовое заполнение game_players из уже сохранённых Game.data."""
+    db.query(GamePlayer).delete(synchronize_session=False)
+    total = 0
+    for game in db.query(Game).yield_per(batch_size):
+        try:
+            data = codec.loads(game.data) if game.data else {}
+        except (json.JSONDecodeError, TypeError):
+            continue
+        rows = build_seat_rows(game, data)
+        db.add_all(rows)
+        total += len(rows)
+    db.commit()
+    return total
+
+
+def backfill_game_columns(db: Session, batch_size: int = 500) -> int:
+    """Одноразовое заполнение столбцов set_game_columns для уже сохранённых игр."""
+    total = 0
+    for game in db.query(Game).yield_per(batch_size):
+        try:
+            data = codec.loads(game.data) if game.data else {}
+        except (json.JSONDecodeError, TypeError):
+            data = {}
+        set_game_columns(game, data if isinstance(data, dict) else {})
+        total += 1
+    db.commit()
+    return total
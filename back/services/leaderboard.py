@@ -0,0 +1,155 @@
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from sqlalchemy import and_, case, func, or_
+from sqlalchemy.orm import Session
+
+from core import codec
+from db.models import GamePlayer, PlayerEventStats
+from services.scoring import SEAT_FIELDS, ScoringEngine, SeatScore, accumulate, apply_seat, new_stats, seat_key
+
+
+def event_key(event_id) -> str:
+    # Игры без события и игры события "1" попадают в общий рейтинг
+    return event_id or "1"
+
+
+def _event_filter(event_id):
+    ev_key = event_key(event_id)
+    if ev_key == "1":
+        return (GamePlayer.event_id == "1") | (GamePlayer.event_id.is_(None))
+    return GamePlayer.event_id == ev_key
+
+
+def event_seats_query(db: Session, event_id):
+    """Места игроков рейтинга события в хронологическом порядке — вход для ScoringEngine."""
+    query = db.query(*(getattr(GamePlayer, field) for field in SEAT_FIELDS)).filter(_event_filter(event_id))
+    return query.order_by(GamePlayer.created_at.asc(), GamePlayer.game_id, GamePlayer.position)
+
+
+def _before(created_at, game_id):
+    # Порядок движка: (created_at, game_id)
+    return or_(
+        GamePlayer.created_at < created_at,
+        and_(GamePlayer.created_at == created_at, GamePlayer.game_id < game_id),
+    )
+
+
+def _after(created_at, game_id):
+    return or_(
+        GamePlayer.created_at > created_at,
+        and_(GamePlayer.created_at == created_at, GamePlayer.game_id > game_id),
+    )
+
+
+def game_seat_scores(db: Session, event_id, game_ids) -> Dict[str, List[SeatScore]]:
+    """Очки мест для выбранных игр без прогона всей истории события.
+
+    Состояние игроков до самой ранней игры берётся одним GROUP BY, дальше движок
+    проходит только места этих игроков между первой и последней выбранной игрой.
+    """
+    game_ids = set(game_ids)
+    if not game_ids:
+        return {}
+
+    page_rows = event_seats_query(db, event_id).filter(GamePlayer.game_id.in_(game_ids)).all()
+    keys = {seat_key(row) for row in page_rows if row.name}
+    if not keys:
+        return {}
+
+    first = min((row.created_at, row.game_id) for row in page_rows)
+    last = max((row.created_at, row.game_id) for row in page_rows)
+    key_expr = func.coalesce(GamePlayer.user_id, GamePlayer.name)
+
+    engine = ScoringEngine(event_key(event_id))
+    prefix = db.query(
+        key_expr,
+        func.sum(case((GamePlayer.jk > 0, GamePlayer.jk), else_=0)),
+        func.sum(case((GamePlayer.best_move_black >= 1, 1), else_=0)),
+    ).filter(
+        _event_filter(event_id),
+        GamePlayer.name != "",
+        key_expr.in_(keys),
+        _before(*first),
+    ).group_by(key_expr)
+    for player_key, jk_count, best_moves_with_black in prefix:
+        engine.seed(player_key, jk_count or 0, best_moves_with_black or 0)
+
+    window = event_seats_query(db, event_id).filter(
+        key_expr.in_(keys),
+        ~_before(*first),
+        ~_after(*last),
+    )
+    return engine.run(window, game_ids=game_ids)
+
+
+def apply_seat_delta(db: Session, old_rows: List[GamePlayer], new_rows: List[GamePlayer]) -> None:
+    """Вычитает вклад старых мест игры и добавляет вклад новых. Коммит — на вызывающей стороне."""
+    changes: List[Tuple[GamePlayer, int]] = [(r, -1) for r in old_rows if r.name] + [(r, 1) for r in new_rows if r.name]
+    if not changes:
+        return
+
+    keys_by_event: Dict[str, set] = defaultdict(set)
+    for row, _ in changes:
+        keys_by_event[event_key(row.event_id)].add(seat_key(row))
+
+    stats_map: Dict[Tuple[str, str], PlayerEventStats] = {}
+    for ev_key, keys in keys_by_event.items():
+        for stats in db.query(PlayerEventStats).filter(
+            PlayerEventStats.event_id == ev_key,
+            PlayerEventStats.player_key.in_(keys)
+        ):
+            stats_map[(ev_key, stats.player_key)] = stats
+
+    role_plus_map: Dict[Tuple[str, str], Dict[str, list]] = {}
+    for row, sign in changes:
+        map_key = (event_key(row.event_id), seat_key(row))
+        stats = stats_map.get(map_key)
+        if stats is None:
+            if sign < 0:
+                continue
+            stats = new_stats(*map_key)
+            db.add(stats)
+            stats_map[map_key] = stats
+        if map_key not in role_plus_map:
+            role_plus_map[map_key] = codec.loads(stats.role_plus or "{}")
+        apply_seat(stats, row, sign, role_plus_map[map_key])
+
+    for map_key, stats in stats_map.items():
+        if map_key not in role_plus_map:
+            continue
+        if stats.games_count <= 0:
+            db.delete(stats)
+            continue
+        stats.role_plus = codec.dumps({role: values for role, values in role_plus_map[map_key].items() if values})
+
+    db.flush()
+
+
+def delete_event_stats(db: Session, event_id) -> None:
+    ev_key = event_key(event_id)
+    # Убираем из сессии загруженные строки события: иначе повторный rebuild_event_stats
+    # в той же транзакции добавит объекты с теми же ключами и конфликтует на flush
+    for obj in list(db.identity_map.values()):
+        if isinstance(obj, PlayerEventStats) and obj.event_id == ev_key:
+            db.expunge(obj)
+    db.query(PlayerEventStats).filter(
+        PlayerEventStats.event_id == ev_key
+    ).delete(synchronize_session=False)
+
+
+def rebuild_event_stats(db: Session, event_id) -> None:
+    """Полный пересчёт рейтинга события из game_players."""
+    ev_key = event_key(event_id)
+    delete_event_stats(db, ev_key)
+    rows = event_seats_query(db, ev_key).all()
+    db.add_all(accumulate(rows, ev_key).values())
+    db.flush()
+
+
+def rebuild_all_stats(db: Session) -> None:
+    db.query(PlayerEventStats).delete(synchronize_session=False)
+    event_ids = {event_key(ev_id) for (ev_id,) in db.query(GamePlayer.event_id).distinct()}
+    for ev_id in event_ids:
+        rebuild_event_stats(db, ev_id)
+    db.commit()
@@ -0,0 +1,66 @@
+import re
+import unicodedata
+from typing import Dict, List, Optional
+
+# Нормализация ников для сравнения "как человек": регистр, юникод-формы,
+# невидимые символы, пробелы, ё/е. Результат хранится в User.nickname_normalized
+# (уникальный индекс) и поддерживается при регистрации и смене ника.
+
+ZERO_WIDTH = "".join([
+    "\u200b",  # zero width space
+    "\u200c",  # zero width non-joiner
+    "\u200d",  # zero width joiner
+    "\ufeff",  # BOM
+])
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_nick(s: Optional[str]) -> str:
+    if not s:
+        return ""
+    # NFKC приводит разные юникод-формы к канону (полезно для кириллицы/латиницы)
+    s = unicodedata.normalize("NFKC", s)
+
+    # NBSP и похожие пробелы -> обычный пробел
+    s = s.replace("\u00A0", " ").replace("\u202F", " ")
+
+    # убрать zero-width
+    for ch in ZERO_WIDTH:
+        s = s.replace(ch, "")
+
+    # схлопнуть пробелы
+    s = s.strip()
+    s = _SPACES.sub(" ", s)
+
+    # регистр
+    s = s.lower()
+
+    # опционально: ё -> е (если у вас бывает)
+    s = s.replace("ё", "е")
+
+    return s
+
+
+def nickname_key(nickname: Optional[str]) -> Optional[str]:
+    """Значение для User.nickname_normalized: None вместо пустой строки (NULL не конфликтует в UNIQUE)."""
+    return normalize_nick(nickname) or None
+
+
+# Упоминание пользователя в тексте уведомления: в базе хранится id, ник
+# подставляется при чтении (api.notifications) — смена ника не трогает уведомления
+MENTION_RE = re.compile(r"\{user:([^{}]+)\}")
+DELETED_USER = "удалённый пользователь"
+
+
+def mention(user_id: str) -> str:
+    return "{user:%s}" % user_id
+
+
+def render_mentions(message: str, nicknames: Dict[str, str]) -> str:
+    """Заменяет {user:<id>} на текущий ник; nicknames — id -> ник."""
+    return MENTION_RE.sub(lambda m: nicknames.get(m.group(1), DELETED_USER), message)
+
+
+def mentioned_ids(message: Optional[str]) -> List[str]:
+    return MENTION_RE.findall(message or "")
@@ -0,0 +1,263 @@
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+from core import codec
+from db.models import GamePlayer, PlayerEventStats
+
+# Единые правила подсчёта очков: рейтинг события (player-stats), карточки игр
+# (getGames / getPlayerGames) и швейцарская рассадка считаются здесь.
+
+ROLE_MAPPING = {
+    "шериф": "sheriff",
+    "мирный": "citizen",
+    "мафия": "mafia",
+    "дон": "don",
+}
+
+BEST_MOVE_BONUS = {3: 1.5, 2: 1.0, 1: 0.0}
+WIN_BONUS = 2.5
+SK_PENALTY = 0.5
+
+# Колонки game_players, которые нужны движку: выборка кортежами вместо ORM-объектов
+# заметно быстрее на больших событиях
+SEAT_FIELDS = (
+    "game_id", "event_id", "user_id", "name", "position", "role", "plus",
+    "sk", "jk", "best_move_black", "is_win", "location", "created_at",
+)
+
+COUNTER_FIELDS = (
+    "games_count", "sk_count", "jk_count", "best_moves_with_black",
+    "deaths", "deaths_with_1_black", "deaths_with_2_black", "deaths_with_3_black",
+    "games_miet", "games_mipt",
+    "wins_sheriff", "wins_citizen", "wins_mafia", "wins_don",
+    "games_sheriff", "games_citizen", "games_mafia", "games_don",
+)
+
+
+def calculate_ci(x: int, n: int = 0) -> float:
+    # Сумма арифметической прогрессии 0.5, 1.0, ..., 0.5*x = 0.25 * x * (x + 1).
+    # n (число игр) в формуле не участвует — поэтому ci раскладывается по играм без остатка.
+    if x <= 0:
+        return 0.0
+    return 0.25 * x * (x + 1)
+
+
+def jk_penalty(jk_count: int) -> float:
+    # Прогрессивный штраф за ЖК: 0.5, 1.0, 1.5, ... за каждую следующую
+    if jk_count <= 0:
+        return 0.0
+    return 0.5 * jk_count * (jk_count + 1)
+
+
+def seat_key(row: GamePlayer) -> str:
+    return row.user_id or row.name
+
+
+class PlayerTotals:
+    """Итоги игрока в памяти: те же поля, что у PlayerEventStats, но без инструментирования ORM."""
+
+    __slots__ = ("event_id", "player_key", "user_id", "name", "role_plus",
+                 "total_plus", "total_best_move_bonus") + COUNTER_FIELDS
+
+    def __init__(self, event_id: str, player_key: str):
+        self.event_id = event_id
+        self.player_key = player_key
+        self.user_id = None
+        self.name = ""
+        self.role_plus = "{}"
+        self.total_plus = 0.0
+        self.total_best_move_bonus = 0.0
+        for field in COUNTER_FIELDS:
+            setattr(self, field, 0)
+
+    def to_model(self) -> PlayerEventStats:
+        return PlayerEventStats(**{field: getattr(self, field) for field in self.__slots__})
+
+
+def new_stats(event_id: str, player_key: str) -> PlayerEventStats:
+    stats = PlayerEventStats(event_id=event_id, player_key=player_key, name="", role_plus="{}")
+    for field in COUNTER_FIELDS:
+        setattr(stats, field, 0)
+    stats.total_plus = 0.0
+    stats.total_best_move_bonus = 0.0
+    return stats
+
+
+def apply_seat(stats: PlayerEventStats, row: GamePlayer, sign: int, role_plus: Dict[str, list]) -> None:
+    """Добавляет (sign=1) или вычитает (sign=-1) вклад одного места игрока."""
+    if sign > 0:
+        stats.name = row.name
+        if row.user_id:
+            stats.user_id = row.user_id
+
+    stats.games_count += sign
+
+    location_lower = (row.location or "").lower()
+    if "миэт" in location_lower:
+        stats.games_miet += sign
+    elif "мфти" in location_lower:
+        stats.games_mipt += sign
+
+    english_role = ROLE_MAPPING.get(row.role)
+    role_values = []
+    if english_role:
+        setattr(stats, f"games_{english_role}", getattr(stats, f"games_{english_role}") + sign)
+        if row.is_win:
+            setattr(stats, f"wins_{english_role}", getattr(stats, f"wins_{english_role}") + sign)
+
+    if row.plus is not None and row.plus >= 0:
+        stats.total_plus += sign * row.plus
+        if english_role:
+            role_values.append(row.plus)
+
+    if row.sk > 0:
+        stats.sk_count += sign * row.sk
+    if row.jk > 0:
+        stats.jk_count += sign * row.jk
+
+    mafia_count = row.best_move_black
+    if mafia_count is not None:
+        bonus = BEST_MOVE_BONUS.get(mafia_count, 0.0)
+        stats.total_best_move_bonus += sign * bonus
+        if english_role and bonus > 0:
+            role_values.append(bonus)
+        if mafia_count >= 1:
+            stats.best_moves_with_black += sign
+            stats.deaths += sign
+            if mafia_count in (1, 2, 3):
+                field = f"deaths_with_{mafia_count}_black"
+                setattr(stats, field, getattr(stats, field) + sign)
+
+    if english_role and role_values:
+        values = role_plus.setdefault(english_role, [])
+        for value in role_values:
+            if sign > 0:
+                values.append(value)
+            elif value in values:
+                values.remove(value)
+
+
+def wins_total(stats) -> int:
+    return sum(getattr(stats, f"wins_{role}") for role in ROLE_MAPPING.values())
+
+
+def total_points(stats) -> float:
+    return (
+        stats.total_plus +
+        stats.total_best_move_bonus -
+        SK_PENALTY * stats.sk_count -
+        jk_penalty(stats.jk_count) +
+        WIN_BONUS * wins_total(stats) +
+        calculate_ci(stats.best_moves_with_black, stats.games_count)
+    )
+
+
+@dataclass
+class SeatScore:
+    game_id: str
+    position: int
+    player_key: str
+    jk: int
+    plus: float
+    win: float
+    cb: float
+    sk_penalty: float
+    jk_penalty: float
+    ci: float
+
+    @property
+    def minuses(self) -> float:
+        return 0.0 - self.sk_penalty - self.jk_penalty
+
+    @property
+    def points(self) -> float:
+        return self.plus + self.win + self.cb - self.sk_penalty - self.jk_penalty + self.ci
+
+
+class ScoringEngine:
+    """Один проход по местам игроков в хронологическом порядке.
+
+    Копит итоги игроков (PlayerTotals) и для каждого
+    места выдаёт SeatScore — вклад этой игры в итог игрока. Сумма SeatScore.points
+    по играм игрока равна total_points(итог).
+    """
+
+    def __init__(self, event_id: str = "1"):
+        self.event_id = event_id
+        self.players: Dict[str, PlayerTotals] = {}
+        self._role_plus: Dict[str, Dict[str, list]] = defaultdict(dict)
+
+    def seed(self, player_key: str, jk_count: int, best_moves_with_black: int) -> None:
+        """Начальное состояние игрока: ЖК и ЛХ с чёрными до первой прогоняемой игры.
+
+        Очки места зависят от истории только через эти два счётчика, поэтому
+        для подсчёта страницы игр достаточно агрегата по более ранним местам.
+        """
+        stats = self.players.get(player_key)
+        if stats is None:
+            stats = self.players[player_key] = PlayerTotals(self.event_id, player_key)
+        stats.jk_count = jk_count
+        stats.best_moves_with_black = best_moves_with_black
+
+    def add_seat(self, row: GamePlayer) -> Optional[SeatScore]:
+        if not row.name:
+            return None
+        key = seat_key(row)
+        stats = self.players.get(key)
+        if stats is None:
+            stats = self.players[key] = PlayerTotals(self.event_id, key)
+
+        jk_before = stats.jk_count
+        x_before = stats.best_moves_with_black
+        cb_before = stats.total_best_move_bonus
+
+        apply_seat(stats, row, 1, self._role_plus[key])
+
+        return SeatScore(
+            game_id=row.game_id,
+            position=row.position,
+            player_key=key,
+            jk=row.jk if row.jk > 0 else 0,
+            plus=row.plus if row.plus is not None and row.plus >= 0 else 0.0,
+            win=WIN_BONUS if row.is_win and ROLE_MAPPING.get(row.role) else 0.0,
+            cb=stats.total_best_move_bonus - cb_before,
+            sk_penalty=SK_PENALTY * row.sk if row.sk > 0 else 0.0,
+            jk_penalty=jk_penalty(stats.jk_count) - jk_penalty(jk_before),
+            ci=calculate_ci(stats.best_moves_with_black) - calculate_ci(x_before),
+        )
+
+    def run(
+        self,
+        rows: Iterable[GamePlayer],
+        until_game_id: Optional[str] = None,
+        game_ids: Optional[set] = None,
+    ) -> Dict[str, List[SeatScore]]:
+        """Прогоняет места (уже отсортированные по времени игры).
+
+        until_game_id — остановиться после этой игры ("итоги на момент игры N").
+        game_ids — вернуть SeatScore только для этих игр (итоги копятся по всем).
+        """
+        games: Dict[str, List[SeatScore]] = {}
+        reached = False
+        for row in rows:
+            if reached and row.game_id != until_game_id:
+                break
+            score = self.add_seat(row)
+            if score is not None and (game_ids is None or row.game_id in game_ids):
+                games.setdefault(row.game_id, []).append(score)
+            if until_game_id is not None and row.game_id == until_game_id:
+                reached = True
+        return games
+
+    def totals(self) -> Dict[str, PlayerTotals]:
+        for key, stats in self.players.items():
+            stats.role_plus = codec.dumps(self._role_plus[key])
+        return self.players
+
+
+def accumulate(rows: Iterable[GamePlayer], event_id: str = "1") -> Dict[str, PlayerEventStats]:
+    """Итоги игроков по выборке мест в виде PlayerEventStats (ещё не добавленных в сессию)."""
+    engine = ScoringEngine(event_id)
+    engine.run(rows)
+    return {key: totals.to_model() for key, totals in engine.totals().items()}
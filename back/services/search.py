@@ -1,23 +1,87 @@
-import json
+import threading
+from bisect import bisect_left
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+
 from transliterate import translit
+from sqlalchemy import select, union
 from sqlalchemy.orm import Session
-from db.models import User, Game
 
-def levenshtein_distance(s1, s2):
+from db.models import ContentVersion, GamePlayer, User
+from services.versions import SEARCH_SCOPE
+
+# Подсказки ников для SuggestionInput. Раньше каждый запрос читал все ники и
+# разбирал JSON всех игр, а затем считал Левенштейна для каждого имени.
+# Теперь имена лежат в индексе в памяти (PlayerSearchIndex), который
+# пересобирается, только когда меняется версия scope SEARCH_SCOPE
+# (services.versions): регистрация, смена ника, удаление пользователя,
+# появление/исчезновение имени в game_players.
+
+MAX_DISTANCE = 2
+SUGGESTIONS_LIMIT = 10
+MAX_GRAM = 3
+_PREFIX_END = "\U0010ffff"
+
+
+def bounded_levenshtein(s1: str, s2: str, max_distance: int = MAX_DISTANCE) -> int:
+    """Расстояние Левенштейна, если оно не больше max_distance, иначе max_distance + 1.
+
+    Полоса Укконена: считаются только клетки |i - j| <= max_distance, расчёт
+    прекращается, как только минимум строки превысил порог. Разница длин и
+    общие префикс/суффикс отсекаются до DP.
+    """
+    if s1 == s2:
+        return 0
+    over = max_distance + 1
+    if abs(len(s1) - len(s2)) > max_distance:
+        return over
+
+    start = 0
+    shortest = min(len(s1), len(s2))
+    while start < shortest and s1[start] == s2[start]:
+        start += 1
+    end1, end2 = len(s1), len(s2)
+    while end1 > start and end2 > start and s1[end1 - 1] == s2[end2 - 1]:
+        end1 -= 1
+        end2 -= 1
+    s1, s2 = s1[start:end1], s2[start:end2]
     if len(s1) < len(s2):
-        return levenshtein_distance(s2, s1)
-    if len(s2) == 0:
-        return len(s1)
-    previous_row = range(len(s2) + 1)
-    for i, c1 in enumerate(s1):
-        current_row = [i + 1]
-        for j, c2 in enumerate(s2):
-            insertions = previous_row[j + 1] + 1
-            deletions = current_row[j] + 1
-            substitutions = previous_row[j] + (c1 != c2)
-            current_row.append(min(insertions, deletions, substitutions))
+        s1, s2 = s2, s1
+    len1, len2 = len(s1), len(s2)
+    if len2 == 0:
+        return len1
+
+    previous_row = [j if j <= max_distance else over for j in range(len2 + 1)]
+    for i in range(1, len1 + 1):
+        c1 = s1[i - 1]
+        lo = max(1, i - max_distance)
+        hi = min(len2, i + max_distance)
+        current_row = [over] * (len2 + 1)
+        current_row[0] = i if i <= max_distance else over
+        row_min = current_row[0]
+        for j in range(lo, hi + 1):
+            value = previous_row[j - 1] + (c1 != s2[j - 1])
+            if previous_row[j] + 1 < value:
+                value = previous_row[j] + 1
+            if current_row[j - 1] + 1 < value:
+                value = current_row[j - 1] + 1
+            if value > over:
+                value = over
+            current_row[j] = value
+            if value < row_min:
+                row_min = value
+        if row_min > max_distance:
+            return over
         previous_row = current_row
-    return previous_row[-1]
+    return previous_row[len2]
+
+def bounded_levenshtein_many(query: str, candidates: Iterable[str], max_distance: int = MAX_DISTANCE) -> List[int]:
+    """bounded_levenshtein одного запроса против многих строк (с отсечением по длине)."""
+    over = max_distance + 1
+    query_len = len(query)
+    return [
+        over if abs(len(candidate) - query_len) > max_distance else bounded_levenshtein(query, candidate, max_distance)
+        for candidate in candidates
+    ]
 
 def convert_layout(text: str) -> str:
     eng_chars = "`qwertyuiop[]asdfghjkl;'\\zxcvbnm,./~QWERTYUIOP{}ASDFGHJKL:\"|ZXCVBNM<>?"
@@ -31,74 +95,182 @@ def normalize_for_search(text: str) -> str:
     except Exception:
         return text.lower()
 
-def get_all_player_names(db: Session):
-    names = set()
-    users = db.query(User.nickname).all()
-    for user in users:
-        names.add(user.nickname)
-
-    games = db.query(Game.data).all()
-    for game in games:
-        try:
-            game_data = json.loads(game.data)
-            for player in game_data.get("players", []):
-                if player.get("name"):
-                    names.add(player["name"])
-        except (json.JSONDecodeError, TypeError):
-            continue
-    
-    return sorted(list(names), key=str.lower)
+
+def deletion_variants(word: str, max_deletes: int = MAX_DISTANCE) -> Set[str]:
+    """Все строки, получаемые удалением до max_deletes символов.
+
+    Если расстояние Левенштейна между a и b не больше k, у них есть общий
+    вариант с k удалениями — так находятся кандидаты без полного перебора.
+    """
+    variants = {word}
+    frontier = {word}
+    for _ in range(max_deletes):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        variants |= frontier
+    return variants
+
+
+class NameForms(NamedTuple):
+    name: str
+    lower: str
+    normalized: str
+
+
+class _Snapshot:
+    """Неизменяемый срез индекса: запросы читают его без блокировок."""
+
+    def __init__(self, forms: List[NameForms]):
+        self.forms = forms  # отсортированы по name.lower() — как прежний sorted(..., key=str.lower)
+        self.lower_keys = [f.lower for f in forms]
+
+        by_normalized = sorted(range(len(forms)), key=lambda i: forms[i].normalized)
+        self.normalized_keys = [forms[i].normalized for i in by_normalized]
+        self.normalized_pos = by_normalized
+
+        self.lower_deletes: Dict[str, List[int]] = {}
+        self.normalized_deletes: Dict[str, List[int]] = {}
+        self.grams: Dict[str, Set[int]] = {}
+        for pos, f in enumerate(forms):
+            for variant in deletion_variants(f.lower):
+                self.lower_deletes.setdefault(variant, []).append(pos)
+            for variant in deletion_variants(f.normalized):
+                self.normalized_deletes.setdefault(variant, []).append(pos)
+            for size in range(1, MAX_GRAM + 1):
+                for i in range(len(f.lower) - size + 1):
+                    self.grams.setdefault(f.lower[i:i + size], set()).add(pos)
+
+    def prefix(self, prefix: str) -> range:
+        lo = bisect_left(self.lower_keys, prefix)
+        hi = bisect_left(self.lower_keys, prefix + _PREFIX_END)
+        return range(lo, hi)
+
+    def normalized_prefix(self, prefix: str) -> List[int]:
+        lo = bisect_left(self.normalized_keys, prefix)
+        hi = bisect_left(self.normalized_keys, prefix + _PREFIX_END)
+        return self.normalized_pos[lo:hi]
+
+    def within_distance(self, word: str, deletes: Dict[str, List[int]], normalized: bool = False) -> Dict[int, int]:
+        """Позиции имён на расстоянии <= MAX_DISTANCE от word и сами расстояния."""
+        candidates = set()
+        for variant in deletion_variants(word):
+            candidates.update(deletes.get(variant, ()))
+        candidates = list(candidates)
+        keys = [self.forms[pos].normalized if normalized else self.forms[pos].lower for pos in candidates]
+        distances = bounded_levenshtein_many(word, keys)
+        return {pos: distance for pos, distance in zip(candidates, distances) if distance <= MAX_DISTANCE}
+
+    def containing(self, part: str) -> Set[int]:
+        if len(part) <= MAX_GRAM:
+            return self.grams.get(part, set())
+        postings = [self.grams.get(part[i:i + MAX_GRAM], set()) for i in range(len(part) - MAX_GRAM + 1)]
+        candidates = set.intersection(*sorted(postings, key=len))
+        return {pos for pos in candidates if part in self.forms[pos].lower}
+
+
+def _rank(f: NameForms, query_lower: str, query_converted: str, query_normalized: str,
+          distance_lower: Optional[int], distance_normalized: Optional[int],
+          distance_converted: Optional[int]) -> Optional[float]:
+    """Ранг подсказки: те же проверки и в том же порядке, что и раньше.
+
+    distance_* — расстояния из индекса удалений; None, если больше MAX_DISTANCE.
+    """
+    if f.lower.startswith(query_lower):
+        return 0
+    if f.normalized.startswith(query_normalized):
+        return 0.5
+    if f.lower.startswith(query_converted):
+        return 1
+    if distance_lower is not None:
+        return 2 + distance_lower
+    if distance_normalized is not None:
+        return 3 + distance_normalized
+    if distance_converted is not None:
+        return 4 + distance_converted
+    if query_lower in f.lower:
+        return 5
+    return None
+
+
+class PlayerSearchIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version: Optional[int] = None
+        self._forms_cache: Dict[str, NameForms] = {}
+        self._snapshot = _Snapshot([])
+
+    def _current_version(self, db: Session) -> int:
+        version = db.query(ContentVersion.version).filter(ContentVersion.scope == SEARCH_SCOPE).scalar()
+        return version or 0
+
+    def ensure_fresh(self, db: Session) -> _Snapshot:
+        version = self._current_version(db)
+        if version == self._version:
+            return self._snapshot
+        with self._lock:
+            if version != self._version:
+                self._rebuild(get_all_player_names(db))
+                self._version = version
+        return self._snapshot
+
+    def _forms(self, name: str) -> NameForms:
+        # Транслитерация дорогая — формы переживают пересборки индекса
+        forms = self._forms_cache.get(name)
+        if forms is None:
+            forms = NameForms(name, name.lower(), normalize_for_search(name))
+            self._forms_cache[name] = forms
+        return forms
+
+    def _rebuild(self, names: Iterable[str]) -> None:
+        forms = [self._forms(name) for name in sorted(names, key=str.lower)]
+        self._forms_cache = {f.name: f for f in forms}
+        self._snapshot = _Snapshot(forms)
+
+    def suggest(self, query: str, db: Session, limit: int = SUGGESTIONS_LIMIT) -> List[str]:
+        if not query:
+            return []
+        snapshot = self.ensure_fresh(db)
+
+        query_lower = query.lower()
+        query_converted = convert_layout(query_lower)
+        query_normalized = normalize_for_search(query)
+
+        # Ранг 0 — минимальный: если точных префиксов хватает, остальное не нужно
+        exact = snapshot.prefix(query_lower)
+        if len(exact) >= limit:
+            return [snapshot.forms[pos].name for pos in exact[:limit]]
+
+        near_lower = snapshot.within_distance(query_lower, snapshot.lower_deletes)
+        near_normalized = snapshot.within_distance(query_normalized, snapshot.normalized_deletes, normalized=True)
+        near_converted = snapshot.within_distance(query_converted, snapshot.lower_deletes)
+
+        candidates = set(exact)
+        candidates.update(snapshot.normalized_prefix(query_normalized))
+        candidates.update(snapshot.prefix(query_converted))
+        candidates.update(near_lower, near_normalized, near_converted)
+        candidates |= snapshot.containing(query_lower)
+
+        ranked = []
+        for pos in candidates:
+            rank = _rank(
+                snapshot.forms[pos], query_lower, query_converted, query_normalized,
+                near_lower.get(pos), near_normalized.get(pos), near_converted.get(pos),
+            )
+            if rank is not None:
+                ranked.append((rank, pos))
+        ranked.sort()
+        return [snapshot.forms[pos].name for _, pos in ranked[:limit]]
+
+
+search_index = PlayerSearchIndex()
+
+
+def get_all_player_names(db: Session) -> List[str]:
+    """Ники пользователей и имена игроков из игр (по game_players, без разбора JSON)."""
+    names_query = union(
+        select(User.nickname.label("name")).where(User.nickname.isnot(None)),
+        select(GamePlayer.name.label("name")).distinct(),
+    )
+    return sorted((name for (name,) in db.execute(names_query) if name), key=str.lower)
 
 def get_player_suggestions_logic(query: str, db: Session):
-    if not query:
-        return []
-
-    all_names = get_all_player_names(db)
-    
-    query_lower = query.lower()
-    query_converted = convert_layout(query_lower)
-    query_normalized = normalize_for_search(query)
-
-    suggestions = []
-    for name in all_names:
-        name_lower = name.lower()
-        name_normalized = normalize_for_search(name)
-
-        if name_lower.startswith(query_lower):
-            suggestions.append({"name": name, "rank": 0})
-            continue
-        
-        if name_normalized.startswith(query_normalized):
-            suggestions.append({"name": name, "rank": 0.5})
-            continue
-
-        if name_lower.startswith(query_converted):
-            suggestions.append({"name": name, "rank": 1})
-            continue
-
-        distance = levenshtein_distance(name_lower, query_lower)
-        if distance <= 2:
-            suggestions.append({"name": name, "rank": 2 + distance})
-            continue
-        
-        distance_normalized = levenshtein_distance(name_normalized, query_normalized)
-        if distance_normalized <= 2:
-            suggestions.append({"name": name, "rank": 3 + distance_normalized})
-            continue
-            
-        distance_converted = levenshtein_distance(name_lower, query_converted)
-        if distance_converted <= 2:
-            suggestions.append({"name": name, "rank": 4 + distance_converted})
-            continue
-        
-        if query_lower in name_lower:
-            suggestions.append({"name": name, "rank": 5})
-            continue
-
-    unique_suggestions = {}
-    for s in suggestions:
-        if s["name"] not in unique_suggestions or s["rank"] < unique_suggestions[s["name"]]["rank"]:
-            unique_suggestions[s["name"]] = s
-    
-    sorted_suggestions = sorted(unique_suggestions.values(), key=lambda x: x["rank"])
-    return [s["name"] for s in sorted_suggestions[:10]]
\ No newline at end of file
+    return search_index.suggest(query, db)
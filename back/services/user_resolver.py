@@ -0,0 +1,116 @@
+from typing import Dict, Iterable, NamedTuple, Optional
+
+from sqlalchemy.orm import Session
+
+from db.models import User
+from services.avatars import avatar_srcset
+
+# SQLite ограничивает число параметров в запросе — IN режем на пачки
+IN_CHUNK = 500
+
+
+class UserRef(NamedTuple):
+    id: str
+    nickname: str
+    avatar: Optional[str]
+
+
+class UserResolver:
+    """Поиск пользователей по никнейму/id в пределах одного запроса.
+
+    Эндпоинт сначала собирает все никнеймы страницы (игроки, судьи) и вызывает
+    load() — один SELECT по нужным пользователям вместо db.query(User).all()
+    или запроса на каждую игру. Дальше id/аватар берутся из словаря.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self._by_nickname: Dict[str, UserRef] = {}
+        self._by_id: Dict[str, UserRef] = {}
+        self._missing_nicknames = set()
+        self._missing_ids = set()
+
+    def load(self, nicknames: Iterable[Optional[str]] = (), ids: Iterable[Optional[str]] = ()) -> "UserResolver":
+        nicknames = {
+            n for n in nicknames
+            if n and n not in self._by_nickname and n not in self._missing_nicknames
+        }
+        ids = {i for i in ids if i and i not in self._by_id and i not in self._missing_ids}
+
+        for column, values in ((User.nickname, nicknames), (User.id, ids)):
+            values = list(values)
+            for start in range(0, len(values), IN_CHUNK):
+                rows = self.db.query(User.id, User.nickname, User.avatar).filter(
+                    column.in_(values[start:start + IN_CHUNK])
+                ).all()
+                for row in rows:
+                    ref = UserRef(row.id, row.nickname, row.avatar)
+                    self._by_id[ref.id] = ref
+                    if ref.nickname:
+                        self._by_nickname[ref.nickname] = ref
+
+        # Не найденные не ищем повторно
+        self._missing_nicknames.update(n for n in nicknames if n not in self._by_nickname)
+        self._missing_ids.update(i for i in ids if i not in self._by_id)
+        return self
+
+    def by_nickname(self, nickname: Optional[str]) -> Optional[UserRef]:
+        return self._by_nickname.get(nickname) if nickname else None
+
+    def by_id(self, user_id: Optional[str]) -> Optional[UserRef]:
+        return self._by_id.get(user_id) if user_id else None
+
+    def id_for(self, nickname: Optional[str]) -> Optional[str]:
+        ref = self.by_nickname(nickname)
+        return ref.id if ref else None
+
+    def avatar_for(self, nickname: Optional[str]) -> Optional[str]:
+        ref = self.by_nickname(nickname)
+        return ref.avatar if ref else None
+
+
+def referenced_nicknames(blobs: Iterable[dict]) -> set:
+    """Никнеймы игроков и судей из разобранных Game.data."""
+    nicknames = set()
+    for data in blobs:
+        if not isinstance(data, dict):
+            continue
+        for p in data.get("players") or []:
+            if isinstance(p, dict) and p.get("name"):
+                nicknames.add(p["name"])
+        judge = (data.get("gameInfo") or {}).get("judgeNickname")
+        if judge:
+            nicknames.add(judge)
+    return nicknames
+
+
+
+def seat_nicknames(players) -> set:
+    """Ники мест как есть и без пробелов по краям (оверлеи искали фото по обрезанному нику)."""
+    nicknames = set()
+    for p in players or []:
+        name = p.get("name") if isinstance(p, dict) else None
+        if isinstance(name, str) and name.strip():
+            nicknames.update((name, name.strip()))
+    return nicknames
+
+
+def players_with_photos(players, users: UserResolver) -> list:
+    """Копии мест с photoUrl (аватар по нику, None — нет в базе); ники уже загружены в users."""
+    result = []
+    for p in players or []:
+        if isinstance(p, dict):
+            name = p.get("name") if isinstance(p.get("name"), str) else None
+            photo = (users.avatar_for(name) or users.avatar_for(name.strip())) if name else None
+            p = dict(p, photoUrl=photo, photoSrcset=avatar_srcset(photo))
+        result.append(p)
+    return result
+
+
+def game_with_photos(data: dict, db: Session) -> dict:
+    """Game.data для оверлеев: photoUrl у каждого места, чтобы не запрашивать фото по одному."""
+    if not isinstance(data, dict):
+        return data
+    players = data.get("players") or []
+    users = UserResolver(db).load(seat_nicknames(players))
+    return dict(data, players=players_with_photos(players, users))
@@ -0,0 +1,84 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import Dict, Iterable, List, Optional
+
+from fastapi import Request, Response
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from db.models import ContentVersion
+from services.cache import response_cache
+
+# Версии содержимого для ETag: каждая запись, меняющая ответ GET-эндпоинта,
+# увеличивает версию своего scope. Проверка If-None-Match — один SELECT по PK,
+# без чтения Game.data и без подсчёта рейтинга.
+
+USERS_SCOPE = "users"
+# Набор имён для подсказок (services.search): ники и имена игроков в играх
+SEARCH_SCOPE = "search"
+
+
+def game_scope(game_id: str) -> str:
+    return f"game:{game_id}"
+
+
+def event_scope(event_id: Optional[str]) -> str:
+    # Игры без события и игры события "1" — общий рейтинг
+    return f"event:{event_id or '1'}"
+
+
+def bump(db: Session, *scopes: str) -> None:
+    """Увеличивает версии scope'ов. Коммит — на вызывающей стороне."""
+    now = datetime.utcnow()
+    for scope in set(scopes):
+        stmt = insert(ContentVersion).values(scope=scope, version=1, updated_at=now)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ContentVersion.scope],
+            set_={"version": ContentVersion.version + 1, "updated_at": now},
+        )
+        db.execute(stmt)
+
+        # Ключи кэша и так содержат версию; здесь просто освобождаем память сразу
+        if scope == USERS_SCOPE:
+            response_cache.invalidate()
+        elif scope.startswith("event:"):
+            response_cache.invalidate(scope[len("event:"):])
+
+
+def bump_games(db: Session, game_ids: Iterable[str], *event_ids: Optional[str]) -> None:
+    """Игры и события, в рейтинг/страницу которых они входят."""
+    bump(db, *(game_scope(game_id) for game_id in game_ids), *(event_scope(ev) for ev in event_ids))
+
+
+def version_headers(db: Session, scopes: List[str], variant: str = "") -> Dict[str, str]:
+    rows = db.query(ContentVersion.scope, ContentVersion.version, ContentVersion.updated_at).filter(
+        ContentVersion.scope.in_(scopes)
+    ).all()
+    found = {scope: (version, updated_at) for scope, version, updated_at in rows}
+
+    parts = []
+    for scope in scopes:
+        version, updated_at = found.get(scope, (0, None))
+        parts.append(f"{scope}={version}@{updated_at.isoformat() if updated_at else ''}")
+    parts.append(variant)
+    digest = hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()[:24]
+
+    headers = {"ETag": f'W/"{digest}"', "Cache-Control": "no-cache"}
+    stamps = [updated_at for _, updated_at in found.values() if updated_at]
+    if stamps:
+        headers["Last-Modified"] = format_datetime(max(stamps).replace(tzinfo=timezone.utc), usegmt=True)
+    return headers
+
+
+def not_modified(request: Request, headers: Dict[str, str]) -> Optional[Response]:
+    """304, если клиент прислал актуальный ETag; иначе None."""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return None
+    etag = headers["ETag"]
+    # Слабое сравнение: nginx может снять или добавить префикс W/
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    if "*" in tags or etag.removeprefix("W/") in tags:
+        return Response(status_code=304, headers=headers)
+    return None
@@ -1,8 +1,9 @@
 # services/ws_manager.py
 import asyncio
 from dataclasses import dataclass
-from typing import Dict, Optional
+from typing import Any, Dict, Optional, Set
 from fastapi import WebSocket
+from core import codec
 
 @dataclass
 class AgentConnection:
@@ -22,6 +23,9 @@ class WSAgentManager:
     def __init__(self):
         self._agents: Dict[str, AgentConnection] = {}
         self._controls: Dict[str, ControlConnection] = {}
+        # Подписчики на состояние игры (оверлеи) и последнее опубликованное состояние
+        self._game_subs: Dict[str, Set[WebSocket]] = {}
+        self._game_state: Dict[str, str] = {}
         self._lock = asyncio.Lock()
 
     # --- алиасы под роутер ---
@@ -59,4 +63,53 @@ class WSAgentManager:
                 for a in self._agents.values()
             ]
 
+    # --- подписки на игры ---
+    async def subscribe_game(self, game_id: str, websocket: WebSocket) -> Optional[str]:
+        """Добавляет подписчика; возвращает последнее состояние игры, если оно уже в памяти."""
+        async with self._lock:
+            self._game_subs.setdefault(game_id, set()).add(websocket)
+            return self._game_state.get(game_id)
+
+    async def unsubscribe_game(self, game_id: str, websocket: WebSocket):
+        async with self._lock:
+            subs = self._game_subs.get(game_id)
+            if subs is None:
+                return
+            subs.discard(websocket)
+            if not subs:
+                # Зрителей не осталось — состояние больше не держим
+                self._game_subs.pop(game_id, None)
+                self._game_state.pop(game_id, None)
+
+    async def remember_game_state(self, game_id: str, message: str) -> str:
+        """Запоминает снимок из БД, если публикация не успела положить более свежий."""
+        async with self._lock:
+            if game_id not in self._game_subs:
+                return message
+            return self._game_state.setdefault(game_id, message)
+
+    async def publish_game(self, game_id: str, message_type: str, data: Any = None):
+        """Сериализует сообщение один раз и рассылает всем подписчикам игры."""
+        async with self._lock:
+            if game_id not in self._game_subs:
+                return
+
+        message = game_message(game_id, message_type, data)
+        async with self._lock:
+            subs = list(self._game_subs.get(game_id, ()))
+            if message_type == "state" and subs:
+                self._game_state[game_id] = message
+            else:
+                self._game_state.pop(game_id, None)
+
+        results = await asyncio.gather(*(ws.send_text(message) for ws in subs), return_exceptions=True)
+        for ws, result in zip(subs, results):
+            if isinstance(result, Exception):
+                await self.unsubscribe_game(game_id, ws)
+
+
+def game_message(game_id: str, message_type: str, data: Any = None) -> str:
+    return codec.dumps({"type": message_type, "gameId": game_id, "data": data})
+
+
 ws_agent_manager = WSAgentManager()
@@ -0,0 +1,135 @@
+"""Параллельные /saveGameData одной игры и материализованный рейтинг.
+
+Запуск из каталога back:  python -m unittest tests.test_concurrent_saves
+"""
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+BACK_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORK_DIR = tempfile.mkdtemp(prefix="wakeup-test-")
+os.makedirs(os.path.join(WORK_DIR, "data"), exist_ok=True)
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(WORK_DIR, "data", "database.db")
+os.chdir(WORK_DIR)  # main монтирует ./data
+sys.path.insert(0, BACK_DIR)
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from db.migrations import migrate  # noqa: E402
+
+migrate()
+
+import main  # noqa: E402
+from core.security import create_access_token, get_password_hash  # noqa: E402
+from db.base import SessionLocal  # noqa: E402
+from db.models import GamePlayer, PlayerEventStats, User  # noqa: E402
+from services.leaderboard import rebuild_event_stats  # noqa: E402
+
+SAVES = 10
+ROLES = ["мирный"] * 6 + ["шериф", "мафия", "мафия", "дон"]
+
+
+def game_payload(game_id: str, variant: int) -> dict:
+    # У каждого пересохранения свой состав и плюсы, чтобы ошибка дельты была видна
+    players = []
+    for seat in range(10):
+        user = (seat + variant) % 14
+        players.append({
+            "id": seat + 1,
+            "userId": f"user_{user}",
+            "name": f"Nick{user}",
+            "role": ROLES[seat],
+            "plus": (seat + variant) % 3 * 0.5,
+            "best_move": "",
+        })
+    return {
+        "gameId": game_id,
+        "players": players,
+        "fouls": [],
+        "gameInfo": {"tableNumber": 1},
+        "badgeColor": "red" if variant % 2 else "black",
+        "eventId": "1",
+        "location": "МИЭТ",
+        "currentDay": "Д1",
+        "currentPhase": "day",
+    }
+
+
+def stats_snapshot(db) -> list:
+    columns = [c.name for c in PlayerEventStats.__table__.columns]
+    rows = db.query(PlayerEventStats).filter(PlayerEventStats.games_count > 0).all()
+    return sorted(tuple(getattr(row, c) for c in columns) for row in rows)
+
+
+class ConcurrentSaveTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        db = SessionLocal()
+        password = get_password_hash("pw")
+        for i in range(14):
+            db.add(User(
+                id=f"user_{i}", email=f"u{i}@example.com", nickname=f"Nick{i}",
+                hashed_password=password, role="admin" if i == 0 else "user",
+            ))
+        db.commit()
+        db.close()
+        token = create_access_token({"sub": "Nick0", "role": "admin", "id": "user_0"})
+        cls.headers = {"Authorization": f"Bearer {token}"}
+        cls.client = TestClient(main.app, raise_server_exceptions=False)
+        cls.client.__enter__()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.client.__exit__(None, None, None)
+
+    def save_concurrently(self, game_id: str) -> list:
+        barrier = threading.Barrier(SAVES)
+        statuses = []
+
+        def save(variant: int) -> None:
+            barrier.wait()
+            response = self.client.post("/saveGameData", json=game_payload(game_id, variant), headers=self.headers)
+            statuses.append(response.status_code)
+
+        threads = [threading.Thread(target=save, args=(variant,)) for variant in range(SAVES)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return statuses
+
+    def assert_stats_match_rebuild(self) -> None:
+        db = SessionLocal()
+        try:
+            materialized = stats_snapshot(db)
+            rebuild_event_stats(db, "1")
+            db.commit()
+            self.assertEqual(materialized, stats_snapshot(db))
+        finally:
+            db.close()
+
+    def test_concurrent_resaves_keep_stats_consistent(self):
+        response = self.client.post("/saveGameData", json=game_payload("resave_g1", 0), headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(self.save_concurrently("resave_g1"), [200] * SAVES)
+
+        db = SessionLocal()
+        seats = db.query(GamePlayer).filter(GamePlayer.game_id == "resave_g1").count()
+        db.close()
+        self.assertEqual(seats, 10)
+        self.assert_stats_match_rebuild()
+
+    def test_concurrent_first_saves_create_game_once(self):
+        self.assertEqual(self.save_concurrently("new_g1"), [200] * SAVES)
+
+        response = self.client.get("/checkGameExists/new_g1")
+        self.assertEqual(response.json(), {"exists": True})
+        self.assert_stats_match_rebuild()
+
+
+if __name__ == "__main__":
+    unittest.main()
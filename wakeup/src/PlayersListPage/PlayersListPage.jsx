@@ -2,8 +2,17 @@ import React, { useState, useEffect } from 'react';
 import { NavLink } from 'react-router-dom';
 import styles from './PlayersListPage.module.css';
 import defaultAvatar from '../NavBar/avatar.png';
+import AvatarPicture from '../components/AvatarPicture/AvatarPicture';
 import { useDebounce } from '../useDebounce';
 
+const CLUBS = ["WakeUp | MIET", "WakeUp | MIPT", "Другой", "Misis Mafia", "Триада Менделеева", "ЦКСМ"];
+
+const SORT_OPTIONS = [
+    { value: 'game_count', label: 'По количеству игр' },
+    { value: 'last_played', label: 'По последней игре' },
+    { value: 'nickname', label: 'По никнейму' },
+];
+
 const PlayersListPage = () => {
     const [players, setPlayers] = useState([]);
     const [loading, setLoading] = useState(true);
@@ -14,19 +23,32 @@ const PlayersListPage = () => {
     const debouncedSearchTerm = useDebounce(searchTerm, 300);
 
     const [currentPage, setCurrentPage] = useState(1);
+    const [totalCount, setTotalCount] = useState(0);
+    const [sort, setSort] = useState('game_count');
+    const [club, setClub] = useState('');
     const itemsPerPage = 20;
 
+    // Фильтр, сортировка и страница считаются на сервере — грузим только видимых игроков
     useEffect(() => {
         const fetchPlayers = async () => {
             setLoading(true);
             setError(null);
             try {
-                const response = await fetch('/api/getPlayersList');
+                const params = new URLSearchParams({
+                    limit: String(itemsPerPage),
+                    offset: String((currentPage - 1) * itemsPerPage),
+                    sort,
+                    order: sort === 'nickname' ? 'asc' : 'desc',
+                });
+                if (club) params.set('club', club);
+                if (debouncedSearchTerm) params.set('query', debouncedSearchTerm);
+                const response = await fetch(`/api/getPlayersList?${params}`);
                 if (!response.ok) {
                     throw new Error('Не удалось загрузить список игроков');
                 }
                 const data = await response.json();
                 setPlayers(data.players || []);
+                setTotalCount(data.total_count || 0);
             } catch (err) {
                 setError(err.message);
             } finally {
@@ -35,7 +57,7 @@ const PlayersListPage = () => {
         };
 
         fetchPlayers();
-    }, []);
+    }, [currentPage, debouncedSearchTerm, sort, club]);
 
     useEffect(() => {
         if (debouncedSearchTerm.length > 1) {
@@ -50,17 +72,13 @@ const PlayersListPage = () => {
 
     const handleSuggestionClick = (name) => {
         setSearchTerm(name);
+        setCurrentPage(1);
         setSuggestions([]);
         setIsSuggestionsVisible(false);
     };
 
-    const filteredPlayers = players.filter(player =>
-        player.nickname.toLowerCase().includes(searchTerm.toLowerCase())
-    );
-
-    const totalPages = Math.ceil(filteredPlayers.length / itemsPerPage);
-    const startIndex = (currentPage - 1) * itemsPerPage;
-    const paginatedPlayers = filteredPlayers.slice(startIndex, startIndex + itemsPerPage);
+    const totalPages = Math.ceil(totalCount / itemsPerPage);
+    const paginatedPlayers = players;
 
     const handlePageChange = (page) => {
         if (page >= 1 && page <= totalPages) {
@@ -68,7 +86,7 @@ const PlayersListPage = () => {
         }
     };
 
-    if (loading) {
+    if (loading && players.length === 0) {
         return <div className={styles.pageWrapper}><p>Загрузка игроков...</p></div>;
     }
 
@@ -109,6 +127,34 @@ const PlayersListPage = () => {
                     )}
                 </div>
 
+                <div className={styles.filters}>
+                    <select
+                        className={styles.filterSelect}
+                        value={sort}
+                        onChange={(e) => {
+                            setSort(e.target.value);
+                            setCurrentPage(1);
+                        }}
+                    >
+                        {SORT_OPTIONS.map(({ value, label }) => (
+                            <option key={value} value={value}>{label}</option>
+                        ))}
+                    </select>
+                    <select
+                        className={styles.filterSelect}
+                        value={club}
+                        onChange={(e) => {
+                            setClub(e.target.value);
+                            setCurrentPage(1);
+                        }}
+                    >
+                        <option value="">Все клубы</option>
+                        {CLUBS.map((name) => (
+                            <option key={name} value={name}>{name}</option>
+                        ))}
+                    </select>
+                </div>
+
                 <section className={styles.playersGrid}>
                     {paginatedPlayers.map((player) => {
                         
@@ -127,7 +173,7 @@ const PlayersListPage = () => {
                         return (
                             // --- ИЗМЕНЕНИЕ: Новая структура карточки ---
                             <NavLink to={`/profile/${player.id}`} key={player.id} className={`${styles.playerCard} ${cardBgClass}`}>
-                                <img src={player.photoUrl || defaultAvatar} alt="avatar" className={styles.avatar} />
+                                <AvatarPicture src={player.photoUrl} srcset={player.photoSrcset} fallback={defaultAvatar} className={styles.avatar} />
                                 <div className={styles.playerInfo}>
                                     <div className={styles.playerName}>{player.nickname}</div>
                                     <div className={styles.playerClub}>{player.club || 'Клуб не указан'}</div>
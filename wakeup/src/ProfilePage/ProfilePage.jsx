@@ -5,7 +5,7 @@ import { AuthContext } from "../AuthContext";
 import placeholderAvatar from "../images/profile_photo/soon.png";
 import GameCard from "../components/GameCard/GameCard";
 
-const PlayerGames = ({ nickname, games, loading, error, isAdmin, onDelete, onEdit }) => {
+const PlayerGames = ({ nickname, games, totalCount, hasMore, loadingMore, onLoadMore, loading, error, isAdmin, onDelete, onEdit }) => {
   const navigate = useNavigate();
 
   const handlePlayerClick = (playerId) => {
@@ -19,9 +19,11 @@ const PlayerGames = ({ nickname, games, loading, error, isAdmin, onDelete, onEdi
   if (error) return <div className={styles.errorBanner}>Ошибка: {error}</div>;
   if (games.length === 0) return <div>У этого игрока пока нет сыгранных игр в рейтинге.</div>;
 
-  const totalGames = games.length;
+  // Нумерация от самой первой игры — страницы приходят новыми сверху
+  const totalGames = totalCount || games.length;
 
   return (
+    <>
     <div className={styles.gamesGrid}>
       {games.map((game, index) => (
         <GameCard
@@ -40,6 +42,12 @@ const PlayerGames = ({ nickname, games, loading, error, isAdmin, onDelete, onEdi
         />
       ))}
     </div>
+    {hasMore && (
+      <button onClick={onLoadMore} disabled={loadingMore} className={styles.loadbutton}>
+        {loadingMore ? "Загрузка..." : "Показать ещё"}
+      </button>
+    )}
+    </>
   );
 };
 
@@ -58,6 +66,23 @@ const humanFileSize = (bytes) => {
 const clubsList = ["WakeUp | MIET", "WakeUp | MIPT", "Другой", "Misis Mafia","Триада Менделеева","ЦКСМ"];
 const favoriteCardsList = ["Шериф", "Мирный", "Мафия", "Дон"];
 
+const GAMES_PAGE_SIZE = 20;
+
+const EMPTY_STATS = {
+  totalGames: 0,
+  totalWins: 0,
+  totalLosses: 0,
+  winrate: 0,
+  byRole: {
+    'Черная карта': { games: 0, wins: 0 },
+    'Дон': { games: 0, wins: 0 },
+    'Мафия': { games: 0, wins: 0 },
+    'Красная карта': { games: 0, wins: 0 },
+    'Шериф': { games: 0, wins: 0 },
+    'Мирный': { games: 0, wins: 0 },
+  }
+};
+
 
 // Компонент тоста
 const CustomToast = ({ message, type = "success", onClose }) => {
@@ -135,6 +160,10 @@ const ProfilePage = () => {
   const MAX_BYTES = 2 * 1024 * 1024;
 
   const [playerGames, setPlayerGames] = useState([]);
+  const [gamesCursor, setGamesCursor] = useState(null);
+  const [gamesTotal, setGamesTotal] = useState(0);
+  const [gamesStats, setGamesStats] = useState(null);
+  const [gamesLoadingMore, setGamesLoadingMore] = useState(false);
   const [gamesLoading, setGamesLoading] = useState(true);
   const [gamesError, setGamesError] = useState(null);
 
@@ -151,23 +180,29 @@ const ProfilePage = () => {
     }, 4000);
   };
 
-  const fetchGames = useCallback(async (user_id) => {
+  const fetchGames = useCallback(async (user_id, cursor = null) => {
     
     if (!user_id) return;
-    setGamesLoading(true);
+    if (cursor) setGamesLoadingMore(true);
+    else setGamesLoading(true);
     setGamesError(null);
     try {
-      const response = await fetch(`/api/users/${user_id}/games`);
+      const params = new URLSearchParams({ limit: String(GAMES_PAGE_SIZE) });
+      if (cursor) params.set("cursor", cursor);
+      const response = await fetch(`/api/users/${user_id}/games?${params}`);
       if (!response.ok) throw new Error("Не удалось загрузить историю игр");
       
       const data = await response.json();
-      console.log(data); // у тебя тут уже массив
-      setPlayerGames(Array.isArray(data) ? data : []);
-      console.log(playerGames)
+      const page = Array.isArray(data?.games) ? data.games : [];
+      setPlayerGames((prev) => (cursor ? [...prev, ...page] : page));
+      setGamesCursor(data?.next_cursor || null);
+      setGamesTotal(data?.total_count ?? page.length);
+      setGamesStats(data?.stats || null);
     } catch (err) {
       setGamesError(err.message);
     } finally {
       setGamesLoading(false);
+      setGamesLoadingMore(false);
     }
   }, []);
 
@@ -227,85 +262,8 @@ const ProfilePage = () => {
     fetchProfile();
   }, [targetUserId, fetchGames]);
 
-const playerStats = useMemo(() => {
-  const stats = {
-    totalGames: 0,
-    totalWins: 0,
-    totalLosses: 0,
-    winrate: 0,
-    byRole: {
-      'Черная карта': { games: 0, wins: 0 },
-      'Дон': { games: 0, wins: 0 },
-      'Мафия': { games: 0, wins: 0 },
-      'Красная карта': { games: 0, wins: 0 },
-      'Шериф': { games: 0, wins: 0 },
-      'Мирный': { games: 0, wins: 0 },
-    }
-  };
-
-  if (!Array.isArray(playerGames) || playerGames.length === 0) {
-    return stats;
-  }
-
-  const roleMap = {
-    'мирный': 'Мирный',
-    'шериф': 'Шериф',
-    'мафия': 'Мафия',
-    'дон': 'Дон',
-  };
-
-  playerGames.forEach(g => {
-    const player = g?.player;
-    const game = g?.game;
-
-    if (!player || !game) return;
-
-    const rawRole = player.role?.toLowerCase();
-    if (!rawRole) return;
-
-    const mappedRole = roleMap[rawRole];
-    const badgeColor = game.badgeColor;
-
-    const isRedPlayer = rawRole === 'мирный' || rawRole === 'шериф';
-    const isBlackPlayer = rawRole === 'мафия' || rawRole === 'дон';
-
-    let isWin = false;
-
-    if (badgeColor === 'red' && isRedPlayer) isWin = true;
-    if (badgeColor === 'black' && isBlackPlayer) isWin = true;
-
-    // считаем только валидные игры
-    if (badgeColor === 'red' || badgeColor === 'black') {
-      stats.totalGames++;
-
-      if (isWin) stats.totalWins++;
-      else stats.totalLosses++;
-    }
-
-    // по конкретной роли
-    if (mappedRole && stats.byRole[mappedRole]) {
-      stats.byRole[mappedRole].games++;
-      if (isWin) stats.byRole[mappedRole].wins++;
-    }
-
-    // по цвету
-    if (isRedPlayer) {
-      stats.byRole['Красная карта'].games++;
-      if (isWin) stats.byRole['Красная карта'].wins++;
-    }
-
-    if (isBlackPlayer) {
-      stats.byRole['Черная карта'].games++;
-      if (isWin) stats.byRole['Черная карта'].wins++;
-    }
-  });
-
-  if (stats.totalGames > 0) {
-    stats.winrate = Math.round((stats.totalWins / stats.totalGames) * 100);
-  }
-
-  return stats;
-}, [playerGames]);
+// Статистика по ролям считается на сервере по всей истории — страницы игр грузятся частями
+const playerStats = gamesStats || EMPTY_STATS;
 
   const onChangeField = (field) => (e) => {
     const val = e.target.value;
@@ -786,6 +744,10 @@ const playerStats = useMemo(() => {
             <PlayerGames 
               nickname={profileData.nickname} 
               games={playerGames}
+              totalCount={gamesTotal}
+              hasMore={!!gamesCursor}
+              loadingMore={gamesLoadingMore}
+              onLoadMore={() => fetchGames(targetUserId, gamesCursor)}
               loading={gamesLoading}
               error={gamesError}
               isAdmin={isAdmin}
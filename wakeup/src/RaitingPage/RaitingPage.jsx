@@ -3,6 +3,7 @@ import { useNavigate, useLocation, useSearchParams } from 'react-router-dom';
 import { AuthContext } from '../AuthContext';
 import styles from './RatingPage.module.css';
 import defaultAvatar from '../NavBar/avatar.png';
+import AvatarPicture from '../components/AvatarPicture/AvatarPicture';
 import { useDebounce } from '../useDebounce';
 import GameCard from '../components/GameCard/GameCard';
 
@@ -409,9 +410,10 @@ export default function RatingPage() {
         <article key={player.id ?? `${rank}-${index}`} className={styles.card}>
           <div className={styles.cardPlayer}>
             <div className={styles.avatarWrap}>
-              <img
-                src={player.photoUrl || defaultAvatar}
-                alt="avatar"
+              <AvatarPicture
+                src={player.photoUrl}
+                srcset={player.photoSrcset}
+                fallback={defaultAvatar}
                 className={styles.avatar}
               />
               <div className={styles.rankBadge} aria-label={`Место ${rank}`}>
@@ -1,6 +1,7 @@
 import React, { useEffect, useMemo, useRef, useState } from "react";
 import styles from "./eventWidget.module.css";
 import defaultAvatar from "../../NavBar/avatar.png";
+import AvatarPicture from "../../components/AvatarPicture/AvatarPicture";
 
 function extractEventIdFromPath(pathname) {
   const parts = pathname.split("/").filter(Boolean);
@@ -19,13 +20,11 @@ function extractEventIdFromPath(pathname) {
 
 export default function EventPlayerStatsTable() {
   const [data, setData] = useState(null);
-  const [photos, setPhotos] = useState({});
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState("");
 
   const [page, setPage] = useState(0); // текущая “десятка”
   const lastDataHashRef = useRef("");
-  const requestedPhotosRef = useRef(new Set());
 
   const location = useMemo(() => {
     const qs = new URLSearchParams(window.location.search);
@@ -55,7 +54,7 @@ export default function EventPlayerStatsTable() {
           `${API_BASE}/events/${encodeURIComponent(eventId)}/player-stats` +
           (location ? `?location=${encodeURIComponent(location)}` : "");
 
-        const res = await fetch(url, { cache: "no-store", signal: controller.signal });
+        const res = await fetch(url, { cache: "no-cache", signal: controller.signal });
         if (!res.ok) throw new Error(`HTTP ${res.status}`);
         const json = await res.json();
 
@@ -89,6 +88,8 @@ export default function EventPlayerStatsTable() {
     return players.map((p, i) => ({
       rank: i + 1,
       name: (p?.name || p?.nickname || `Игрок ${i + 1}`).trim(),
+      photoUrl: p?.photoUrl || null, // player-stats отдаёт аватар вместе с рейтингом
+      photoSrcset: p?.photoSrcset || null,
       totalPoints: Number(p?.totalPoints || 0),
 
       totalCi: Number(p?.totalCi || 0),
@@ -103,29 +104,6 @@ export default function EventPlayerStatsTable() {
     }));
   }, [data]);
 
-  // === Фото игроков — без дублей ===
-  useEffect(() => {
-    if (!rows.length) return;
-
-    rows.forEach(async (r) => {
-      const nickname = r.name;
-      if (!nickname) return;
-
-      if (photos[nickname] || requestedPhotosRef.current.has(nickname)) return;
-      requestedPhotosRef.current.add(nickname);
-
-      try {
-        const res = await fetch(`/api/getUserPhoto/${encodeURIComponent(nickname)}`);
-        if (!res.ok) return;
-        const json = await res.json();
-        if (json?.photoUrl) {
-          setPhotos((prev) => ({ ...prev, [nickname]: json.photoUrl }));
-        }
-      } catch {
-        // молча
-      }
-    });
-  }, [rows, photos]);
 
   // === Автосвайп по 10 игроков каждые 10 секунд ===
   useEffect(() => {
@@ -182,13 +160,11 @@ export default function EventPlayerStatsTable() {
 
         <tbody>
           {visibleRows.map((r) => {
-            const photoUrl = photos[r.name] || defaultAvatar;
-
             return (
               <tr key={`${r.name}-${r.rank}`}>
                 <td>{r.rank}</td>
                 <td>
-                  <img src={photoUrl} alt={r.name} className={styles.avatar} />
+                  <AvatarPicture src={r.photoUrl} srcset={r.photoSrcset} fallback={defaultAvatar} alt={r.name} className={styles.avatar} />
                 </td>
                 <td style={{ fontWeight: 600 }}>{r.name}</td>
                 <td className={styles.total}>{r.totalPoints.toFixed(2)}</td>
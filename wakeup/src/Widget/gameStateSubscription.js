@@ -0,0 +1,97 @@
+// Подписка оверлея на состояние игры через /ws/game/{gameId}.
+// Сервер присылает снимок при подключении и новое состояние после каждого сохранения.
+// Пока сокет не подключён — опрашиваем /api/gameState раз в секунду, как раньше.
+
+const POLL_INTERVAL = 1000;
+const RECONNECT_DELAY = 3000;
+const PING_INTERVAL = 30000;
+
+const buildGameWsUrl = (gameId) => {
+  const proto = window.location.protocol === "https:" ? "wss" : "ws";
+  return `${proto}://${window.location.host}/ws/game/${encodeURIComponent(gameId)}`;
+};
+
+export function subscribeGameState(gameId, { onState, onNotFound, onError } = {}) {
+  const controller = new AbortController();
+  let ws = null;
+  let pollTimer = null;
+  let pingTimer = null;
+  let reconnectTimer = null;
+  let closed = false;
+
+  const poll = async () => {
+    try {
+      const url = `/api/gameState?gameId=${encodeURIComponent(gameId)}&photos=1`;
+      const res = await fetch(url, { cache: "no-cache", signal: controller.signal });
+      if (res.status === 404) {
+        onNotFound?.();
+        return;
+      }
+      if (!res.ok) throw new Error(`HTTP ${res.status}`);
+      onState?.(await res.json());
+    } catch (err) {
+      if (err?.name !== "AbortError") onError?.(err);
+    }
+  };
+
+  const startPolling = () => {
+    if (pollTimer || closed) return;
+    poll();
+    pollTimer = setInterval(poll, POLL_INTERVAL);
+  };
+
+  const stopPolling = () => {
+    clearInterval(pollTimer);
+    pollTimer = null;
+  };
+
+  const connect = () => {
+    if (closed) return;
+    try {
+      ws = new WebSocket(buildGameWsUrl(gameId));
+    } catch (err) {
+      onError?.(err);
+      startPolling();
+      reconnectTimer = setTimeout(connect, RECONNECT_DELAY);
+      return;
+    }
+
+    ws.onopen = () => {
+      pingTimer = setInterval(() => {
+        if (ws?.readyState === WebSocket.OPEN) ws.send(JSON.stringify({ type: "ping" }));
+      }, PING_INTERVAL);
+    };
+
+    ws.onmessage = (e) => {
+      let msg = null;
+      try { msg = JSON.parse(e.data); } catch { return; }
+
+      if (msg.type === "state") {
+        stopPolling();
+        onState?.(msg.data);
+      } else if (msg.type === "not_found" || msg.type === "deleted") {
+        stopPolling();
+        onNotFound?.();
+      }
+    };
+
+    ws.onclose = () => {
+      clearInterval(pingTimer);
+      ws = null;
+      if (closed) return;
+      startPolling();
+      reconnectTimer = setTimeout(connect, RECONNECT_DELAY);
+    };
+  };
+
+  connect();
+
+  return () => {
+    closed = true;
+    controller.abort();
+    stopPolling();
+    clearInterval(pingTimer);
+    clearTimeout(reconnectTimer);
+    if (ws) ws.close();
+  };
+}
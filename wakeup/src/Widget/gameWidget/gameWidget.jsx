@@ -1,4 +1,6 @@
 import React, { useEffect, useState, useRef } from "react";
+import { subscribeGameState } from "../gameStateSubscription";
+import { usePlayerPhotos } from "../usePlayerPhotos";
 import CCC_prew from "../../EventComponents/EventPrew/Rock.png";
 import logo from "../../images/logo.png";
 import sheriff from "../../images/gameIcon/Sheriff.png";
@@ -112,7 +114,6 @@ function getRoleColor(role) {
 
 const GameWidget = () => {
   const [gameData, setGameData] = useState(null);
-  const [photos, setPhotos] = useState({}); // Добавлено для хранения фото по nickname
   const storageKeyRef = useRef(null);
 
   useEffect(() => {
@@ -180,53 +181,13 @@ const GameWidget = () => {
       return;
     }
 
-    const controller = new AbortController();
-
-    const load = async () => {
-      try {
-        const url = `/api/gameState?gameId=${encodeURIComponent(gameId)}`;
-        const res = await fetch(url, { cache: "no-store", signal: controller.signal });
-        if (!res.ok) throw new Error(`HTTP ${res.status}`);
-        const parsed = await res.json();
-        setGameData(parsed);
-      } catch (err) {
-        if (err?.name !== "AbortError") console.error("Ошибка загрузки gameState:", err);
-      }
-    };
-
-    load();
-    const interval = setInterval(load, 1000);
-
-    return () => {
-      controller.abort();
-      clearInterval(interval);
-    };
+    return subscribeGameState(gameId, {
+      onState: setGameData,
+      onError: (err) => console.error("Ошибка загрузки gameState:", err),
+    });
   }, []);
 
-  // Добавлено: загрузка фото по nickname
-  useEffect(() => {
-    if (gameData && gameData.players) {
-      const nicknames = new Set(
-        gameData.players
-          .map((p) => p.name)
-          .filter((n) => n && n.trim())
-          .map((n) => n.trim())
-      );
-      nicknames.forEach(async (nickname) => {
-        try {
-          const res = await fetch(`/api/getUserPhoto/${encodeURIComponent(nickname)}`);
-          if (!res.ok) throw new Error(`HTTP ${res.status}`);
-          const data = await res.json();
-          const photoUrl = data.photoUrl;
-          if (photoUrl) {
-            setPhotos((prev) => ({ ...prev, [nickname]: photoUrl }));
-          }
-        } catch (err) {
-          console.error(`Ошибка загрузки фото для ${nickname}:`, err);
-        }
-      });
-    }
-  }, [gameData]);
+  const photos = usePlayerPhotos(gameData?.players);
 
   if (!gameData)
     return <div className={styles.loading}>Загрузка данных игры...</div>;
@@ -1,4 +1,6 @@
 import React, { useEffect, useMemo, useRef, useState } from "react";
+import { subscribeGameState } from "../gameStateSubscription";
+import { usePlayerPhotos } from "../usePlayerPhotos";
 import styles from "./resultWidget.module.css"; // Убедитесь, что этот путь корректный
 import defaultAvatar from "../../NavBar/avatar.png";
 import redWin from "../../images/redWin.png";
@@ -22,7 +24,6 @@ const getRoleColor = (role) => {
 
 export default function GameResultsTable() {
   const [gameData, setGameData] = useState(null);
-  const [photos, setPhotos] = useState({});
 
   useEffect(() => {
     const pathParts = window.location.pathname.split("/").filter(Boolean);
@@ -37,91 +38,38 @@ export default function GameResultsTable() {
       return;
     }
 
-    const controller = new AbortController();
-    let initialLoadDone = false; 
+    let initialLoadDone = false;
 
-    const fetchGameData = async () => {
+    const loadFallback = (reason) => {
+      const rawFromStorage = localStorage.getItem(`gameData-event-fallback-${gameId}`);
+      if (!rawFromStorage) return;
       try {
-        const url = `/api/gameState?gameId=${encodeURIComponent(gameId)}`;
-        const res = await fetch(url, { cache: "no-store", signal: controller.signal });
-        if (!res.ok) {
-          if (res.status === 404) {
-             console.warn(`Игра с ID ${gameId} не найдена на сервере.`);
-             const rawFromStorage = localStorage.getItem(`gameData-event-fallback-${gameId}`); 
-             if (rawFromStorage) {
-                try {
-                   const parsed = JSON.parse(rawFromStorage);
-                   setGameData(parsed);
-                   console.log("Загружены данные из localStorage как fallback.");
-                } catch (err) {
-                   console.error("Ошибка парсинга localStorage fallback:", err);
-                }
-             }
-             return; 
-          }
-          throw new Error(`HTTP ${res.status}`);
-        }
-        const parsed = await res.json();
-
-        setGameData((prev) =>
-          JSON.stringify(prev) !== JSON.stringify(parsed) ? parsed : prev
-        );
-        initialLoadDone = true; 
+        setGameData(JSON.parse(rawFromStorage));
+        console.log(`Загружены данные из localStorage как fallback (${reason}).`);
       } catch (err) {
-        if (err?.name !== "AbortError") {
-          console.error("Ошибка загрузки gameState:", err);
-          if (!initialLoadDone) {
-             const rawFromStorage = localStorage.getItem(`gameData-event-fallback-${gameId}`); 
-             if (rawFromStorage) {
-                try {
-                   const parsed = JSON.parse(rawFromStorage);
-                   setGameData(parsed);
-                   console.log("Загружены данные из localStorage как fallback после ошибки сервера.");
-                } catch (err) {
-                   console.error("Ошибка парсинга localStorage fallback (после ошибки сервера):", err);
-                }
-             }
-          }
-        }
+        console.error("Ошибка парсинга localStorage fallback:", err);
       }
     };
 
-    fetchGameData(); 
-    const interval = setInterval(fetchGameData, 1000); 
-
-    return () => {
-      controller.abort();
-      clearInterval(interval);
-    };
+    return subscribeGameState(gameId, {
+      onState: (parsed) => {
+        setGameData((prev) =>
+          JSON.stringify(prev) !== JSON.stringify(parsed) ? parsed : prev
+        );
+        initialLoadDone = true;
+      },
+      onNotFound: () => {
+        console.warn(`Игра с ID ${gameId} не найдена на сервере.`);
+        loadFallback("игра не найдена");
+      },
+      onError: (err) => {
+        console.error("Ошибка загрузки gameState:", err);
+        if (!initialLoadDone) loadFallback("ошибка сервера");
+      },
+    });
   }, []); 
 
-  useEffect(() => {
-    if (gameData?.players) {
-      const nicknames = new Set(
-        gameData.players
-          .map((p) => p.name)
-          .filter((n) => n && typeof n === 'string' && n.trim()) 
-          .map((n) => n.trim())
-      );
-      nicknames.forEach(async (nickname) => {
-        if (photos[nickname]) return;
-
-        try {
-          const res = await fetch(`/api/getUserPhoto/${encodeURIComponent(nickname)}`);
-          if (!res.ok) {
-            console.warn(`Не удалось получить фото для ${nickname}. Статус: ${res.status}`);
-            return; 
-          }
-          const data = await res.json();
-          if (data.photoUrl) {
-            setPhotos((prev) => ({ ...prev, [nickname]: data.photoUrl }));
-          }
-        } catch (err) {
-          console.warn(`Ошибка при запросе фото для ${nickname}:`, err);
-        }
-      });
-    }
-  }, [gameData, photos]); 
+  const photos = usePlayerPhotos(gameData?.players);
 
 
     const rows = useMemo(() => {
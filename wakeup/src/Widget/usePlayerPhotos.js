@@ -0,0 +1,49 @@
+// Фото игроков для оверлеев игры.
+// gameState?photos=1 и /ws/game присылают photoUrl у каждого места — берём его.
+// Для состояния без photoUrl (fallback из localStorage) — один пакетный
+// /getUsersPhotos на новые ники вместо /getUserPhoto на каждого игрока.
+import { useEffect, useMemo, useRef, useState } from "react";
+
+const trimName = (name) => (typeof name === "string" ? name.trim() : "");
+
+export function usePlayerPhotos(players) {
+  const [fetched, setFetched] = useState({});
+  const requestedRef = useRef(new Set());
+
+  useEffect(() => {
+    const missing = [
+      ...new Set(
+        (players || [])
+          .filter((p) => p && !("photoUrl" in p))
+          .map((p) => trimName(p.name))
+          .filter((n) => n && !requestedRef.current.has(n))
+      ),
+    ];
+    if (!missing.length) return;
+    missing.forEach((n) => requestedRef.current.add(n));
+
+    fetch("/api/getUsersPhotos", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ nicknames: missing }),
+    })
+      .then((res) => (res.ok ? res.json() : null))
+      .then((data) => {
+        const found = {};
+        (data?.photos || []).forEach((p) => {
+          if (p?.avatar) found[p.nick] = p.avatar;
+        });
+        if (Object.keys(found).length) setFetched((prev) => ({ ...prev, ...found }));
+      })
+      .catch((err) => console.warn("Ошибка загрузки фото игроков:", err));
+  }, [players]);
+
+  return useMemo(() => {
+    const photos = { ...fetched };
+    (players || []).forEach((p) => {
+      const name = trimName(p?.name);
+      if (name && p.photoUrl) photos[name] = p.photoUrl;
+    });
+    return photos;
+  }, [players, fetched]);
+}
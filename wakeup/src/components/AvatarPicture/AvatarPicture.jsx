@@ -0,0 +1,18 @@
+import React from 'react';
+
+// Аватар с вариантами 64/128/512 px (photoSrcset из API): браузер сам берёт
+// WebP нужного размера, PNG — фолбэк. У старых аватаров srcset нет — обычный <img>.
+const AvatarPicture = ({ src, srcset, fallback, sizes = '64px', alt = 'avatar', className }) => {
+    if (!src || !srcset) {
+        return <img src={src || fallback} alt={alt} className={className} />;
+    }
+    return (
+        // display: contents — разметка и стили остаются как у одиночного <img>
+        <picture style={{ display: 'contents' }}>
+            {srcset.webp && <source type="image/webp" srcSet={srcset.webp} sizes={sizes} />}
+            <img src={src} srcSet={srcset.png} sizes={sizes} alt={alt} className={className} />
+        </picture>
+    );
+};
+
+export default AvatarPicture;
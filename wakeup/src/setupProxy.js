@@ -25,4 +25,14 @@ module.exports = function(app) {
       logLevel: 'debug',
     })
   );
-};
\ No newline at end of file
+
+  app.use(
+    '/ws',
+    createProxyMiddleware({
+      target: 'http://127.0.0.1:8000',
+      changeOrigin: true,
+      ws: true,
+      logLevel: 'debug',
+    })
+  );
+};